@@ -4,5 +4,6 @@ API Routers module
 from app.api.routers.chat import router as chat_router
 from app.api.routers.orders import router as orders_router
 from app.api.routers.menu import router as menu_router
+from app.api.routers.analytics import router as analytics_router
 
-__all__ = ["chat_router", "orders_router", "menu_router"]
\ No newline at end of file
+__all__ = ["chat_router", "orders_router", "menu_router", "analytics_router"]
\ No newline at end of file
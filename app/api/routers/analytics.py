@@ -0,0 +1,84 @@
+"""
+Analytics Router - Datasets for the sales dashboard.
+"""
+from datetime import date, datetime, timezone
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Response, status
+
+from app.core.config import settings
+from app.models.schemas import DailySales, KPIMetrics
+from app.services.analytics_service import ARROW_STREAM_MEDIA_TYPE, get_analytics_service
+from app.services.firestore_service import get_firestore_service
+
+router = APIRouter(prefix="/analytics", tags=["Analytics"])
+
+
+@router.get("/orders")
+async def get_orders_dataset(
+    desde: date = Query(description="Primer día (YYYY-MM-DD, UTC)"),
+    hasta: Optional[date] = Query(default=None, description="Último día, inclusive (por defecto igual a desde)"),
+    cambios_desde: Optional[datetime] = Query(
+        default=None,
+        description="Cursor X-Cursor de la respuesta anterior: devuelve solo las órdenes modificadas después"
+    )
+):
+    """
+    Orders created in a date range as an Arrow IPC stream.
+
+    Columns: id, fecha_creacion and fecha_actualizacion (timestamps UTC),
+    estado (dictionary), total, telefono, items_count, productos and
+    cantidades (lists). Read it with ``pyarrow.ipc.open_stream(body).read_all()``.
+
+    The ``X-Cursor`` header is the high-water mark of the returned data:
+    pass it back as ``cambios_desde`` to get only the orders of the range
+    created or modified since, and merge them by ``id``.
+    """
+    hasta = hasta or desde
+    if hasta < desde:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'hasta' es anterior a 'desde'"
+        )
+    if (hasta - desde).days >= settings.ANALYTICS_MAX_RANGE_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El rango máximo es de {settings.ANALYTICS_MAX_RANGE_DAYS} días"
+        )
+
+    if cambios_desde is not None and cambios_desde.tzinfo is None:
+        cambios_desde = cambios_desde.replace(tzinfo=timezone.utc)
+
+    analytics = get_analytics_service()
+    table, cursor = await analytics.orders_dataset(desde, hasta, cambios_desde)
+    return Response(
+        content=analytics.to_ipc(table),
+        media_type=ARROW_STREAM_MEDIA_TYPE,
+        headers={"X-Row-Count": str(table.num_rows), "X-Cursor": cursor.isoformat()}
+    )
+
+
+@router.get("/kpis", response_model=KPIMetrics)
+async def get_kpis():
+    """
+    Business KPIs: sales today, this week and this month (UTC), orders
+    today, average ticket and best-selling product of the month, new
+    customers and retention against last month.
+    Cached for ANALYTICS_KPI_CACHE_SECONDS.
+    """
+    return await get_analytics_service().kpis()
+
+
+@router.get("/ventas-diarias", response_model=DailySales)
+async def get_daily_sales(
+    fecha: Optional[date] = Query(default=None, description="Día (YYYY-MM-DD, UTC); por defecto hoy")
+):
+    """
+    Sales of one day from its ``ventas_diarias`` rollup (a single document
+    read): total sales and orders, cost, units per product, average ticket
+    and gross margin. Days without completed orders come back in zero.
+    """
+    day = fecha or datetime.now(timezone.utc).date()
+    return await get_firestore_service().get_daily_sales_metrics(
+        datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc)
+    )
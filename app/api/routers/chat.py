@@ -1,31 +1,34 @@
 """
 Chat Router - Main chat endpoint for customer interactions.
-Handles message buffering/debouncing and delegates to Gemini service.
+Handles message buffering/debouncing, answers trivial intents through the
+intent router and delegates everything else to Gemini service.
 """
-from typing import Dict, List
-import asyncio
-import uuid
+from typing import AsyncIterator
+import json
 
 from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import StreamingResponse
 
 from app.models.schemas import ChatRequest, ChatResponse
+from app.services.chat_buffer import get_chat_debouncer
+from app.services.context_cache import get_context_cache
+from app.services.conversation_summary import get_conversation_summarizer
 from app.services.gemini_service import get_gemini_service
+from app.services.intent_router import get_intent_router
+from app.services.token_usage import get_token_usage_tracker
 from app.core.config import settings
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
-# Message buffer for debouncing rapid messages
-message_buffer: Dict[str, List[str]] = {}
-latest_request_token: Dict[str, str] = {}
-
 
 @router.post("", response_model=ChatResponse)
 async def chat(request: ChatRequest) -> ChatResponse:
     """
     Process a chat message from a customer.
     
-    Implements debouncing to group rapid consecutive messages.
-    Delegates processing to GeminiService for AI response generation.
+    Implements event-driven debouncing to group rapid consecutive messages.
+    Trivial intents are answered by the IntentRouter; everything else is
+    delegated to GeminiService for AI response generation.
     
     Args:
         request: ChatRequest with mensaje and telefono
@@ -35,46 +38,99 @@ async def chat(request: ChatRequest) -> ChatResponse:
     """
     try:
         phone = request.telefono
+        debouncer = get_chat_debouncer()
         
-        # Initialize buffer for this phone if needed
-        if phone not in message_buffer:
-            message_buffer[phone] = []
-        
-        # Add message to buffer
-        message_buffer[phone].append(request.mensaje)
-        
-        # Generate unique token for this request
-        current_token = str(uuid.uuid4())
-        latest_request_token[phone] = current_token
+        # Wait for the debounce window; a newer message for this phone
+        # releases this request immediately with None
+        full_message = await debouncer.submit(phone, request.mensaje, request.fin)
         
-        # Wait for potential additional messages (debounce)
-        await asyncio.sleep(settings.MESSAGE_BUFFER_SECONDS)
-        
-        # Check if this is still the latest request
-        if latest_request_token.get(phone) != current_token:
+        if full_message is None:
             # Another message arrived, this one will be grouped
             return ChatResponse(
                 tipo="ignorar",
                 mensaje="Mensaje agrupado con el siguiente."
             )
         
-        # This is the latest request - process all buffered messages
-        full_message = " ".join(message_buffer[phone])
-        message_buffer[phone] = []  # Clear buffer
+        # Trivial intents (menu, order status, points, usual) skip Gemini
+        response = await get_intent_router().route(phone, full_message)
+        if response is None:
+            gemini = get_gemini_service()
+            response = await gemini.process_chat(phone, full_message)
         
-        # Process with Gemini
-        gemini = get_gemini_service()
-        response = await gemini.process_chat(phone, full_message)
+        if response.tipo == "error":
+            # The turn may be half-persisted; reload context next time
+            get_context_cache().invalidate(phone)
+        else:
+            # Refreshes the rolling summary in the background when due
+            get_conversation_summarizer().note_turn(phone)
         
         return response
         
     except Exception as e:
+        get_context_cache().invalidate(request.telefono)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error procesando mensaje: {str(e)}"
         )
 
 
+@router.post("/stream")
+async def chat_stream(request: ChatRequest) -> StreamingResponse:
+    """
+    Streaming variant of ``POST /chat`` (NDJSON, one event per line).
+
+    Forwards Gemini's text as it is generated (``texto`` deltas, or
+    ``burbuja`` events for multi-bubble replies) and ends with a ``final``
+    event carrying the same ChatResponse ``POST /chat`` returns, including
+    order results from tool calls. Debouncing works as in ``POST /chat``.
+    """
+    phone = request.telefono
+    debouncer = get_chat_debouncer()
+    
+    full_message = await debouncer.submit(phone, request.mensaje, request.fin)
+    
+    async def events() -> AsyncIterator[str]:
+        if full_message is None:
+            final = ChatResponse(tipo="ignorar", mensaje="Mensaje agrupado con el siguiente.")
+            yield json.dumps({"tipo": "final", "respuesta": final.model_dump(mode="json")}) + "\n"
+            return
+        
+        fast = await get_intent_router().route(phone, full_message)
+        if fast is not None:
+            get_conversation_summarizer().note_turn(phone)
+            yield json.dumps({"tipo": "final", "respuesta": fast.model_dump(mode="json")}, ensure_ascii=False) + "\n"
+            return
+        
+        gemini = get_gemini_service()
+        async for event in gemini.process_chat_stream(phone, full_message):
+            if event["tipo"] == "final":
+                respuesta = event["respuesta"]
+                if respuesta.tipo == "error":
+                    get_context_cache().invalidate(phone)
+                else:
+                    get_conversation_summarizer().note_turn(phone)
+                event = {"tipo": "final", "respuesta": respuesta.model_dump(mode="json")}
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/usage/{telefono}")
+async def customer_usage(telefono: str):
+    """Gemini tokens and estimated cost accumulated by a customer."""
+    usage = get_token_usage_tracker().customer(telefono)
+    if usage is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Sin consumo registrado para este cliente"
+        )
+    return {"telefono": telefono, **usage}
+
+
 @router.get("/health")
 async def health_check():
     """Health check endpoint for the chat service."""
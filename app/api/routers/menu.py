@@ -5,6 +5,7 @@ from typing import List, Dict, Any
 
 from fastapi import APIRouter, HTTPException, status
 
+from app.models.schemas import MenuResolveRequest, ProductMatch
 from app.services.menu_service import get_menu_service
 
 router = APIRouter(prefix="/menu", tags=["Menu"])
@@ -35,6 +36,26 @@ async def search_menu(query: str):
     return item
 
 
+@router.post("/resolve", response_model=List[ProductMatch])
+async def resolve_products(request: MenuResolveRequest):
+    """
+    Resolve a batch of product names against the menu.
+    Returns the matched item, confidence and match method for each name.
+    """
+    menu_service = get_menu_service()
+    resolved = menu_service.resolve_many(request.nombres)
+    
+    return [
+        ProductMatch(
+            solicitado=nombre,
+            producto=resolved[nombre]["item"],
+            confianza=resolved[nombre]["confianza"],
+            metodo=resolved[nombre]["metodo"]
+        )
+        for nombre in request.nombres
+    ]
+
+
 @router.get("/item/{item_id}")
 async def get_menu_item(item_id: str):
     """Get a specific menu item by ID."""
@@ -3,11 +3,18 @@ Orders Router - Endpoints for order management.
 Used by kitchen display and admin interfaces.
 """
 from typing import List, Dict, Any
+import asyncio
+import hashlib
+import json
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 
+from app.core.config import settings
 from app.models.schemas import OrderStatus
 from app.services.firestore_service import get_firestore_service
+from app.services.order_events import get_order_event_bus
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
 
@@ -23,6 +30,35 @@ async def get_active_orders():
     return orders
 
 
+# Kitchen board columns, in display order
+BOARD_COLUMNS = (OrderStatus.PENDIENTE, OrderStatus.EN_PREPARACION, OrderStatus.LISTO)
+
+
+@router.get("/board", response_model=Dict[str, List[Dict[str, Any]]])
+async def get_board(request: Request):
+    """
+    Get the whole kitchen board (pending, in preparation, ready) grouped by
+    column, with a single Firestore query.
+
+    Supports conditional requests: the response carries an ETag and a
+    matching ``If-None-Match`` returns 304 with no body.
+    """
+    firestore = get_firestore_service()
+    orders = await firestore.get_orders_by_statuses(list(BOARD_COLUMNS))
+
+    board: Dict[str, List[Dict[str, Any]]] = {column.value: [] for column in BOARD_COLUMNS}
+    for order in orders:
+        board.setdefault(order.get('estado'), []).append(order)
+
+    content = jsonable_encoder(board)
+    body = json.dumps(content, sort_keys=True, ensure_ascii=False)
+    etag = f'"{hashlib.sha1(body.encode()).hexdigest()}"'
+
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return JSONResponse(content=content, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
 @router.get("/pending", response_model=List[Dict[str, Any]])
 async def get_pending_orders():
     """Get all pending orders."""
@@ -47,6 +83,66 @@ async def get_ready_orders():
     return orders
 
 
+def _sse(event: str, data: Any) -> str:
+    """Format a Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.get("/stream")
+async def stream_orders(request: Request):
+    """
+    Push feed for the kitchen display (Server-Sent Events).
+
+    Sends a ``snapshot`` event with every order on the board (pending, in
+    preparation, ready) followed by ``orden`` events with each delta
+    (``added``, ``modified``, ``removed``). All connections share one
+    Firestore listener, so open screens add no database reads.
+    """
+    bus = get_order_event_bus()
+    if not bus.is_running:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Feed de órdenes no disponible"
+        )
+
+    queue = bus.subscribe()
+    ordenes = bus.snapshot()
+
+    async def events():
+        try:
+            yield _sse("snapshot", {"ordenes": ordenes})
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=settings.ORDER_STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                if event is None:
+                    break
+                yield _sse("orden", event)
+        finally:
+            bus.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/view/consistency")
+async def check_orders_view():
+    """
+    Compare the in-memory active orders view with a direct Firestore query.
+    Lists orders missing from the view, extra in the view, or with a
+    different status/total.
+    """
+    firestore = get_firestore_service()
+    return await firestore.check_orders_view()
+
+
 @router.patch("/{order_id}/status")
 async def update_order_status(order_id: str, new_status: OrderStatus):
     """
@@ -55,7 +151,7 @@ async def update_order_status(order_id: str, new_status: OrderStatus):
     """
     firestore = get_firestore_service()
     
-    success = await firestore.update_order(order_id, {"estado": new_status.value})
+    success = await firestore.update_order_status(order_id, new_status)
     
     if not success:
         raise HTTPException(
@@ -81,6 +177,9 @@ async def mark_ready(order_id: str):
 @router.patch("/{order_id}/mark-delivered")
 async def mark_delivered(order_id: str):
     """Mark an order as delivered."""
+    return await update_order_status(order_id, OrderStatus.ENTREGADO)
+
+
 @router.get("/status/{telefono}")
 async def get_customer_order_status(telefono: str):
     """
@@ -103,26 +202,14 @@ async def get_customer_order_status(telefono: str):
         }
 
     # If no pending order, check recent completed orders
-    if firestore.is_connected:
-        try:
-            query = firestore._db.collection('pedidos')\
-                .where(filter=firestore._db.field_filter("id_cliente", "==", telefono))\
-                .where(filter=firestore._db.field_filter("estado", "in", ["entregado", "listo"]))\
-                .order_by('fecha_creacion', direction=firestore._db.Query.DESCENDING)\
-                .limit(1)
-
-            docs = list(query.stream())
-            if docs:
-                data = docs[0].to_dict()
-                return {
-                    "order_id": docs[0].id,
-                    "status": data.get('estado', 'desconocido'),
-                    "items": data.get('items', []),
-                    "total": data.get('total', 0),
-                    "message": "Tu pedido anterior ya fue entregado. ¿Quieres ordenar algo más?"
-                }
-        except Exception as e:
-            print(f"Error checking recent orders: {e}")
+    last_order = await firestore.get_last_completed_order(telefono)
+    if last_order:
+        return {
+            "order_id": last_order['id'],
+            "status": last_order.get('estado', 'desconocido'),
+            "items": last_order.get('items', []),
+            "total": last_order.get('total', 0),
+            "message": "Tu pedido anterior ya fue entregado. ¿Quieres ordenar algo más?"
+        }
 
     return {"status": "no_orders", "message": "No tienes pedidos activos. ¿Qué te gustaría ordenar?"}
-    return await update_order_status(order_id, OrderStatus.ENTREGADO)
\ No newline at end of file
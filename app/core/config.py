@@ -3,7 +3,7 @@ Configuration module using pydantic-settings.
 Loads environment variables from .env file and provides type-safe settings.
 """
 from functools import lru_cache
-from typing import Literal
+from typing import Literal, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -27,6 +27,11 @@ class Settings(BaseSettings):
     
     # AI Model Configuration
     GEMINI_MODEL: str = "gemini-1.5-flash"
+    PROMPT_TOKEN_BUDGET: int = 12000  # Per-turn prompt limit; older history is trimmed (0 = no limit)
+    GEMINI_INPUT_COST_PER_MTOK: float = 0.075  # USD per million prompt tokens
+    GEMINI_OUTPUT_COST_PER_MTOK: float = 0.30  # USD per million output tokens
+    TOKEN_USAGE_MAX_CUSTOMERS: int = 10000  # Customers kept in the usage aggregate
+    TOKEN_USAGE_HOURS_KEPT: int = 48
     
     # Environment
     ENV: Literal["local", "prod"] = "local"
@@ -40,10 +45,42 @@ class Settings(BaseSettings):
     CANCEL_TIME_LIMIT_MINUTES: int = 5
     DEFAULT_PREP_BUFFER_MINUTES: int = 5
     DEFAULT_COST_PERCENTAGE: float = 0.30
+    LOYALTY_POINTS_RATE: float = 0.05  # "Justicia para Todos": points per peso spent
     
+    # Firestore Settings
+    FIRESTORE_MAX_WORKERS: int = 16  # Threads for blocking Firestore calls
+    ORDERS_VIEW_VERIFY_READS: bool = False  # Shadow-read Firestore to check the in-memory orders view
+
+    # Kitchen Display Settings
+    ORDER_STREAM_KEEPALIVE_SECONDS: float = 15.0  # SSE ping interval for /orders/stream
+
+    # Analytics Settings
+    ANALYTICS_MAX_RANGE_DAYS: int = 366  # Longest range served by /analytics/orders
+    ANALYTICS_KPI_CACHE_SECONDS: float = 300.0  # /analytics/kpis is recomputed at most this often
+    ANALYTICS_KPI_HISTORY_DAYS: int = 90  # Order history before the month used to tell new customers
+
     # Chat Settings
     CHAT_HISTORY_LIMIT: int = 10
+    CHAT_SUMMARY_ENABLED: bool = True  # Older turns reach Gemini as one rolling summary
+    CHAT_SUMMARY_EVERY_MESSAGES: int = 6  # Refresh the summary after this many new messages
+    CHAT_SUMMARY_MAX_SOURCE_MESSAGES: int = 100  # Messages folded per refresh
+    CHAT_SUMMARY_MAX_CHARS: int = 1500
+    INTENT_ROUTER_ENABLED: bool = True  # Answer quick-action intents without Gemini
+    RESPONSE_CACHE_MAX_ENTRIES: int = 2000  # Cached answers to general questions
+    RESPONSE_CACHE_TTL_SECONDS: float = 1800.0
+    RESPONSE_CACHE_MAX_TOKENS: int = 8  # Longer questions are not cached
+    RESPONSE_CACHE_QUIET_SECONDS: float = 900.0  # Turns closer than this to the previous one skip the cache
+    CHAT_WRITE_BATCH_SIZE: int = 100  # Write-behind: commit when this many messages are queued
+    CHAT_WRITE_FLUSH_SECONDS: float = 0.5  # ...or this long after the first queued message
+    CONTEXT_CACHE_MAX_ENTRIES: int = 5000  # Per-phone history/profile cache
+    CONTEXT_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    CONTEXT_CACHE_TTL_SECONDS: float = 600.0
     MESSAGE_BUFFER_SECONDS: float = 2.0
+    MESSAGE_BUFFER_MIN_SECONDS: float = 0.5  # Window when the message looks complete
+    CONTEXT_FETCH_TIMEOUT_SECONDS: float = 3.0  # Per-read timeout for chat context
+    CHAT_BUFFER_BACKEND: Literal["memory", "redis"] = "memory"  # "redis" for multi-worker
+    CHAT_BUFFER_IDLE_SECONDS: float = 300.0  # Evict idle per-phone buffers
+    REDIS_URL: Optional[str] = None
 
 
 @lru_cache()
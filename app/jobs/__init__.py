@@ -0,0 +1,3 @@
+"""
+Jobs module - One-off and batch maintenance commands (run with python -m)
+"""
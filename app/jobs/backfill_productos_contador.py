@@ -0,0 +1,87 @@
+"""
+Backfill Job - Rebuild per-customer product counters from order history.
+Recomputes ``clientes/{telefono}.productos_contador`` from every listo/entregado
+order in ``pedidos``. Run once after deploying the incremental counters, ideally
+while the kitchen is closed (status changes during the run may be overwritten).
+
+Usage:
+    python -m app.jobs.backfill_productos_contador [--dry-run]
+"""
+from typing import Dict
+import argparse
+
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from app.services.firestore_service import FirestoreService, get_firestore_service
+
+BATCH_SIZE = 400  # Firestore allows up to 500 writes per batch
+
+
+def collect_counters(db) -> Dict[str, Dict[str, int]]:
+    """Stream completed orders and aggregate units per product per customer."""
+    query = db.collection('pedidos')\
+        .where(filter=FieldFilter("estado", "in", list(FirestoreService.COMPLETED_STATUSES)))\
+        .select(["id_cliente", "items"])
+
+    counters: Dict[str, Dict[str, int]] = {}
+    for doc in query.stream():
+        data = doc.to_dict()
+        telefono = data.get('id_cliente')
+        if not telefono:
+            continue
+        customer_counts = counters.setdefault(telefono, {})
+        for name, qty in FirestoreService.count_products(data.get('items', [])).items():
+            customer_counts[name] = customer_counts.get(name, 0) + qty
+    return counters
+
+
+def write_counters(db, counters: Dict[str, Dict[str, int]]) -> int:
+    """Replace the productos_contador map on each profile, in batches."""
+    batch = db.batch()
+    pending = 0
+    written = 0
+    for telefono, counts in counters.items():
+        batch.set(
+            db.collection('clientes').document(telefono),
+            {"productos_contador": counts},
+            merge=["productos_contador"]
+        )
+        pending += 1
+        if pending >= BATCH_SIZE:
+            batch.commit()
+            written += pending
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+        written += pending
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruye productos_contador desde pedidos")
+    parser.add_argument("--dry-run", action="store_true", help="Solo calcula, no escribe")
+    args = parser.parse_args()
+
+    firestore = get_firestore_service()
+    try:
+        if not firestore.is_connected:
+            print("❌ Firestore no disponible")
+            return
+
+        counters = collect_counters(firestore.db)
+        print(f"📊 {len(counters)} clientes con pedidos completados")
+
+        if args.dry_run:
+            for telefono, counts in list(counters.items())[:10]:
+                print(f"  {telefono}: {counts}")
+            return
+
+        written = write_counters(firestore.db, counters)
+        print(f"✅ Contadores reconstruidos para {written} clientes")
+    finally:
+        firestore.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Rebuild Job - Recompute the daily sales rollups from order history.
+Rewrites ``ventas_diarias/{YYYY-MM-DD}`` for every day in the range from the
+listo/entregado orders in ``pedidos``. Use it for days before the incremental
+rollups were deployed or to repair a day; rebuilding the current day while
+the kitchen is open may overwrite increments made during the run.
+
+Usage:
+    python -m app.jobs.rebuild_ventas_diarias --desde 2024-01-01 [--hasta 2024-01-31] [--dry-run]
+"""
+from typing import Dict, Any
+from datetime import datetime, timedelta, timezone
+import argparse
+
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from app.services.firestore_service import FirestoreService, get_firestore_service
+
+BATCH_SIZE = 400  # Firestore allows up to 500 writes per batch
+
+
+def parse_day(value: str) -> datetime:
+    return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+
+
+def collect_rollups(db, desde: datetime, hasta: datetime) -> Dict[str, Dict[str, Any]]:
+    """Stream completed orders created in [desde, hasta] and aggregate them per day."""
+    query = db.collection('pedidos')\
+        .where(filter=FieldFilter("fecha_creacion", ">=", desde))\
+        .where(filter=FieldFilter("fecha_creacion", "<", hasta + timedelta(days=1)))\
+        .select(["fecha_creacion", "estado", "total", "items"])
+
+    rollups: Dict[str, Dict[str, Any]] = {}
+    day = desde
+    while day <= hasta:
+        rollups[day.strftime("%Y-%m-%d")] = {
+            "fecha": day,
+            "total_ventas": 0.0,
+            "total_ordenes": 0,
+            "costo_total": 0.0,
+            "productos_vendidos": {},
+        }
+        day += timedelta(days=1)
+
+    for doc in query.stream():
+        data = doc.to_dict()
+        if data.get('estado') not in FirestoreService.COMPLETED_STATUSES:
+            continue
+        rollup = rollups.get(FirestoreService.sales_day(data))
+        if rollup is None:
+            continue
+        items = data.get('items', [])
+        rollup["total_ventas"] += float(data.get('total', 0.0))
+        rollup["total_ordenes"] += 1
+        rollup["costo_total"] += FirestoreService.order_cost(items)
+        vendidos = rollup["productos_vendidos"]
+        for name, qty in FirestoreService.count_products(items).items():
+            vendidos[name] = vendidos.get(name, 0) + qty
+    return rollups
+
+
+def write_rollups(db, rollups: Dict[str, Dict[str, Any]]) -> int:
+    """Replace each day's rollup document, in batches (days without sales are deleted)."""
+    batch = db.batch()
+    pending = 0
+    written = 0
+    for day, rollup in rollups.items():
+        doc_ref = db.collection('ventas_diarias').document(day)
+        if rollup["total_ordenes"]:
+            batch.set(doc_ref, rollup)
+        else:
+            batch.delete(doc_ref)
+        pending += 1
+        if pending >= BATCH_SIZE:
+            batch.commit()
+            written += pending
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+        written += pending
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruye ventas_diarias desde pedidos")
+    parser.add_argument("--desde", required=True, help="Primer día (YYYY-MM-DD, UTC)")
+    parser.add_argument("--hasta", help="Último día (YYYY-MM-DD, UTC); por defecto igual a --desde")
+    parser.add_argument("--dry-run", action="store_true", help="Solo calcula, no escribe")
+    args = parser.parse_args()
+
+    desde = parse_day(args.desde)
+    hasta = parse_day(args.hasta) if args.hasta else desde
+    if hasta < desde:
+        print("❌ --hasta es anterior a --desde")
+        return
+
+    firestore = get_firestore_service()
+    try:
+        if not firestore.is_connected:
+            print("❌ Firestore no disponible")
+            return
+
+        rollups = collect_rollups(firestore.db, desde, hasta)
+        con_ventas = sum(1 for r in rollups.values() if r["total_ordenes"])
+        print(f"📊 {len(rollups)} días, {con_ventas} con ventas")
+
+        if args.dry_run:
+            for day, rollup in list(rollups.items())[:10]:
+                print(f"  {day}: ${rollup['total_ventas']:.2f} en {rollup['total_ordenes']} órdenes")
+            return
+
+        written = write_rollups(firestore.db, rollups)
+        print(f"✅ Rollups reconstruidos para {written} días")
+    finally:
+        firestore.shutdown()
+
+
+if __name__ == "__main__":
+    main()
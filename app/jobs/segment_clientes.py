@@ -0,0 +1,250 @@
+"""
+Segmentation Job - CRM tiers and spend aggregates for every customer.
+Streams the listo/entregado orders in ``pedidos`` page by page, aggregates
+them per customer with pandas (RFM: recency, frequency, monetary) and writes
+``nivel``, ``total_gastado``, ``frecuencia_visitas`` and ``ultima_visita`` to
+``clientes/{telefono}`` with a BulkWriter, in chunks.
+
+Memory is bounded by the number of customers, not orders: each page is
+folded into the running per-customer aggregate and dropped. Progress is
+checkpointed to a local Parquet file (aggregate plus last order id, or
+customers written), so an interrupted run continues with ``--resume``.
+
+Usage:
+    python -m app.jobs.segment_clientes [--page-size 5000] [--resume] [--dry-run]
+"""
+from typing import Optional, Dict, Any, List
+from datetime import datetime, timezone
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from app.services.firestore_service import FirestoreService, get_firestore_service
+
+PAGE_SIZE = 5000
+CHUNK_SIZE = 500  # Profiles per BulkWriter flush (and per write checkpoint)
+CHECKPOINT_EVERY_PAGES = 10
+CHECKPOINT_PATH = "segment_clientes.checkpoint.parquet"
+
+# Mean RFM score (1-5) needed for each tier, highest first
+TIERS = [("Magistrado", 4.0), ("Asociado", 2.5)]
+DEFAULT_TIER = "Pasante"
+
+AGGREGATE_COLUMNS = {
+    "total_gastado": "float64",
+    "frecuencia_visitas": "int64",
+    "ultima_visita": "datetime64[ns, UTC]",
+}
+
+
+def empty_aggregate() -> pd.DataFrame:
+    aggregate = pd.DataFrame({name: pd.Series(dtype=dtype) for name, dtype in AGGREGATE_COLUMNS.items()})
+    aggregate.index.name = "telefono"
+    return aggregate
+
+
+def aggregate_page(rows: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Per-customer spend, order count and last order of one page of orders."""
+    page = pd.DataFrame(rows, columns=["id_cliente", "fecha_creacion", "total"])
+    page = page[page["id_cliente"].notna() & (page["id_cliente"] != "")]
+    page["total"] = pd.to_numeric(page["total"], errors="coerce").fillna(0.0)
+    page["fecha_creacion"] = pd.to_datetime(page["fecha_creacion"], utc=True, errors="coerce")
+    aggregate = page.groupby("id_cliente").agg(
+        total_gastado=("total", "sum"),
+        frecuencia_visitas=("total", "size"),
+        ultima_visita=("fecha_creacion", "max"),
+    )
+    aggregate.index.name = "telefono"
+    return aggregate.astype(AGGREGATE_COLUMNS)
+
+
+def combine(aggregate: pd.DataFrame, page: pd.DataFrame) -> pd.DataFrame:
+    """Fold a page aggregate into the running aggregate."""
+    if aggregate.empty:
+        return page
+    return pd.concat([aggregate, page]).groupby(level=0).agg({
+        "total_gastado": "sum",
+        "frecuencia_visitas": "sum",
+        "ultima_visita": "max",
+    })
+
+
+def assign_tiers(aggregate: pd.DataFrame, now: datetime) -> pd.DataFrame:
+    """
+    RFM quintile scores (1-5) for recency, frequency and monetary value,
+    and the tier of their mean.
+    """
+    result = aggregate.copy()
+    if result.empty:
+        result["nivel"] = pd.Series(dtype=object)
+        return result
+
+    def score(values: pd.Series) -> np.ndarray:
+        return np.ceil(values.rank(method="average", pct=True) * 5).clip(1, 5)
+
+    recency_days = (pd.Timestamp(now) - result["ultima_visita"]).dt.days.fillna(np.inf)
+    rfm = (score(-recency_days) + score(result["frecuencia_visitas"]) + score(result["total_gastado"])) / 3
+
+    result["nivel"] = np.select([rfm >= cut for _, cut in TIERS], [name for name, _ in TIERS], DEFAULT_TIER)
+    return result
+
+
+# --- Checkpoints ---
+
+def save_checkpoint(path: str, aggregate: pd.DataFrame, state: Dict[str, Any]):
+    """Write the aggregate and the progress state atomically (tmp file + rename)."""
+    table = pa.Table.from_pandas(aggregate, preserve_index=True)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"segment_clientes": json.dumps(state)})
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path: str) -> Optional[tuple]:
+    """(aggregate, state) from a checkpoint, or None if there is none."""
+    if not os.path.exists(path):
+        return None
+    table = pq.read_table(path)
+    state = json.loads(table.schema.metadata[b"segment_clientes"])
+    return table.to_pandas().astype(AGGREGATE_COLUMNS), state
+
+
+# --- Firestore ---
+
+def scan_orders(
+    db,
+    aggregate: pd.DataFrame,
+    state: Dict[str, Any],
+    checkpoint_path: Optional[str],
+    page_size: int = PAGE_SIZE
+) -> pd.DataFrame:
+    """
+    Stream completed orders in document-id order, ``page_size`` at a time,
+    starting after ``state["ultimo_pedido"]``, and fold them into the aggregate.
+    """
+    query = db.collection('pedidos')\
+        .where(filter=FieldFilter("estado", "in", list(FirestoreService.COMPLETED_STATUSES)))\
+        .order_by('__name__')\
+        .select(["id_cliente", "fecha_creacion", "total"])
+
+    last = None
+    if state.get("ultimo_pedido"):
+        last = db.collection('pedidos').document(state["ultimo_pedido"]).get()
+
+    pages = 0
+    while True:
+        page_query = query.limit(page_size)
+        if last is not None:
+            page_query = page_query.start_after(last)
+        docs = list(page_query.stream())
+        if not docs:
+            break
+
+        aggregate = combine(aggregate, aggregate_page([doc.to_dict() for doc in docs]))
+        last = docs[-1]
+        state["ultimo_pedido"] = last.id
+        state["pedidos"] = state.get("pedidos", 0) + len(docs)
+        pages += 1
+
+        if checkpoint_path and pages % CHECKPOINT_EVERY_PAGES == 0:
+            save_checkpoint(checkpoint_path, aggregate, state)
+            print(f"💾 {state['pedidos']} pedidos, {len(aggregate)} clientes")
+        if len(docs) < page_size:
+            break
+    return aggregate
+
+
+def write_profiles(
+    db,
+    segmented: pd.DataFrame,
+    state: Dict[str, Any],
+    checkpoint_path: Optional[str],
+    aggregate: pd.DataFrame
+) -> int:
+    """
+    Merge the CRM fields into each profile with a BulkWriter, flushing every
+    CHUNK_SIZE customers and skipping the ones a previous run already wrote.
+    """
+    segmented = segmented.sort_index()
+    start = state.get("escritos", 0)
+    writer = db.bulk_writer()
+    fields = ["nivel", "total_gastado", "frecuencia_visitas", "ultima_visita"]
+    try:
+        for offset in range(start, len(segmented), CHUNK_SIZE):
+            chunk = segmented.iloc[offset:offset + CHUNK_SIZE]
+            for telefono, nivel, total, visitas, ultima in zip(
+                chunk.index, chunk["nivel"], chunk["total_gastado"], chunk["frecuencia_visitas"], chunk["ultima_visita"]
+            ):
+                writer.set(
+                    db.collection('clientes').document(telefono),
+                    {
+                        "nivel": nivel,
+                        "total_gastado": round(float(total), 2),
+                        "frecuencia_visitas": int(visitas),
+                        "ultima_visita": ultima.to_pydatetime() if pd.notna(ultima) else None,
+                    },
+                    merge=fields
+                )
+            writer.flush()
+            state["escritos"] = offset + len(chunk)
+            if checkpoint_path:
+                save_checkpoint(checkpoint_path, aggregate, state)
+    finally:
+        writer.close()
+    return state.get("escritos", 0) - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Segmenta clientes (nivel RFM) desde pedidos")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE, help="Pedidos por página")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="Archivo de checkpoint (Parquet)")
+    parser.add_argument("--resume", action="store_true", help="Continúa desde el checkpoint")
+    parser.add_argument("--dry-run", action="store_true", help="Solo calcula, no escribe")
+    args = parser.parse_args()
+
+    firestore = get_firestore_service()
+    try:
+        if not firestore.is_connected:
+            print("❌ Firestore no disponible")
+            return
+
+        aggregate, state = empty_aggregate(), {"fase": "lectura"}
+        if args.resume:
+            checkpoint = load_checkpoint(args.checkpoint)
+            if checkpoint is None:
+                print(f"⚠️ No hay checkpoint en {args.checkpoint}; empezando desde cero")
+            else:
+                aggregate, state = checkpoint
+                print(f"🔁 Reanudando ({state['fase']}): {state.get('pedidos', 0)} pedidos, {len(aggregate)} clientes")
+
+        checkpoint_path = None if args.dry_run else args.checkpoint
+        if state["fase"] == "lectura":
+            aggregate = scan_orders(firestore.db, aggregate, state, checkpoint_path, args.page_size)
+            # Recency is measured from the end of the scan, also when resuming the writes
+            state.update(fase="escritura", referencia=datetime.now(timezone.utc).isoformat())
+            if checkpoint_path:
+                save_checkpoint(checkpoint_path, aggregate, state)
+
+        segmented = assign_tiers(aggregate, datetime.fromisoformat(state["referencia"]))
+        print(f"📊 {state.get('pedidos', 0)} pedidos, {len(segmented)} clientes: "
+              f"{segmented['nivel'].value_counts().to_dict()}")
+
+        if args.dry_run:
+            print(segmented.sort_values("total_gastado", ascending=False).head(10).to_string())
+            return
+
+        written = write_profiles(firestore.db, segmented, state, checkpoint_path, aggregate)
+        os.remove(checkpoint_path)
+        print(f"✅ Perfiles actualizados: {written} clientes")
+    finally:
+        firestore.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -8,11 +8,17 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.config import settings
-from app.api.routers import chat_router, orders_router, menu_router
+from app.api.routers import chat_router, orders_router, menu_router, analytics_router
 from app.services.menu_service import get_menu_service
 from app.services.gemini_service import get_gemini_service
 from app.services.scheduler_service import get_scheduler_service
 from app.services.firestore_service import get_firestore_service
+from app.services.order_events import get_order_event_bus
+from app.services.context_cache import get_context_cache
+from app.services.intent_router import get_intent_router
+from app.services.response_cache import get_response_cache
+from app.services.token_usage import get_token_usage_tracker
+from app.services.conversation_summary import get_conversation_summarizer
 
 
 @asynccontextmanager
@@ -25,6 +31,11 @@ async def lifespan(app: FastAPI):
     print(f"🚀 Iniciando {settings.APP_NAME} v{settings.APP_VERSION}")
     print(f"📍 Ambiente: {settings.ENV}")
 
+    # Connect Firestore (owns the executor for blocking calls) and start
+    # the in-memory view of active orders
+    firestore_service = get_firestore_service()
+    firestore_service.start_orders_view()
+
     # Load menu cache
     menu_service = get_menu_service()
     menu_service.load_menu()
@@ -32,6 +43,10 @@ async def lifespan(app: FastAPI):
     # Initialize Gemini (this will use the loaded menu)
     gemini_service = get_gemini_service()
 
+    # Shared order listener feeding the kitchen push stream
+    order_event_bus = get_order_event_bus()
+    order_event_bus.start()
+
     # Start scheduler for automated tasks
     scheduler_service = get_scheduler_service()
     scheduler_service.start()
@@ -43,6 +58,10 @@ async def lifespan(app: FastAPI):
     # Shutdown
     print("👋 Cerrando aplicación...")
     scheduler_service.shutdown()
+    order_event_bus.stop()
+    await get_conversation_summarizer().stop()
+    await firestore_service.flush_pending_writes()
+    firestore_service.shutdown()
 
 
 # Create FastAPI app
@@ -74,6 +93,7 @@ app.add_middleware(
 app.include_router(chat_router)
 app.include_router(orders_router)
 app.include_router(menu_router)
+app.include_router(analytics_router)
 
 
 @app.get("/")
@@ -98,6 +118,7 @@ async def system_metrics():
     gemini_service = get_gemini_service()
     firestore_service = get_firestore_service()
     scheduler_service = get_scheduler_service()
+    order_event_bus = get_order_event_bus()
 
     # Get basic process info
     process = os.getpid()
@@ -111,12 +132,21 @@ async def system_metrics():
             "menu_items": menu_service.item_count,
             "gemini_configured": gemini_service._configured if hasattr(gemini_service, '_configured') else False,
             "firestore_connected": firestore_service.is_connected,
-            "scheduler_running": scheduler_service.is_running()
+            "chat_writes_pending": firestore_service.pending_chat_writes,
+            "scheduler_running": scheduler_service.is_running(),
+            "orders_view_synced": firestore_service.orders_view_synced,
+            "order_stream_running": order_event_bus.is_running,
+            "order_stream_subscribers": len(order_event_bus)
         },
         "cache_status": {
             "menu_cache_loaded": menu_service.is_loaded,
-            "menu_cache_size": menu_service.item_count
+            "menu_cache_size": menu_service.item_count,
+            "context_cache": get_context_cache().stats(),
+            "response_cache": get_response_cache().stats()
         },
+        "intent_router": get_intent_router().stats(),
+        "tokens": get_token_usage_tracker().stats(),
+        "conversation_summary": get_conversation_summarizer().stats(),
         "uptime": time.time() - getattr(scheduler_service, '_start_time', time.time()) if hasattr(scheduler_service, '_start_time') else 0
     }
 @app.get("/health")
@@ -10,7 +10,9 @@ from app.models.schemas import (
     MenuItem,
     CustomerProfile,
     ChatRequest,
-    ChatResponse
+    ChatResponse,
+    MenuResolveRequest,
+    ProductMatch
 )
 
 __all__ = [
@@ -22,5 +24,7 @@ __all__ = [
     "MenuItem",
     "CustomerProfile",
     "ChatRequest",
-    "ChatResponse"
+    "ChatResponse",
+    "MenuResolveRequest",
+    "ProductMatch"
 ]
\ No newline at end of file
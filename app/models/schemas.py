@@ -4,6 +4,7 @@ Defines the core data structures for the application with Firestore compatibilit
 All datetime fields use UTC timezone for consistency.
 """
 from enum import Enum
+import uuid
 from typing import List, Optional, Any, Dict
 from datetime import datetime, timezone
 from pydantic import BaseModel, Field, computed_field
@@ -79,6 +80,10 @@ class OrderItem(BaseModel, FirestoreModelMixin):
     modificadores_seleccionados: List[str] = Field(default_factory=list)
     notas_especiales: Optional[str] = None
     tiempo_prep_unitario: int = Field(default=5, description="Prep time per unit in minutes")
+    id_linea: str = Field(
+        default_factory=lambda: uuid.uuid4().hex[:8],
+        description="Line id; keeps identical lines distinct when appended with ArrayUnion"
+    )
 
     @computed_field
     @property
@@ -106,6 +111,10 @@ class Order(BaseModel, FirestoreModelMixin):
         default_factory=lambda: datetime.now(timezone.utc),
         description="Order creation time in UTC"
     )
+    fecha_actualizacion: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        description="Last write time in UTC (server timestamp on every order write)"
+    )
     
     # Order contents
     items: List[OrderItem] = Field(default_factory=list)
@@ -149,6 +158,20 @@ class ChatMessage(BaseModel, FirestoreModelMixin):
     metadata: Optional[Dict[str, Any]] = None
 
 
+class ConversationSummary(BaseModel, FirestoreModelMixin):
+    """
+    Rolling summary of the older turns of a conversation.
+    Stored at clientes/{telefono}/memoria/resumen and sent to Gemini as a
+    single history entry ahead of the recent messages.
+    """
+    resumen: str
+    mensajes_resumidos: int = 0  # Messages folded into the summary so far
+    hasta: Optional[datetime] = None  # Timestamp of the last summarized message
+    actualizado: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc)
+    )
+
+
 class CustomerProfile(BaseModel, FirestoreModelMixin):
     """
     Customer profile with CRM data.
@@ -159,6 +182,7 @@ class CustomerProfile(BaseModel, FirestoreModelMixin):
     nivel: str = "Pasante"  # Pasante, Asociado, Magistrado
     total_gastado: float = 0.0
     producto_favorito: Optional[str] = None
+    productos_contador: Dict[str, int] = Field(default_factory=dict)  # Units per product (listo/entregado)
     frecuencia_visitas: int = 0
     ultima_visita: Optional[datetime] = None
     preferencias: List[str] = Field(default_factory=list)
@@ -267,6 +291,7 @@ class ChatRequest(BaseModel):
     """Request model for chat endpoint."""
     mensaje: str = Field(min_length=1, description="User message")
     telefono: str = Field(min_length=10, description="Customer phone number")
+    fin: bool = Field(default=False, description="Client signals the message is complete (skip debounce wait)")
 
 
 class ChatResponse(BaseModel):
@@ -278,6 +303,19 @@ class ChatResponse(BaseModel):
     metadata: Optional[Dict[str, Any]] = None
 
 
+class MenuResolveRequest(BaseModel):
+    """Request model for batch product resolution."""
+    nombres: List[str] = Field(min_length=1, max_length=100, description="Product names to resolve")
+
+
+class ProductMatch(BaseModel):
+    """Resolution result for a single product name."""
+    solicitado: str = Field(description="Name as requested")
+    producto: Optional[Dict[str, Any]] = None  # Matched menu item
+    confianza: float = Field(ge=0, le=1, description="Match confidence (0-1)")
+    metodo: str = Field(description="exacto, parcial, difuso, sin_coincidencia")
+
+
 # --- Dashboard Models ---
 
 class KPIMetrics(BaseModel):
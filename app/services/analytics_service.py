@@ -0,0 +1,249 @@
+"""
+Analytics Service - Columnar order datasets for the dashboard.
+Reads orders for a date range from Firestore and converts them once into an
+Arrow table (typed timestamps, dictionary-encoded status, item lists) that
+is shipped to the dashboard as Arrow IPC bytes. Refreshes read only the
+orders written since the client's cursor (``fecha_actualizacion``).
+Business KPIs are computed from the same table with NumPy, in one pass.
+"""
+from typing import Optional, Dict, Any, List, Tuple
+from datetime import datetime, date, time, timedelta, timezone
+from functools import lru_cache
+import asyncio
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from app.core.config import settings
+from app.models.schemas import KPIMetrics, OrderStatus
+from app.services.firestore_service import FirestoreService, get_firestore_service
+
+
+# Media type of the Arrow IPC streaming format
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+ORDER_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("fecha_creacion", pa.timestamp("ms", tz="UTC")),
+    ("fecha_actualizacion", pa.timestamp("ms", tz="UTC")),
+    ("estado", pa.dictionary(pa.int8(), pa.string())),
+    ("total", pa.float64()),
+    ("telefono", pa.string()),
+    ("items_count", pa.int32()),
+    ("productos", pa.list_(pa.string())),
+    ("cantidades", pa.list_(pa.int32())),
+])
+
+
+class AnalyticsService:
+    """
+    Singleton service building analytics datasets from ``pedidos``.
+    """
+
+    _instance: Optional['AnalyticsService'] = None
+
+    # Order fields the dataset needs (Firestore projection)
+    ORDER_FIELDS = ["id_cliente", "fecha_creacion", "fecha_actualizacion", "estado", "total", "items"]
+
+    def __new__(cls) -> 'AnalyticsService':
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, '_kpi_lock'):
+            self._kpi_lock = asyncio.Lock()
+            self._kpi_cache: Optional[Tuple[datetime, KPIMetrics]] = None
+
+    @staticmethod
+    def day_bounds(desde: date, hasta: date) -> tuple:
+        """UTC datetimes covering the days [desde, hasta] (both inclusive)."""
+        start = datetime.combine(desde, time.min, tzinfo=timezone.utc)
+        end = datetime.combine(hasta, time.min, tzinfo=timezone.utc) + timedelta(days=1)
+        return start, end
+
+    @staticmethod
+    def orders_to_table(orders: List[Dict[str, Any]]) -> pa.Table:
+        """Convert order documents to a typed Arrow table (one pass over the orders)."""
+        columns: Dict[str, list] = {name: [] for name in ORDER_SCHEMA.names}
+        for order in orders:
+            items = order.get('items') or []
+            columns["id"].append(order.get('id'))
+            columns["fecha_creacion"].append(order.get('fecha_creacion'))
+            columns["fecha_actualizacion"].append(order.get('fecha_actualizacion'))
+            columns["estado"].append(order.get('estado'))
+            columns["total"].append(float(order.get('total') or 0.0))
+            columns["telefono"].append(order.get('id_cliente'))
+            columns["productos"].append([i.get('nombre_producto', '') for i in items])
+            columns["cantidades"].append([int(i.get('cantidad', 1)) for i in items])
+            columns["items_count"].append(sum(columns["cantidades"][-1]))
+
+        arrays = [
+            pa.array(columns[field.name], type=field.type.value_type).dictionary_encode()
+            if pa.types.is_dictionary(field.type)
+            else pa.array(columns[field.name], type=field.type)
+            for field in ORDER_SCHEMA
+        ]
+        return pa.Table.from_arrays(arrays, schema=ORDER_SCHEMA)
+
+    @staticmethod
+    def to_ipc(table: pa.Table) -> bytes:
+        """Serialize a table in the Arrow IPC streaming format."""
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    async def orders_dataset(
+        self,
+        desde: date,
+        hasta: date,
+        cambios_desde: Optional[datetime] = None
+    ) -> Tuple[pa.Table, datetime]:
+        """
+        Orders created between two days (inclusive, UTC) as an Arrow table,
+        plus the cursor for the next refresh.
+
+        With ``cambios_desde`` only orders written after that cursor are
+        read (the delta to merge by ``id``), so a refresh costs one read per
+        changed order regardless of the range.
+        """
+        firestore = get_firestore_service()
+        start, end = self.day_bounds(desde, hasta)
+        started_at = datetime.now(timezone.utc)
+
+        if cambios_desde is None:
+            read = await firestore.get_orders_in_range(start, end, self.ORDER_FIELDS)
+            orders = read
+        else:
+            # Changes to orders outside the range are dropped but still
+            # advance the cursor
+            read = await firestore.get_orders_changed_since(cambios_desde, self.ORDER_FIELDS)
+            orders = [
+                o for o in read
+                if isinstance(o.get('fecha_creacion'), datetime) and start <= o['fecha_creacion'] < end
+            ]
+
+        # Exact timestamps (the table column is truncated to ms)
+        stamps = [o['fecha_actualizacion'] for o in read if isinstance(o.get('fecha_actualizacion'), datetime)]
+        cursor = max(stamps) if stamps else (cambios_desde or started_at)
+        return self.orders_to_table(orders), cursor
+
+    # --- KPIs ---
+
+    @staticmethod
+    def kpi_periods(now: datetime) -> Dict[str, datetime]:
+        """UTC starts of the KPI periods: today, ISO week, month and previous month."""
+        hoy = datetime.combine(now.astimezone(timezone.utc).date(), time.min, tzinfo=timezone.utc)
+        mes = hoy.replace(day=1)
+        return {
+            "hoy": hoy,
+            "semana": hoy - timedelta(days=hoy.weekday()),
+            "mes": mes,
+            "mes_anterior": (mes - timedelta(days=1)).replace(day=1),
+        }
+
+    @staticmethod
+    def kpis_from_table(table: pa.Table, now: datetime) -> KPIMetrics:
+        """
+        Compute ``KPIMetrics`` from an order table (``ORDER_SCHEMA``) in one
+        vectorized pass.
+
+        Sales (ventas_*, ticket_promedio, producto_estrella) count listo and
+        entregado orders, like ``ventas_diarias``; ordenes_hoy and the
+        customer KPIs count every non-cancelled order. A customer is new
+        when their first order in the table falls in the current month, and
+        retention is the share of last month's customers who ordered again
+        this month. Periods are UTC days.
+        """
+        if table.num_rows == 0:
+            return KPIMetrics()
+
+        periods = AnalyticsService.kpi_periods(now)
+        ms = {name: int(start.timestamp() * 1000) for name, start in periods.items()}
+
+        fecha = pc.fill_null(table.column("fecha_creacion").cast(pa.int64()), 0).to_numpy()
+        total = pc.fill_null(table.column("total"), 0.0).to_numpy()
+        estado = table.column("estado").cast(pa.string())
+        valid = ~pc.fill_null(pc.equal(estado, OrderStatus.CANCELADO.value), True).to_numpy(zero_copy_only=False)
+        sold = pc.fill_null(
+            pc.is_in(estado, value_set=pa.array(FirestoreService.COMPLETED_STATUSES)), False
+        ).to_numpy(zero_copy_only=False)
+
+        today, week, month = fecha >= ms["hoy"], fecha >= ms["semana"], fecha >= ms["mes"]
+        sold_month = sold & month
+        ventas_mes = float(total[sold_month].sum())
+        ordenes_mes = int(sold_month.sum())
+
+        # Explode the item lists once: one row per line, mapped to its order
+        productos = table.column("productos").combine_chunks()
+        lineas = productos.flatten().dictionary_encode()
+        orden_de_linea = pc.list_parent_indices(productos).to_numpy()
+        cantidades = pc.fill_null(table.column("cantidades").combine_chunks().flatten(), 0).to_numpy()
+        en_mes = sold_month[orden_de_linea]
+        unidades = np.bincount(
+            lineas.indices.to_numpy(zero_copy_only=False)[en_mes],
+            weights=cantidades[en_mes],
+            minlength=len(lineas.dictionary)
+        )
+        producto_estrella = (
+            lineas.dictionary[int(unidades.argmax())].as_py() if unidades.size and unidades.max() > 0 else "N/A"
+        )
+
+        # Customers as dense integer codes
+        clientes = table.column("telefono").combine_chunks().dictionary_encode()
+        codigo = pc.fill_null(clientes.indices, -1).to_numpy()
+        con_cliente = valid & (codigo >= 0)
+        n_clientes = len(clientes.dictionary)
+
+        def activos(mask: np.ndarray) -> np.ndarray:
+            return np.bincount(codigo[mask & con_cliente], minlength=n_clientes) > 0
+
+        previos = activos(fecha < ms["mes"])
+        este_mes = activos(month)
+        mes_anterior = activos((fecha >= ms["mes_anterior"]) & ~month)
+        retenidos = int((mes_anterior & este_mes).sum())
+        base = int(mes_anterior.sum())
+
+        return KPIMetrics(
+            ventas_hoy=round(float(total[sold & today].sum()), 2),
+            ventas_semana=round(float(total[sold & week].sum()), 2),
+            ventas_mes=round(ventas_mes, 2),
+            ordenes_hoy=int((valid & today).sum()),
+            ticket_promedio=round(ventas_mes / ordenes_mes, 2) if ordenes_mes else 0.0,
+            producto_estrella=producto_estrella,
+            clientes_nuevos=int((este_mes & ~previos).sum()),
+            tasa_retencion=round(retenidos / base, 4) if base else 0.0
+        )
+
+    async def kpis(self) -> KPIMetrics:
+        """
+        Current KPIs, cached for ANALYTICS_KPI_CACHE_SECONDS (one rebuild at a
+        time). Reads ANALYTICS_KPI_HISTORY_DAYS of orders before the month,
+        and at least the previous month.
+        """
+        cached = self._kpi_cache
+        if cached and datetime.now(timezone.utc) < cached[0]:
+            return cached[1]
+
+        async with self._kpi_lock:
+            now = datetime.now(timezone.utc)
+            cached = self._kpi_cache
+            if cached and now < cached[0]:
+                return cached[1]
+
+            periods = self.kpi_periods(now)
+            start = min(periods["mes_anterior"], periods["mes"] - timedelta(days=settings.ANALYTICS_KPI_HISTORY_DAYS))
+            orders = await get_firestore_service().get_orders_in_range(
+                start, periods["hoy"] + timedelta(days=1), self.ORDER_FIELDS
+            )
+            metrics = self.kpis_from_table(self.orders_to_table(orders), now)
+            self._kpi_cache = (now + timedelta(seconds=settings.ANALYTICS_KPI_CACHE_SECONDS), metrics)
+            return metrics
+
+
+@lru_cache()
+def get_analytics_service() -> AnalyticsService:
+    """Get singleton instance of AnalyticsService."""
+    return AnalyticsService()
@@ -0,0 +1,325 @@
+"""
+Chat Buffer Service - Debounce of rapid consecutive chat messages.
+Provides storage for messages waiting in the debounce window (an in-process
+backend and a Redis backend shared by every uvicorn worker / Cloud Run
+instance) and the event-driven debouncer used by the chat router.
+"""
+from abc import ABC, abstractmethod
+from typing import Optional, Dict, List, Callable
+from dataclasses import dataclass, field
+from functools import lru_cache
+import asyncio
+import time
+import uuid
+
+from app.core.config import settings
+from app.services.context_cache import get_context_cache
+
+
+@dataclass
+class DrainedTurn:
+    """Messages taken from the buffer for one turn."""
+    mensajes: List[str]
+    # The phone's previous turn was handled by another process
+    handed_over: bool = False
+
+
+class MessageBuffer(ABC):
+    """
+    Per-phone message buffer with a "latest request" token.
+    Each push returns a token; only the holder of the latest token may drain.
+    """
+
+    # True when the buffer is shared by several processes
+    shared: bool = False
+
+    @abstractmethod
+    async def push(self, telefono: str, mensaje: str) -> str:
+        """Append a message and return the token of this (now latest) request."""
+
+    @abstractmethod
+    async def drain(self, telefono: str, token: str) -> Optional[DrainedTurn]:
+        """
+        Atomically take all buffered messages if the token is still the latest.
+        Returns None when a newer request superseded this one.
+        """
+
+
+@dataclass
+class _BufferEntry:
+    token: str
+    mensajes: List[str] = field(default_factory=list)
+    touched: float = field(default_factory=time.monotonic)
+
+
+class InMemoryMessageBuffer(MessageBuffer):
+    """
+    Process-local buffer. Entries are evicted once idle for ``idle_seconds``
+    so the dict does not grow with every phone ever seen.
+    """
+
+    def __init__(self, idle_seconds: float):
+        self._idle_seconds = idle_seconds
+        self._entries: Dict[str, _BufferEntry] = {}
+        self._last_sweep = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _evict_idle(self, now: float):
+        """Drop idle entries (runs at most once per idle window)."""
+        if now - self._last_sweep < self._idle_seconds:
+            return
+        self._last_sweep = now
+        for telefono in [t for t, e in self._entries.items() if now - e.touched > self._idle_seconds]:
+            del self._entries[telefono]
+
+    async def push(self, telefono: str, mensaje: str) -> str:
+        async with self._lock:
+            now = time.monotonic()
+            self._evict_idle(now)
+            token = str(uuid.uuid4())
+            entry = self._entries.setdefault(telefono, _BufferEntry(token=token))
+            entry.token = token
+            entry.touched = now
+            entry.mensajes.append(mensaje)
+            return token
+
+    async def drain(self, telefono: str, token: str) -> Optional[DrainedTurn]:
+        async with self._lock:
+            entry = self._entries.get(telefono)
+            if entry is None or entry.token != token:
+                return None
+            del self._entries[telefono]
+            return DrainedTurn(entry.mensajes)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisMessageBuffer(MessageBuffer):
+    """
+    Buffer shared across processes through Redis (or any server speaking the
+    Redis protocol). Keys expire after ``idle_seconds`` without activity.
+
+    Each drain also records this process as the owner of the phone's last
+    turn, so the drain that follows a turn handled elsewhere is reported as
+    ``handed_over`` (this process' cached context for the phone is stale).
+
+    Args:
+        url: Redis connection URL (ignored when ``client`` is given)
+        idle_seconds: TTL applied to the buffer keys on every push
+        owner_seconds: How long the owner of a phone's last turn is remembered
+            (at least the context cache TTL; a forgotten owner counts as a handover)
+        client: Optional ``redis.asyncio`` compatible client (e.g. a local stand-in)
+    """
+
+    shared = True
+
+    # Drain only if the caller still holds the latest token; returns the
+    # previous owner ("" if unknown) followed by the messages
+    _DRAIN_SCRIPT = """
+if redis.call('GET', KEYS[2]) == ARGV[1] then
+    local mensajes = redis.call('LRANGE', KEYS[1], 0, -1)
+    redis.call('DEL', KEYS[1], KEYS[2])
+    local owner = redis.call('GET', KEYS[3]) or ''
+    redis.call('SET', KEYS[3], ARGV[2], 'EX', ARGV[3])
+    table.insert(mensajes, 1, owner)
+    return mensajes
+end
+return false
+"""
+
+    def __init__(self, url: Optional[str], idle_seconds: float, owner_seconds: float = 600.0, client=None):
+        if client is None:
+            try:
+                import redis.asyncio as redis_asyncio
+            except ImportError as e:
+                raise RuntimeError("CHAT_BUFFER_BACKEND=redis requiere el paquete 'redis'") from e
+            if not url:
+                raise RuntimeError("CHAT_BUFFER_BACKEND=redis requiere REDIS_URL")
+            client = redis_asyncio.from_url(url, decode_responses=True)
+        self._client = client
+        self._ttl = max(1, int(idle_seconds))
+        self._owner_ttl = max(1, int(owner_seconds))
+        self._owner = str(uuid.uuid4())
+        self._drain = self._client.register_script(self._DRAIN_SCRIPT)
+
+    @staticmethod
+    def _keys(telefono: str) -> List[str]:
+        return [f"chat_buffer:{telefono}:mensajes", f"chat_buffer:{telefono}:token"]
+
+    @staticmethod
+    def _owner_key(telefono: str) -> str:
+        return f"chat_buffer:{telefono}:owner"
+
+    async def push(self, telefono: str, mensaje: str) -> str:
+        mensajes_key, token_key = self._keys(telefono)
+        token = str(uuid.uuid4())
+        async with self._client.pipeline(transaction=True) as pipe:
+            pipe.rpush(mensajes_key, mensaje)
+            pipe.set(token_key, token)
+            pipe.expire(mensajes_key, self._ttl)
+            pipe.expire(token_key, self._ttl)
+            await pipe.execute()
+        return token
+
+    async def drain(self, telefono: str, token: str) -> Optional[DrainedTurn]:
+        result = await self._drain(
+            keys=[*self._keys(telefono), self._owner_key(telefono)],
+            args=[token, self._owner, self._owner_ttl]
+        )
+        if not result:
+            return None
+        owner, *mensajes = result
+        return DrainedTurn(mensajes, handed_over=owner != self._owner)
+
+
+@dataclass
+class _PendingTurn:
+    token: str
+    future: asyncio.Future
+    timer: asyncio.Task
+
+
+@dataclass
+class _PhoneLock:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    users: int = 0
+
+
+class ChatDebouncer:
+    """
+    Event-driven debounce: one timer per phone, reset by every new message.
+
+    When a message arrives the previous caller for that phone is released
+    immediately (its future resolves to None) and the timer restarts. When
+    the window elapses the latest caller receives the merged text. The window
+    shortens when the message looks complete or the client says it is done.
+
+    ``on_handover`` is called with the phone when a drained turn follows one
+    handled by another process (shared buffer), before the caller gets it.
+    """
+
+    # A message ending like this is treated as a finished thought
+    COMPLETE_ENDINGS = ("?", "!", ".")
+
+    def __init__(
+        self,
+        buffer: MessageBuffer,
+        window_seconds: float,
+        min_window_seconds: float,
+        on_handover: Optional[Callable[[str], None]] = None
+    ):
+        self._buffer = buffer
+        self._window = window_seconds
+        self._min_window = min_window_seconds
+        self._on_handover = on_handover
+        self._pending: Dict[str, _PendingTurn] = {}
+        self._locks: Dict[str, _PhoneLock] = {}
+
+    @property
+    def shared(self) -> bool:
+        """True when turns for a phone may be processed by another process."""
+        return self._buffer.shared
+
+    def window_for(self, mensaje: str, fin: bool = False) -> float:
+        """Debounce window for a message (adaptive)."""
+        if fin:
+            return 0.0
+        if mensaje.rstrip().endswith(self.COMPLETE_ENDINGS):
+            return self._min_window
+        return self._window
+
+    async def submit(self, telefono: str, mensaje: str, fin: bool = False) -> Optional[str]:
+        """
+        Buffer a message and wait for the debounce window.
+
+        Returns:
+            The merged text of all buffered messages for the latest caller,
+            or None if this call was superseded by a newer message.
+        """
+        # Push and timer re-arm run in push order for a phone: otherwise a
+        # caller resuming late could re-arm with a stale token, whose drain
+        # fails and leaves the newer message buffered
+        phone_lock = self._locks.setdefault(telefono, _PhoneLock())
+        phone_lock.users += 1
+        try:
+            async with phone_lock.lock:
+                token = await self._buffer.push(telefono, mensaje)
+
+                previous = self._pending.get(telefono)
+                if previous is not None:
+                    previous.timer.cancel()
+                    if not previous.future.done():
+                        previous.future.set_result(None)
+
+                future = asyncio.get_running_loop().create_future()
+                timer = asyncio.create_task(
+                    self._fire_after(self.window_for(mensaje, fin), telefono, token, future)
+                )
+                self._pending[telefono] = _PendingTurn(token=token, future=future, timer=timer)
+        finally:
+            phone_lock.users -= 1
+            if not phone_lock.users:
+                del self._locks[telefono]
+        return await future
+
+    async def _fire_after(self, delay: float, telefono: str, token: str, future: asyncio.Future):
+        """Drain the buffer once the window elapses without newer messages."""
+        await asyncio.sleep(delay)
+
+        pending = self._pending.get(telefono)
+        if pending is not None and pending.token == token:
+            del self._pending[telefono]
+
+        # The caller went away (client disconnected): keep the messages
+        # buffered so they merge into the phone's next turn
+        if future.cancelled():
+            return
+
+        try:
+            # None if a newer message reached another worker (shared backend)
+            turn = await self._buffer.drain(telefono, token)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+
+        if turn is not None and turn.handed_over and self._on_handover is not None:
+            self._on_handover(telefono)
+
+        mensajes = turn.mensajes if turn is not None else None
+        if future.cancelled():
+            if mensajes:
+                await self._buffer.push(telefono, " ".join(mensajes))
+        elif not future.done():
+            future.set_result(" ".join(mensajes) if mensajes else None)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+
+@lru_cache()
+def get_message_buffer() -> MessageBuffer:
+    """Get the configured message buffer backend (singleton)."""
+    if settings.CHAT_BUFFER_BACKEND == "redis":
+        return RedisMessageBuffer(
+            settings.REDIS_URL,
+            settings.CHAT_BUFFER_IDLE_SECONDS,
+            owner_seconds=settings.CONTEXT_CACHE_TTL_SECONDS
+        )
+    return InMemoryMessageBuffer(settings.CHAT_BUFFER_IDLE_SECONDS)
+
+
+@lru_cache()
+def get_chat_debouncer() -> ChatDebouncer:
+    """
+    Get singleton instance of ChatDebouncer.
+    A turn that follows one handled by another worker drops this process'
+    cached context for the phone, which that worker's writes made stale.
+    """
+    return ChatDebouncer(
+        get_message_buffer(),
+        window_seconds=settings.MESSAGE_BUFFER_SECONDS,
+        min_window_seconds=settings.MESSAGE_BUFFER_MIN_SECONDS,
+        on_handover=get_context_cache().invalidate
+    )
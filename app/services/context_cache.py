@@ -0,0 +1,235 @@
+"""
+Context Cache Service - Per-customer conversation context kept in memory.
+Holds the recent chat history, the conversation summary and the customer
+profile for each phone so a chat turn can be served without re-reading what
+this process just wrote.
+Bounded LRU (entries and approximate bytes) with a TTL per entry.
+"""
+from typing import Optional, Dict, Any, List, Deque, Tuple
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from functools import lru_cache
+import threading
+import time
+
+from app.core.config import settings
+
+# Marks a profile that was never loaded (a loaded profile may be None)
+_NOT_LOADED = object()
+
+
+@dataclass
+class _ContextEntry:
+    expires_at: float
+    history: Optional[Deque[Dict[str, Any]]] = None
+    profile: Any = _NOT_LOADED
+    summary: Any = _NOT_LOADED
+    size: int = 0
+
+
+class ConversationContextCache:
+    """
+    LRU + TTL cache of conversation context per phone.
+
+    History is kept in Gemini format (``{"role", "parts"}``) in a deque of
+    ``history_limit`` entries. Writers update entries in place
+    (write-through); missing pieces are loaded by FirestoreService.
+
+    Args:
+        max_entries: Maximum number of phones kept
+        max_bytes: Approximate memory bound for all entries
+        ttl_seconds: Lifetime of an entry since it was created; 0 disables
+            the cache (every read misses, writes are dropped)
+        history_limit: Messages kept per phone (CHAT_HISTORY_LIMIT)
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float, history_limit: int):
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._ttl = ttl_seconds
+        self._history_limit = history_limit
+        self._entries: "OrderedDict[str, _ContextEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _estimate_size(entry: _ContextEntry) -> int:
+        size = 200
+        for message in entry.history or ():
+            size += 100 + sum(len(str(p)) for p in message.get("parts", []))
+        if isinstance(entry.profile, dict):
+            size += 100 + len(repr(entry.profile))
+        if isinstance(entry.summary, dict):
+            size += 100 + len(repr(entry.summary))
+        return size
+
+    @property
+    def enabled(self) -> bool:
+        return self._ttl > 0
+
+    def _lookup(self, telefono: str) -> Optional[_ContextEntry]:
+        entry = self._entries.get(telefono)
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic():
+            self._drop(telefono)
+            return None
+        self._entries.move_to_end(telefono)
+        return entry
+
+    def _entry_for_write(self, telefono: str) -> _ContextEntry:
+        entry = self._lookup(telefono)
+        if entry is None:
+            entry = _ContextEntry(expires_at=time.monotonic() + self._ttl)
+            self._entries[telefono] = entry
+        return entry
+
+    def _resize(self, telefono: str, entry: _ContextEntry):
+        new_size = self._estimate_size(entry)
+        self._bytes += new_size - entry.size
+        entry.size = new_size
+        while self._entries and (len(self._entries) > self._max_entries or self._bytes > self._max_bytes):
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            if oldest == telefono:
+                break
+
+    def _drop(self, telefono: str):
+        entry = self._entries.pop(telefono, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    # --- History ---
+
+    def get_history(self, telefono: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """Cached history (last ``limit`` messages) or None on a miss."""
+        with self._lock:
+            entry = self._lookup(telefono)
+            if entry is None or entry.history is None or limit > self._history_limit:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return list(entry.history)[-limit:]
+
+    def set_history(self, telefono: str, history: List[Dict[str, Any]]):
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._entry_for_write(telefono)
+            entry.history = deque(history, maxlen=self._history_limit)
+            self._resize(telefono, entry)
+
+    def append_message(self, telefono: str, role: str, content: str):
+        """Write-through of a saved message (only if the history is cached)."""
+        with self._lock:
+            entry = self._lookup(telefono)
+            if entry is None or entry.history is None:
+                return
+            entry.history.append({"role": "user" if role == "user" else "model", "parts": [content]})
+            self._resize(telefono, entry)
+
+    def invalidate_history(self, telefono: str):
+        with self._lock:
+            entry = self._entries.get(telefono)
+            if entry is not None:
+                entry.history = None
+                self._resize(telefono, entry)
+
+    # --- Profile ---
+
+    def get_profile(self, telefono: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """Return (hit, profile); a hit may carry None for a customer without profile."""
+        with self._lock:
+            entry = self._lookup(telefono)
+            if entry is None or entry.profile is _NOT_LOADED:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            return True, dict(entry.profile) if entry.profile is not None else None
+
+    def set_profile(self, telefono: str, profile: Optional[Dict[str, Any]]):
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._entry_for_write(telefono)
+            entry.profile = dict(profile) if profile is not None else None
+            self._resize(telefono, entry)
+
+    def merge_profile(self, telefono: str, data: Dict[str, Any]):
+        """Write-through of a merged profile update (only if the profile is cached)."""
+        with self._lock:
+            entry = self._lookup(telefono)
+            if entry is None or entry.profile is _NOT_LOADED:
+                return
+            entry.profile = {**(entry.profile or {}), **data}
+            self._resize(telefono, entry)
+
+    def invalidate_profile(self, telefono: str):
+        with self._lock:
+            entry = self._entries.get(telefono)
+            if entry is not None:
+                entry.profile = _NOT_LOADED
+                self._resize(telefono, entry)
+
+    # --- Conversation summary ---
+
+    def get_summary(self, telefono: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """Return (hit, summary); a hit may carry None for a phone without summary."""
+        with self._lock:
+            entry = self._lookup(telefono)
+            if entry is None or entry.summary is _NOT_LOADED:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            return True, dict(entry.summary) if entry.summary is not None else None
+
+    def set_summary(self, telefono: str, summary: Optional[Dict[str, Any]]):
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._entry_for_write(telefono)
+            entry.summary = dict(summary) if summary is not None else None
+            self._resize(telefono, entry)
+
+    # --- Housekeeping ---
+
+    def invalidate(self, telefono: str):
+        """Forget everything cached for a phone."""
+        with self._lock:
+            self._drop(telefono)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+@lru_cache()
+def get_context_cache() -> ConversationContextCache:
+    """
+    Get singleton instance of ConversationContextCache.
+    With a shared chat buffer the debouncer invalidates a phone when its
+    previous turn ran in another process (see ChatDebouncer).
+    """
+    return ConversationContextCache(
+        max_entries=settings.CONTEXT_CACHE_MAX_ENTRIES,
+        max_bytes=settings.CONTEXT_CACHE_MAX_BYTES,
+        ttl_seconds=settings.CONTEXT_CACHE_TTL_SECONDS,
+        history_limit=settings.CHAT_HISTORY_LIMIT
+    )
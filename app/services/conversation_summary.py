@@ -0,0 +1,148 @@
+"""
+Conversation Summary Service - Rolling summary of older chat turns.
+Every few messages a background task folds the older messages of the
+conversation into a per-customer summary document, so the prompt carries
+one summary entry plus the messages after it (at most CHAT_HISTORY_LIMIT)
+no matter how long the conversation gets.
+"""
+from typing import Optional, Dict, Any, List, Set
+from functools import lru_cache
+import asyncio
+
+import google.generativeai as genai
+
+from app.core.config import settings
+from app.models.schemas import ConversationSummary
+from app.services.firestore_service import get_firestore_service
+from app.services.token_usage import get_token_usage_tracker
+
+
+SUMMARY_INSTRUCTION = """Eres el asistente de memoria de la cafetería "Justicia y Café".
+Recibes el resumen previo de la conversación con un cliente y los mensajes nuevos.
+Devuelve un resumen actualizado en español, en texto plano y en tercera persona, con
+solo lo útil para atenderlo después: nombre, gustos y restricciones, pedidos hechos o
+cancelados, quejas y temas pendientes. Omite saludos y charla sin información."""
+
+
+class ConversationSummarizer:
+    """
+    Singleton background summarizer.
+
+    ``note_turn`` is called after each chat turn; once a customer
+    accumulates CHAT_SUMMARY_EVERY_MESSAGES new messages a task refreshes
+    their summary off the request path (one task per customer at a time).
+    """
+
+    _instance: Optional['ConversationSummarizer'] = None
+    _counts: Optional[Dict[str, int]] = None
+
+    def __new__(cls) -> 'ConversationSummarizer':
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if self._counts is None:
+            self._counts = {}
+            self._running: Set[str] = set()
+            self._tasks: Set[asyncio.Task] = set()
+            self._model: Optional[genai.GenerativeModel] = None
+            self.runs = 0
+            self.failures = 0
+
+    def note_turn(self, telefono: str, mensajes: int = 2):
+        """Count the messages of a finished turn and refresh the summary when due."""
+        if not settings.CHAT_SUMMARY_ENABLED:
+            return
+
+        count = self._counts.get(telefono, 0) + mensajes
+        if count < settings.CHAT_SUMMARY_EVERY_MESSAGES or telefono in self._running:
+            self._counts[telefono] = count
+            return
+
+        self._counts.pop(telefono, None)
+        self._running.add(telefono)
+        task = asyncio.create_task(self._summarize(telefono))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _summarize(self, telefono: str):
+        """Fold the messages not yet summarized (except the most recent) into the summary."""
+        try:
+            firestore = get_firestore_service()
+            previous = await firestore.get_conversation_summary(telefono) or {}
+            # Summarize up to K messages before the end of the recent window:
+            # until the next refresh (K messages later) every message is
+            # either in the summary or in the window
+            mensajes = await firestore.get_messages_to_summarize(
+                telefono,
+                since=previous.get('hasta'),
+                keep_recent=max(0, settings.CHAT_HISTORY_LIMIT - settings.CHAT_SUMMARY_EVERY_MESSAGES),
+                max_messages=settings.CHAT_SUMMARY_MAX_SOURCE_MESSAGES
+            )
+            if not mensajes:
+                return
+
+            resumen = await self._generate(telefono, previous.get('resumen'), mensajes)
+            if not resumen:
+                return
+
+            await firestore.save_conversation_summary(telefono, ConversationSummary(
+                resumen=resumen,
+                mensajes_resumidos=previous.get('mensajes_resumidos', 0) + len(mensajes),
+                hasta=mensajes[-1]['timestamp']
+            ))
+            self.runs += 1
+        except Exception as e:
+            self.failures += 1
+            print(f"⚠️ Error resumiendo conversación de {telefono}: {e}")
+        finally:
+            self._running.discard(telefono)
+
+    def _get_model(self) -> genai.GenerativeModel:
+        if self._model is None:
+            self._model = genai.GenerativeModel(
+                model_name=settings.GEMINI_MODEL,
+                system_instruction=SUMMARY_INSTRUCTION,
+                generation_config=genai.types.GenerationConfig(
+                    temperature=0.1,
+                    max_output_tokens=512,
+                )
+            )
+        return self._model
+
+    async def _generate(self, telefono: str, previo: Optional[str], mensajes: List[Dict[str, Any]]) -> str:
+        """Ask Gemini for the updated summary."""
+        transcript = "\n".join(
+            f"{'Cliente' if m.get('role') == 'user' else 'Asistente'}: {m.get('content', '')}" for m in mensajes
+        )
+        prompt = f"### RESUMEN PREVIO\n{previo or '(sin resumen)'}\n\n### MENSAJES NUEVOS\n{transcript}"
+
+        response = await self._get_model().generate_content_async(prompt)
+        get_token_usage_tracker().record(
+            telefono,
+            getattr(response, "usage_metadata", None),
+            prompt_chars=len(SUMMARY_INSTRUCTION) + len(prompt),
+            history_chars=0
+        )
+        return (response.text or "").strip()[:settings.CHAT_SUMMARY_MAX_CHARS]
+
+    async def stop(self):
+        """Cancel in-flight summaries (called on application shutdown)."""
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "resumenes": self.runs,
+            "fallos": self.failures,
+            "en_curso": len(self._running),
+        }
+
+
+@lru_cache()
+def get_conversation_summarizer() -> ConversationSummarizer:
+    """Get singleton instance of ConversationSummarizer."""
+    return ConversationSummarizer()
@@ -2,25 +2,328 @@
 Firestore Service - Database operations singleton.
 Handles all CRUD operations for orders, chat history, and customer profiles.
 """
-from typing import Optional, List, Dict, Any
-from datetime import datetime, timezone
-from functools import lru_cache
+from typing import Optional, List, Dict, Any, Callable, Deque, Set, Tuple, TypeVar
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache, partial
+from concurrent.futures import Executor, ThreadPoolExecutor
+import asyncio
+import threading
 
 from google.cloud import firestore
 from google.cloud.firestore_v1.base_query import FieldFilter
 
 from app.core.config import settings
-from app.models.schemas import Order, OrderItem, ChatMessage, OrderStatus, CustomerProfile, Insumo
+from app.services.context_cache import get_context_cache
+from app.models.schemas import Order, OrderItem, ChatMessage, ConversationSummary, OrderStatus, CustomerProfile, Insumo, DailySales
+
+T = TypeVar("T")
+
+
+# Callback for order changes: list of (tipo, order) with tipo added/modified/removed
+OrderChangeListener = Callable[[List[Tuple[str, Dict[str, Any]]]], None]
+
+
+class ActiveOrdersView:
+    """
+    In-memory materialized view of the non-terminal orders, indexed by id,
+    status and customer phone.
+
+    Fed by a Firestore snapshot listener (invoked on the listener thread)
+    and by write-through from FirestoreService, so every access holds a lock.
+    Readers get copies; the view itself is only mutated here.
+    """
+
+    STATUSES = (
+        OrderStatus.PENDIENTE.value,
+        OrderStatus.EN_PREPARACION.value,
+        OrderStatus.LISTO.value,
+    )
+
+    # Write-through skips server-side transforms; the listener fills them in
+    _TRANSFORMS = (firestore.Increment, firestore.ArrayUnion, firestore.ArrayRemove)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._by_status: Dict[str, Set[str]] = defaultdict(set)
+        self._by_phone: Dict[str, Set[str]] = defaultdict(set)
+        self._listeners: List[OrderChangeListener] = []
+        self._watch = None
+        self.synced = False
+
+    @staticmethod
+    def _sort_key(order: Dict[str, Any]):
+        fecha = order.get('fecha_creacion')
+        return (fecha is None, fecha or 0)
+
+    def _remove(self, order_id: str) -> Optional[Dict[str, Any]]:
+        order = self._by_id.pop(order_id, None)
+        if order is not None:
+            self._by_status[order.get('estado')].discard(order_id)
+            self._by_phone[order.get('id_cliente')].discard(order_id)
+        return order
+
+    def _put(self, order_id: str, data: Dict[str, Any]):
+        self._remove(order_id)
+        order = dict(data, id=order_id)
+        order['estado'] = getattr(order.get('estado'), 'value', order.get('estado'))
+        if order['estado'] not in self.STATUSES:
+            return
+        self._by_id[order_id] = order
+        self._by_status[order['estado']].add(order_id)
+        self._by_phone[order.get('id_cliente')].add(order_id)
+
+    # --- Feed ---
+
+    def attach(self, query):
+        """Start the snapshot listener on the non-terminal orders query."""
+        if self._watch is None:
+            self._watch = query.on_snapshot(self._on_snapshot)
+
+    def detach(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+        with self._lock:
+            self.synced = False
+
+    @property
+    def is_attached(self) -> bool:
+        return self._watch is not None
+
+    def _on_snapshot(self, docs, changes, read_time):
+        """Listener callback (runs on the Firestore listener thread)."""
+        try:
+            events = []
+            with self._lock:
+                for change in changes:
+                    tipo = change.type.name.lower()
+                    if tipo == "removed":
+                        self._remove(change.document.id)
+                    else:
+                        self._put(change.document.id, change.document.to_dict() or {})
+                    events.append((tipo, dict(change.document.to_dict() or {}, id=change.document.id)))
+                self.synced = True
+                listeners = list(self._listeners)
+            for listener in listeners:
+                listener(events)
+        except Exception as e:
+            print(f"❌ Error aplicando cambios de órdenes: {e}")
+
+    def subscribe(self, listener: OrderChangeListener) -> Callable[[], None]:
+        """
+        Register a change listener. It first receives the current contents
+        as ``added`` events. Returns a function that unsubscribes it.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+            current = [("added", dict(o)) for o in self._by_id.values()]
+        if current:
+            listener(current)
+
+        def unsubscribe():
+            with self._lock:
+                if listener in self._listeners:
+                    self._listeners.remove(listener)
+        return unsubscribe
+
+    # --- Write-through ---
+
+    def upsert(self, order_id: str, data: Dict[str, Any]):
+        with self._lock:
+            self._put(order_id, data)
+
+    def patch(self, order_id: str, updates: Dict[str, Any]):
+        with self._lock:
+            current = self._by_id.get(order_id)
+            if current is None:
+                return
+            plain = {
+                k: v for k, v in updates.items()
+                if not isinstance(v, self._TRANSFORMS)
+                and v is not firestore.SERVER_TIMESTAMP and v is not firestore.DELETE_FIELD
+            }
+            self._put(order_id, {**current, **plain})
+
+    # --- Reads ---
+
+    def covers(self, statuses: List[str]) -> bool:
+        """True if the view is live and holds every order in these states."""
+        return self.synced and all(s in self.STATUSES for s in statuses)
+
+    def get(self, order_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            order = self._by_id.get(order_id)
+            return dict(order) if order else None
+
+    def pending_for(self, telefono: str) -> Optional[Dict[str, Any]]:
+        """Oldest pending order of a customer."""
+        with self._lock:
+            ids = self._by_phone.get(telefono, set()) & self._by_status[OrderStatus.PENDIENTE.value]
+            orders = [dict(self._by_id[i]) for i in ids]
+        return min(orders, key=self._sort_key) if orders else None
+
+    def latest_for(self, telefono: str) -> Optional[Dict[str, Any]]:
+        """Newest order of a customer (any non-terminal state)."""
+        with self._lock:
+            orders = [dict(self._by_id[i]) for i in self._by_phone.get(telefono, ())]
+        return max(orders, key=self._sort_key) if orders else None
+
+    def by_statuses(self, statuses: List[str]) -> List[Dict[str, Any]]:
+        """Orders in any of the given states, oldest first."""
+        with self._lock:
+            orders = [dict(self._by_id[i]) for s in statuses for i in self._by_status.get(s, ())]
+        return sorted(orders, key=self._sort_key)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+
+@dataclass
+class _QueuedMessage:
+    telefono: str
+    reference: Any  # DocumentReference with a client-generated id
+    data: Dict[str, Any]
+
+
+class ChatWriteBehind:
+    """
+    Write-behind queue for chat history.
+
+    Messages are committed in ``WriteBatch`` chunks by a single background
+    task, flushed when ``batch_size`` messages are queued or ``flush_seconds``
+    after the first one. One committer and FIFO order keep per-phone order;
+    timestamps are taken at enqueue time so history queries sort correctly.
+    Unflushed messages remain readable through ``pending_for``.
+    """
+
+    MAX_ATTEMPTS = 3
+
+    def __init__(self, service: 'FirestoreService', batch_size: int, flush_seconds: float):
+        self._service = service
+        self._batch_size = batch_size
+        self._flush_seconds = flush_seconds
+        self._queue: Deque[_QueuedMessage] = deque()
+        self._inflight: List[_QueuedMessage] = []
+        self._task: Optional[asyncio.Task] = None
+        self._has_items: Optional[asyncio.Event] = None
+        self._full: Optional[asyncio.Event] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._commit_lock: Optional[asyncio.Lock] = None
+        self.dropped = 0
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._has_items = asyncio.Event()
+            self._full = asyncio.Event()
+            self._stopping = asyncio.Event()
+            self._commit_lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run_loop())
+
+    def enqueue(self, telefono: str, reference: Any, data: Dict[str, Any]):
+        self._ensure_started()
+        self._queue.append(_QueuedMessage(telefono, reference, data))
+        self._has_items.set()
+        if len(self._queue) >= self._batch_size:
+            self._full.set()
+
+    def pending_for(self, telefono: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Unflushed (queued or in-flight) messages of a phone as (doc_id, data), oldest first."""
+        return [
+            (m.reference.id, m.data)
+            for m in (*self._inflight, *self._queue) if m.telefono == telefono
+        ]
+
+    async def _wait_or_stop(self, event: asyncio.Event, timeout: Optional[float] = None):
+        """
+        Wait until ``event`` or the stop event is set (or the timeout ends).
+        Unlike ``wait_for``, a cancellation arriving while the event is set
+        is never swallowed.
+        """
+        waiters = {asyncio.ensure_future(event.wait()), asyncio.ensure_future(self._stopping.wait())}
+        try:
+            await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    async def _run_loop(self):
+        while not self._stopping.is_set():
+            await self._wait_or_stop(self._has_items)
+            if self._stopping.is_set():
+                return
+            await self._wait_or_stop(self._full, self._flush_seconds)
+            if self._stopping.is_set():
+                return
+            await self.flush()
+
+    async def flush(self):
+        """Commit everything queued so far (in order)."""
+        if self._commit_lock is None:
+            return
+        async with self._commit_lock:
+            while self._queue:
+                self._inflight = [self._queue.popleft() for _ in range(min(self._batch_size, len(self._queue)))]
+                await self._commit(self._inflight)
+                self._inflight = []
+            self._has_items.clear()
+            self._full.clear()
+
+    async def _commit(self, messages: List[_QueuedMessage]):
+        batch = self._service.db.batch()
+        for message in messages:
+            batch.set(message.reference, message.data)
+        for attempt in range(1, self.MAX_ATTEMPTS + 1):
+            try:
+                await self._service._run(batch.commit)
+                return
+            except Exception as e:
+                if attempt == self.MAX_ATTEMPTS:
+                    self.dropped += len(messages)
+                    print(f"❌ Error guardando {len(messages)} mensajes (descartados): {e}")
+                    return
+                await asyncio.sleep(0.2 * 2 ** attempt)
+
+    async def stop(self):
+        """Stop the background task and flush the remaining messages."""
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self.flush()
+        task, self._task = self._task, None
+        await task
+
+    def __len__(self) -> int:
+        return len(self._queue) + len(self._inflight)
 
 
 class FirestoreService:
     """
     Singleton service for Firestore database operations.
     Provides CRUD methods for all collections.
+
+    The google-cloud-firestore client is synchronous, so every blocking call
+    made from an async method is offloaded to a bounded thread pool to keep
+    the event loop free while the Firestore round trip is in flight.
+
+    Non-terminal orders are also kept in an ActiveOrdersView fed by a
+    snapshot listener; order lookups are served from it once it is synced.
+    Chat messages are persisted write-behind (see ChatWriteBehind), and
+    recent history and profiles are served from the per-customer context
+    cache, which these methods keep current (write-through).
     """
     
     _instance: Optional['FirestoreService'] = None
     _db: Optional[firestore.Client] = None
+    _executor: Optional[Executor] = None
+    _orders_view: Optional[ActiveOrdersView] = None
+    _chat_writer: Optional[ChatWriteBehind] = None
+
+    # Orders in these states count towards purchase history and sales
+    COMPLETED_STATUSES = (OrderStatus.LISTO.value, OrderStatus.ENTREGADO.value)
+    FAVORITE_MIN_COUNT = 3
     
     def __new__(cls) -> 'FirestoreService':
         if cls._instance is None:
@@ -35,6 +338,19 @@ class FirestoreService:
             except Exception as e:
                 print(f"❌ Error conectando Firestore: {e}")
                 self._db = None
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.FIRESTORE_MAX_WORKERS,
+                thread_name_prefix="firestore"
+            )
+        if self._orders_view is None:
+            self._orders_view = ActiveOrdersView()
+        if self._chat_writer is None:
+            self._chat_writer = ChatWriteBehind(
+                self,
+                batch_size=settings.CHAT_WRITE_BATCH_SIZE,
+                flush_seconds=settings.CHAT_WRITE_FLUSH_SECONDS
+            )
     
     @property
     def db(self) -> Optional[firestore.Client]:
@@ -43,6 +359,27 @@ class FirestoreService:
     @property
     def is_connected(self) -> bool:
         return self._db is not None
+
+    @property
+    def pending_chat_writes(self) -> int:
+        """Chat messages queued or in flight in the write-behind queue."""
+        return len(self._chat_writer)
+
+    async def _run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """Run a blocking Firestore call on the bounded executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def flush_pending_writes(self):
+        """Commit queued chat messages (called on application shutdown, before ``shutdown``)."""
+        await self._chat_writer.stop()
+
+    def shutdown(self):
+        """Stop the orders listener and release the executor threads (called on application shutdown)."""
+        self._orders_view.detach()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
     
     # --- Chat History Operations ---
     
@@ -50,67 +387,221 @@ class FirestoreService:
         """
         Retrieve chat history for a customer.
         Returns list in Gemini-compatible format: [{"role": "user/model", "parts": [...]}]
+        Includes messages still waiting in the write-behind queue. Older turns
+        come as the conversation summary, a single leading user entry.
+        """
+        historial, summary = await self.get_chat_context(telefono, limit)
+        return self.with_summary(historial, summary)
+
+    async def get_chat_context(
+        self,
+        telefono: str,
+        limit: int = None
+    ) -> Tuple[List[Dict[str, str]], Optional[Dict[str, Any]]]:
+        """
+        Recent messages (Gemini format) and the conversation summary, apart.
+        Only the messages after the last summarized one are read, at most
+        ``limit``; everything older is covered by the summary.
         """
         if not self.is_connected:
-            return []
-        
+            return [], None
+
+        if not settings.CHAT_SUMMARY_ENABLED:
+            return await self._get_recent_messages(telefono, limit), None
+
+        summary = await self.get_conversation_summary(telefono)
+        historial = await self._get_recent_messages(telefono, limit, since=(summary or {}).get('hasta'))
+        return historial, summary
+
+    @staticmethod
+    def with_summary(historial: List[Dict[str, Any]], summary: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Prepend the summary; merged into the first message if that one is also from the user."""
+        if not summary or not summary.get('resumen'):
+            return historial
+        entry = f"### RESUMEN DE LA CONVERSACIÓN ANTERIOR\n{summary['resumen']}"
+        if historial and historial[0]['role'] == "user":
+            return [{"role": "user", "parts": [entry, *historial[0]['parts']]}] + historial[1:]
+        return [{"role": "user", "parts": [entry]}] + historial
+
+    async def _get_recent_messages(
+        self,
+        telefono: str,
+        limit: int = None,
+        since: Optional[datetime] = None
+    ) -> List[Dict[str, str]]:
+        """
+        Last ``limit`` raw messages newer than ``since`` (context cache, then
+        Firestore). The cached history is dropped whenever the summary moves.
+        """
         limit = limit or settings.CHAT_HISTORY_LIMIT
+        context_cache = get_context_cache()
+        
+        cached = context_cache.get_history(telefono, limit)
+        if cached is not None:
+            return cached
         
         try:
-            mensajes_ref = self._db.collection('clientes').document(telefono).collection('chat_history')
-            query = mensajes_ref.order_by('timestamp', direction=firestore.Query.DESCENDING).limit(limit)
-            docs = query.stream()
+            query = self._db.collection('clientes').document(telefono).collection('chat_history')
+            if since is not None:
+                query = query.where(filter=FieldFilter("timestamp", ">", since))
+            query = query.order_by('timestamp', direction=firestore.Query.DESCENDING).limit(limit)
+            docs = await self._run(lambda: list(query.stream()))
             
-            historial_gemini = []
-            msgs = list(docs)[::-1]  # Reverse to chronological order
+            msgs = [(doc.id, doc.to_dict()) for doc in docs[::-1]]  # Reverse to chronological order
+            stored_ids = {doc_id for doc_id, _ in msgs}
+            pending = [
+                (i, d) for i, d in self._chat_writer.pending_for(telefono)
+                if i not in stored_ids and (since is None or d['timestamp'] > since)
+            ]
+            if pending:
+                msgs = sorted(msgs + pending, key=lambda m: m[1]['timestamp'])[-limit:]
             
-            for doc in msgs:
-                datos = doc.to_dict()
+            historial_gemini = []
+            for _, datos in msgs:
                 role = "user" if datos['role'] == "user" else "model"
                 historial_gemini.append({"role": role, "parts": [datos['content']]})
             
+            if limit == settings.CHAT_HISTORY_LIMIT:
+                context_cache.set_history(telefono, historial_gemini)
             return historial_gemini
         except Exception as e:
             print(f"❌ Error obteniendo historial: {e}")
             return []
     
     async def save_message(self, telefono: str, role: str, content: str) -> bool:
-        """Save a chat message to history."""
+        """
+        Save a chat message to history (write-behind).
+        Returns as soon as the message is queued; it is committed in a batch
+        shortly after and is visible to get_chat_history meanwhile.
+        """
         if not self.is_connected:
             return False
         
         try:
             mensajes_ref = self._db.collection('clientes').document(telefono).collection('chat_history')
             nuevo_msg = ChatMessage(role=role, content=content)
-            mensajes_ref.add(nuevo_msg.to_firestore())
+            self._chat_writer.enqueue(telefono, mensajes_ref.document(), nuevo_msg.to_firestore())
+            get_context_cache().append_message(telefono, role, content)
             return True
         except Exception as e:
             print(f"❌ Error guardando mensaje: {e}")
             return False
+
+    async def get_conversation_summary(self, telefono: str) -> Optional[Dict[str, Any]]:
+        """Get the rolling conversation summary of a customer (one document read)."""
+        if not self.is_connected:
+            return None
+
+        context_cache = get_context_cache()
+        hit, summary = context_cache.get_summary(telefono)
+        if hit:
+            return summary
+
+        try:
+            doc_ref = self._db.collection('clientes').document(telefono).collection('memoria').document('resumen')
+            doc = await self._run(doc_ref.get)
+            summary = doc.to_dict() if doc.exists else None
+            context_cache.set_summary(telefono, summary)
+            return summary
+        except Exception as e:
+            print(f"❌ Error obteniendo resumen de {telefono}: {e}")
+            return None
+
+    async def save_conversation_summary(self, telefono: str, summary: ConversationSummary) -> bool:
+        """Replace the conversation summary of a customer."""
+        if not self.is_connected:
+            return False
+
+        try:
+            data = summary.to_firestore()
+            doc_ref = self._db.collection('clientes').document(telefono).collection('memoria').document('resumen')
+            await self._run(doc_ref.set, data)
+            context_cache = get_context_cache()
+            context_cache.set_summary(telefono, data)
+            # The cached history may hold messages the summary now covers
+            context_cache.invalidate_history(telefono)
+            return True
+        except Exception as e:
+            print(f"❌ Error guardando resumen de {telefono}: {e}")
+            return False
+
+    async def get_messages_to_summarize(
+        self,
+        telefono: str,
+        since: Optional[datetime],
+        keep_recent: int,
+        max_messages: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Messages newer than ``since`` that already fell out of the recent
+        window (all but the last ``keep_recent``), oldest first, at most
+        ``max_messages``. Each item has role, content and timestamp.
+        """
+        if not self.is_connected:
+            return []
+
+        try:
+            query = self._db.collection('clientes').document(telefono).collection('chat_history')
+            if since is not None:
+                query = query.where(filter=FieldFilter("timestamp", ">", since))
+            query = query.order_by('timestamp', direction=firestore.Query.DESCENDING).limit(max_messages + keep_recent)
+            docs = await self._run(lambda: list(query.stream()))
+
+            msgs = {doc.id: doc.to_dict() for doc in docs}
+            for doc_id, data in self._chat_writer.pending_for(telefono):
+                msgs.setdefault(doc_id, data)
+            ordered = sorted(msgs.values(), key=lambda m: m['timestamp'])
+            if since is not None:
+                ordered = [m for m in ordered if m['timestamp'] > since]
+            return ordered[:-keep_recent][-max_messages:] if keep_recent else ordered[-max_messages:]
+        except Exception as e:
+            print(f"❌ Error obteniendo mensajes a resumir de {telefono}: {e}")
+            return []
     
     # --- Order Operations ---
     
     async def get_pending_order(self, telefono: str) -> Optional[tuple]:
         """
         Get the pending order for a customer.
-        Returns tuple of (document_snapshot, order_data) or None.
+        Returns tuple of (document, order_data) or None; ``document.id`` is the order id.
+        Served from the active orders view when it is synced.
         """
         if not self.is_connected:
             return None
-        
+
+        if self._orders_view.covers([OrderStatus.PENDIENTE.value]):
+            order = self._orders_view.pending_for(telefono)
+            if settings.ORDERS_VIEW_VERIFY_READS:
+                await self._verify_pending_read(telefono, order)
+            if order is None:
+                return None
+            return (self._db.collection('pedidos').document(order.pop('id')), order)
+
+        return await self._query_pending_order(telefono)
+
+    async def _query_pending_order(self, telefono: str) -> Optional[tuple]:
+        """Pending order lookup straight from Firestore."""
         try:
             query = self._db.collection('pedidos')\
                 .where(filter=FieldFilter("id_cliente", "==", telefono))\
                 .where(filter=FieldFilter("estado", "==", "pendiente"))\
                 .limit(1)
             
-            docs = list(query.stream())
+            docs = await self._run(lambda: list(query.stream()))
             if docs:
                 return (docs[0], docs[0].to_dict())
             return None
         except Exception as e:
             print(f"❌ Error buscando orden pendiente: {e}")
             return None
+
+    async def _verify_pending_read(self, telefono: str, order: Optional[Dict[str, Any]]):
+        """Shadow read: compare a view hit with the direct query and log divergences."""
+        direct = await self._query_pending_order(telefono)
+        direct_id = direct[0].id if direct else None
+        view_id = order['id'] if order else None
+        if direct_id != view_id:
+            print(f"⚠️ Vista de órdenes divergente para {telefono}: vista={view_id} firestore={direct_id}")
     
     async def create_order(self, order: Order) -> bool:
         """Create a new order in Firestore."""
@@ -118,32 +609,97 @@ class FirestoreService:
             return False
         
         try:
-            self._db.collection('pedidos').document(order.id).set(order.to_firestore())
+            doc_ref = self._db.collection('pedidos').document(order.id)
+            data = order.to_firestore()
+            await self._run(doc_ref.set, {**data, "fecha_actualizacion": firestore.SERVER_TIMESTAMP})
+            self._orders_view.upsert(order.id, data)
             return True
         except Exception as e:
             print(f"❌ Error creando orden: {e}")
             return False
     
     async def update_order(self, order_id: str, updates: Dict[str, Any]) -> bool:
-        """Update an existing order."""
+        """Update an existing order (stamps ``fecha_actualizacion``)."""
         if not self.is_connected:
             return False
         
         try:
-            self._db.collection('pedidos').document(order_id).update(updates)
+            doc_ref = self._db.collection('pedidos').document(order_id)
+            await self._run(doc_ref.update, {**updates, "fecha_actualizacion": firestore.SERVER_TIMESTAMP})
+            self._orders_view.patch(order_id, updates)
             return True
         except Exception as e:
             print(f"❌ Error actualizando orden: {e}")
             return False
     
+    async def append_order_items(
+        self,
+        order_id: str,
+        items: List[Dict[str, Any]],
+        prep_minutes: int
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Append items to a pending order ("Comanda Abierta") atomically.
+
+        Runs in a transaction that checks the order is still pending and
+        writes only the delta: ``ArrayUnion`` for the new lines and
+        ``Increment`` for ``total`` and ``tiempo_preparacion_total``, so
+        concurrent appends never lose items.
+
+        Returns the resulting items, total, prep time and estimated delivery,
+        or None if the order no longer exists or left the pending state.
+        Firestore errors are raised to the caller.
+        """
+        if not self.is_connected:
+            return None
+
+        order_ref = self._db.collection('pedidos').document(order_id)
+        total_delta = sum(i['cantidad'] * i['precio_unitario'] for i in items)
+
+        @firestore.transactional
+        def _append(transaction) -> Optional[Dict[str, Any]]:
+            snapshot = order_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                return None
+            data = snapshot.to_dict()
+            if data.get('estado') != OrderStatus.PENDIENTE.value:
+                return None
+
+            tiempo = data.get('tiempo_preparacion_total', 0) + prep_minutes
+            hora_entrega = datetime.now(timezone.utc) + timedelta(minutes=tiempo)
+            transaction.update(order_ref, {
+                "items": firestore.ArrayUnion(items),
+                "total": firestore.Increment(total_delta),
+                "tiempo_preparacion_total": firestore.Increment(prep_minutes),
+                "hora_entrega_estimada": hora_entrega,
+                "fecha_actualizacion": firestore.SERVER_TIMESTAMP
+            })
+            return {
+                "items": data.get('items', []) + items,
+                "total": data.get('total', 0) + total_delta,
+                "tiempo_preparacion_total": tiempo,
+                "hora_entrega_estimada": hora_entrega
+            }
+
+        result = await self._run(_append, self._db.transaction())
+        if result is not None:
+            self._orders_view.patch(order_id, result)
+        return result
+
     async def cancel_order(self, order_id: str) -> bool:
-        """Cancel an order by updating its status."""
-        return await self.update_order(order_id, {"estado": OrderStatus.CANCELADO})
+        """
+        Cancel an order. Goes through update_order_status so cancelling a
+        completed order reverts its counters and daily rollup.
+        """
+        return await self.update_order_status(order_id, OrderStatus.CANCELADO)
     
     async def get_orders_by_status(self, status: OrderStatus) -> List[Dict[str, Any]]:
         """Get all orders with a specific status."""
         if not self.is_connected:
             return []
+
+        if self._orders_view.covers([status.value]):
+            return self._orders_view.by_statuses([status.value])
         
         try:
             query = self._db.collection('pedidos')\
@@ -151,7 +707,7 @@ class FirestoreService:
                 .order_by('fecha_creacion', direction=firestore.Query.ASCENDING)
             
             orders = []
-            for doc in query.stream():
+            for doc in await self._run(lambda: list(query.stream())):
                 order_data = doc.to_dict()
                 order_data['id'] = doc.id
                 orders.append(order_data)
@@ -161,22 +717,196 @@ class FirestoreService:
             print(f"❌ Error obteniendo órdenes: {e}")
             return []
     
+    async def get_orders_by_statuses(self, statuses: List[OrderStatus]) -> List[Dict[str, Any]]:
+        """Get all orders in any of the given states with a single query, oldest first."""
+        if not self.is_connected:
+            return []
+
+        values = [s.value for s in statuses]
+        if self._orders_view.covers(values):
+            return self._orders_view.by_statuses(values)
+
+        try:
+            query = self._db.collection('pedidos')\
+                .where(filter=FieldFilter("estado", "in", values))\
+                .order_by('fecha_creacion', direction=firestore.Query.ASCENDING)
+
+            orders = []
+            for doc in await self._run(lambda: list(query.stream())):
+                order_data = doc.to_dict()
+                order_data['id'] = doc.id
+                orders.append(order_data)
+
+            return orders
+        except Exception as e:
+            print(f"❌ Error obteniendo órdenes: {e}")
+            return []
+
     async def get_active_orders(self) -> List[Dict[str, Any]]:
         """Get all active orders (pending or in preparation)."""
+        return await self.get_orders_by_statuses([OrderStatus.PENDIENTE, OrderStatus.EN_PREPARACION])
+
+    async def get_orders_in_range(self, desde: datetime, hasta: datetime, fields: List[str]) -> List[Dict[str, Any]]:
+        """
+        Get the orders created in [desde, hasta), oldest first, projected to
+        ``fields`` (plus ``id``). Used by the analytics dataset.
+        """
         if not self.is_connected:
             return []
-        
+
         try:
-            # Get pending orders
-            pending = await self.get_orders_by_status(OrderStatus.PENDIENTE)
-            # Get orders in preparation
-            in_prep = await self.get_orders_by_status(OrderStatus.EN_PREPARACION)
-            
-            return pending + in_prep
+            query = self._db.collection('pedidos')\
+                .where(filter=FieldFilter("fecha_creacion", ">=", desde))\
+                .where(filter=FieldFilter("fecha_creacion", "<", hasta))\
+                .order_by('fecha_creacion', direction=firestore.Query.ASCENDING)\
+                .select(fields)
+
+            orders = []
+            for doc in await self._run(lambda: list(query.stream())):
+                order_data = doc.to_dict()
+                order_data['id'] = doc.id
+                orders.append(order_data)
+
+            return orders
         except Exception as e:
-            print(f"❌ Error obteniendo órdenes activas: {e}")
+            print(f"❌ Error obteniendo órdenes por rango: {e}")
             return []
-    
+
+    async def get_orders_changed_since(self, cursor: datetime, fields: List[str]) -> List[Dict[str, Any]]:
+        """
+        Get the orders written after ``cursor`` (``fecha_actualizacion``),
+        oldest change first, projected to ``fields`` (plus ``id``).
+        """
+        if not self.is_connected:
+            return []
+
+        try:
+            query = self._db.collection('pedidos')\
+                .where(filter=FieldFilter("fecha_actualizacion", ">", cursor))\
+                .order_by('fecha_actualizacion', direction=firestore.Query.ASCENDING)\
+                .select(fields)
+
+            orders = []
+            for doc in await self._run(lambda: list(query.stream())):
+                order_data = doc.to_dict()
+                order_data['id'] = doc.id
+                orders.append(order_data)
+
+            return orders
+        except Exception as e:
+            print(f"❌ Error obteniendo órdenes modificadas: {e}")
+            return []
+
+    # --- Active Orders View ---
+
+    def start_orders_view(self):
+        """Attach the snapshot listener that keeps the active orders view current."""
+        if not self.is_connected:
+            return
+
+        try:
+            query = self._db.collection('pedidos')\
+                .where(filter=FieldFilter("estado", "in", list(ActiveOrdersView.STATUSES)))
+            self._orders_view.attach(query)
+            print("📡 Vista de órdenes activas en memoria")
+        except Exception as e:
+            print(f"❌ Error iniciando listener de órdenes: {e}")
+
+    @property
+    def orders_view_synced(self) -> bool:
+        return self._orders_view.synced
+
+    def subscribe_orders(self, listener: OrderChangeListener) -> Optional[Callable[[], None]]:
+        """
+        Receive order changes from the shared listener (called on the listener
+        thread). Returns an unsubscribe function, or None if the view is not running.
+        """
+        if not self._orders_view.is_attached:
+            return None
+        return self._orders_view.subscribe(listener)
+
+    async def check_orders_view(self) -> Dict[str, Any]:
+        """
+        Consistency check: compare the in-memory view with a direct query of
+        the non-terminal orders (ids, status and total).
+        """
+        if not self.is_connected:
+            return {"sincronizada": False, "consistente": False}
+
+        query = self._db.collection('pedidos')\
+            .where(filter=FieldFilter("estado", "in", list(ActiveOrdersView.STATUSES)))
+        docs = await self._run(lambda: list(query.stream()))
+        direct = {doc.id: doc.to_dict() for doc in docs}
+        view = {o['id']: o for o in self._orders_view.by_statuses(list(ActiveOrdersView.STATUSES))}
+
+        distintas = [
+            order_id for order_id in direct.keys() & view.keys()
+            if (direct[order_id].get('estado'), direct[order_id].get('total'))
+            != (view[order_id].get('estado'), view[order_id].get('total'))
+        ]
+        faltantes = sorted(direct.keys() - view.keys())
+        sobrantes = sorted(view.keys() - direct.keys())
+
+        return {
+            "sincronizada": self._orders_view.synced,
+            "en_vista": len(view),
+            "en_firestore": len(direct),
+            "faltantes": faltantes,
+            "sobrantes": sobrantes,
+            "distintas": sorted(distintas),
+            "consistente": not (faltantes or sobrantes or distintas)
+        }
+
+    async def get_latest_active_order(self, telefono: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the newest pending, in-preparation or ready order for a customer.
+        Served from the active orders view when it is synced.
+        """
+        if not self.is_connected:
+            return None
+
+        if self._orders_view.covers(list(ActiveOrdersView.STATUSES)):
+            return self._orders_view.latest_for(telefono)
+
+        try:
+            query = self._db.collection('pedidos')\
+                .where(filter=FieldFilter("id_cliente", "==", telefono))\
+                .where(filter=FieldFilter("estado", "in", list(ActiveOrdersView.STATUSES)))\
+                .order_by('fecha_creacion', direction=firestore.Query.DESCENDING)\
+                .limit(1)
+
+            docs = await self._run(lambda: list(query.stream()))
+            if docs:
+                order_data = docs[0].to_dict()
+                order_data['id'] = docs[0].id
+                return order_data
+            return None
+        except Exception as e:
+            print(f"❌ Error obteniendo orden activa de {telefono}: {e}")
+            return None
+
+    async def get_last_completed_order(self, telefono: str) -> Optional[Dict[str, Any]]:
+        """Get the most recent ready/delivered order for a customer."""
+        if not self.is_connected:
+            return None
+
+        try:
+            query = self._db.collection('pedidos')\
+                .where(filter=FieldFilter("id_cliente", "==", telefono))\
+                .where(filter=FieldFilter("estado", "in", ["entregado", "listo"]))\
+                .order_by('fecha_creacion', direction=firestore.Query.DESCENDING)\
+                .limit(1)
+
+            docs = await self._run(lambda: list(query.stream()))
+            if docs:
+                order_data = docs[0].to_dict()
+                order_data['id'] = docs[0].id
+                return order_data
+            return None
+        except Exception as e:
+            print(f"❌ Error obteniendo última orden de {telefono}: {e}")
+            return None
+
     # --- Menu Operations ---
     
     def get_menu_items(self) -> List[Dict[str, Any]]:
@@ -203,15 +933,20 @@ class FirestoreService:
     # --- Customer Profile Operations ---
     
     async def get_customer_profile(self, telefono: str) -> Optional[Dict[str, Any]]:
-        """Get customer profile data."""
+        """Get customer profile data (served from the context cache when present)."""
         if not self.is_connected:
             return None
         
+        context_cache = get_context_cache()
+        hit, profile = context_cache.get_profile(telefono)
+        if hit:
+            return profile
+        
         try:
-            doc = self._db.collection('clientes').document(telefono).get()
-            if doc.exists:
-                return doc.to_dict()
-            return None
+            doc = await self._run(self._db.collection('clientes').document(telefono).get)
+            profile = doc.to_dict() if doc.exists else None
+            context_cache.set_profile(telefono, profile)
+            return profile
         except Exception as e:
             print(f"❌ Error obteniendo perfil: {e}")
             return None
@@ -222,7 +957,9 @@ class FirestoreService:
             return False
 
         try:
-            self._db.collection('clientes').document(telefono).set(profile_data, merge=True)
+            doc_ref = self._db.collection('clientes').document(telefono)
+            await self._run(doc_ref.set, profile_data, merge=True)
+            get_context_cache().merge_profile(telefono, profile_data)
             return True
         except Exception as e:
             print(f"❌ Error actualizando perfil: {e}")
@@ -236,7 +973,8 @@ class FirestoreService:
             return []
 
         try:
-            docs = self._db.collection('insumos').stream()
+            query = self._db.collection('insumos')
+            docs = await self._run(lambda: list(query.stream()))
 
             insumos = []
             for doc in docs:
@@ -257,7 +995,7 @@ class FirestoreService:
         try:
             doc_ref = self._db.collection('insumos').document()
             insumo.id = doc_ref.id
-            doc_ref.set(insumo.to_firestore())
+            await self._run(doc_ref.set, insumo.to_firestore())
             return True
         except Exception as e:
             print(f"❌ Error creando insumo: {e}")
@@ -269,7 +1007,8 @@ class FirestoreService:
             return False
 
         try:
-            self._db.collection('insumos').document(insumo_id).update(data)
+            doc_ref = self._db.collection('insumos').document(insumo_id)
+            await self._run(doc_ref.update, data)
             return True
         except Exception as e:
             print(f"❌ Error actualizando insumo: {e}")
@@ -277,85 +1016,171 @@ class FirestoreService:
 
     # --- Daily Sales Metrics ---
 
+    @staticmethod
+    def sales_day(order: Dict[str, Any]) -> str:
+        """Rollup document id (UTC day, YYYY-MM-DD) an order counts towards."""
+        fecha = order.get('fecha_creacion')
+        if not isinstance(fecha, datetime):
+            fecha = datetime.now(timezone.utc)
+        elif fecha.tzinfo is not None:
+            fecha = fecha.astimezone(timezone.utc)
+        return fecha.strftime("%Y-%m-%d")
+
+    @staticmethod
+    def order_cost(items: List[Dict[str, Any]]) -> float:
+        """Cost of goods of an order's items."""
+        return sum(
+            item.get('costo_total', item.get('cantidad', 1) * item.get('costo_unitario', 0.0))
+            for item in items
+        )
+
+    @classmethod
+    def sales_rollup_delta(cls, order: Dict[str, Any], sign: int) -> Dict[str, Any]:
+        """
+        Increment transforms that add (sign=1) or remove (sign=-1) a completed
+        order from its ``ventas_diarias`` rollup.
+        """
+        items = order.get('items', [])
+        delta: Dict[str, Any] = {
+            "total_ventas": firestore.Increment(sign * float(order.get('total', 0.0))),
+            "total_ordenes": firestore.Increment(sign),
+            "costo_total": firestore.Increment(sign * cls.order_cost(items)),
+        }
+        counts = cls.count_products(items)
+        if counts:
+            delta["productos_vendidos"] = {
+                name: firestore.Increment(sign * qty) for name, qty in counts.items()
+            }
+        return delta
+
     async def get_daily_sales_metrics(self, date: datetime) -> Dict[str, Any]:
         """
-        Get daily sales metrics for a specific date.
-        Returns total sales and number of orders for that day.
+        Get daily sales metrics for a specific date (UTC day).
+        Reads the ``ventas_diarias/{YYYY-MM-DD}`` rollup maintained by
+        update_order_status: total sales, orders, cost, units per product,
+        average ticket and gross margin.
         """
+        day = date.strftime("%Y-%m-%d")
+        fecha = datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        empty = DailySales(id=day, fecha=fecha).model_dump()
         if not self.is_connected:
-            return {"total_ventas": 0.0, "total_ordenes": 0}
+            return empty
 
         try:
-            # Calculate start and end of the day in UTC
-            start_of_day = date.replace(hour=0, minute=0, second=0, microsecond=0)
-            end_of_day = start_of_day.replace(hour=23, minute=59, second=59, microsecond=999999)
-
-            # Query orders for the day
-            query = self._db.collection('pedidos')\
-                .where(filter=FieldFilter("fecha_creacion", ">=", start_of_day))\
-                .where(filter=FieldFilter("fecha_creacion", "<=", end_of_day))\
-                .where(filter=FieldFilter("estado", "in", ["entregado", "listo"]))
+            doc = await self._run(self._db.collection('ventas_diarias').document(day).get)
+            if not doc.exists:
+                return empty
 
-            docs = list(query.stream())
-
-            total_ventas = 0.0
-            total_ordenes = len(docs)
-
-            for doc in docs:
-                order_data = doc.to_dict()
-                total_ventas += order_data.get('total', 0.0)
-
-            return {
-                "total_ventas": total_ventas,
-                "total_ordenes": total_ordenes
-            }
+            data = doc.to_dict()
+            data.setdefault('fecha', fecha)
+            total_ordenes = data.get('total_ordenes', 0)
+            data['ticket_promedio'] = data.get('total_ventas', 0.0) / total_ordenes if total_ordenes else 0.0
+            return DailySales.from_firestore(data, doc.id).model_dump()
         except Exception as e:
             print(f"❌ Error obteniendo métricas diarias: {e}")
-            return {"total_ventas": 0.0, "total_ordenes": 0}
+            return empty
 
     # --- Premium Personalization Features ---
 
-    async def get_favorite_product(self, telefono: str) -> Optional[str]:
+    @staticmethod
+    def count_products(items: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Count units per product name in a list of order items."""
+        counts: Dict[str, int] = {}
+        for item in items:
+            product_name = item.get('nombre_producto', '')
+            if product_name:
+                counts[product_name] = counts.get(product_name, 0) + item.get('cantidad', 1)
+        return counts
+
+    @classmethod
+    def favorite_from_profile(cls, profile: Optional[Dict[str, Any]]) -> Optional[str]:
         """
-        Get customer's favorite product based on order history.
-        Returns the product name if ordered 3+ times, None otherwise.
+        Pick the most ordered product from the profile counters.
+        Returns None unless it was ordered FAVORITE_MIN_COUNT+ times.
         """
-        if not self.is_connected:
+        counts = (profile or {}).get('productos_contador') or {}
+        if not counts:
             return None
+        product, count = max(counts.items(), key=lambda kv: kv[1])
+        return product if count >= cls.FAVORITE_MIN_COUNT else None
 
-        try:
-            # Query all completed orders for this customer
-            query = self._db.collection('pedidos')\
-                .where(filter=FieldFilter("id_cliente", "==", telefono))\
-                .where(filter=FieldFilter("estado", "in", ["entregado", "listo"]))
+    async def get_favorite_product(self, telefono: str) -> Optional[str]:
+        """
+        Get customer's favorite product from the counters kept on the profile.
+        Single document read; counters are maintained by update_order_status.
+        """
+        profile = await self.get_customer_profile(telefono)
+        return self.favorite_from_profile(profile)
 
-            docs = list(query.stream())
+    async def update_order_status(self, order_id: str, new_status: OrderStatus) -> bool:
+        """
+        Move an order to a new status.
 
-            if not docs:
-                return None
+        Runs in a transaction so that entering a completed state (listo/entregado)
+        increments the customer's ``productos_contador`` and the day's
+        ``ventas_diarias`` rollup in the same commit, and leaving it (e.g. undo
+        listo -> en_preparacion) reverts both increments.
+        """
+        if not self.is_connected:
+            return False
 
-            # Count product occurrences
-            product_counts = {}
+        order_ref = self._db.collection('pedidos').document(order_id)
 
-            for doc in docs:
-                order_data = doc.to_dict()
-                items = order_data.get('items', [])
+        @firestore.transactional
+        def _transition(transaction) -> Tuple[bool, Optional[str]]:
+            """Returns (updated, phone whose counters changed)."""
+            snapshot = order_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                return False, None
 
-                for item in items:
-                    product_name = item.get('nombre_producto', '')
-                    if product_name:
-                        product_counts[product_name] = product_counts.get(product_name, 0) + item.get('cantidad', 1)
+            data = snapshot.to_dict()
+            was_completed = data.get('estado') in self.COMPLETED_STATUSES
+            is_completed = new_status.value in self.COMPLETED_STATUSES
 
-            # Find product ordered 3+ times
-            for product, count in product_counts.items():
-                if count >= 3:
-                    return product
+            transaction.update(order_ref, {
+                "estado": new_status.value,
+                "fecha_actualizacion": firestore.SERVER_TIMESTAMP
+            })
 
-            return None
+            if was_completed == is_completed:
+                return True, None
+
+            sign = 1 if is_completed else -1
+            day = self.sales_day(data)
+            transaction.set(
+                self._db.collection('ventas_diarias').document(day),
+                {
+                    "fecha": datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc),
+                    **self.sales_rollup_delta(data, sign)
+                },
+                merge=True
+            )
 
+            telefono = data.get('id_cliente')
+            if telefono:
+                counts = self.count_products(data.get('items', []))
+                if counts:
+                    transaction.set(
+                        self._db.collection('clientes').document(telefono),
+                        {"productos_contador": {
+                            name: firestore.Increment(sign * qty) for name, qty in counts.items()
+                        }},
+                        merge=True
+                    )
+                    return True, telefono
+            return True, None
+
+        try:
+            updated, counters_changed = await self._run(_transition, self._db.transaction())
+            if updated:
+                self._orders_view.patch(order_id, {"estado": new_status.value})
+            if counters_changed:
+                # The cached profile no longer has the right favorite product
+                get_context_cache().invalidate_profile(counters_changed)
+            return updated
         except Exception as e:
-            print(f"❌ Error obteniendo producto favorito para {telefono}: {e}")
-            return None
+            print(f"❌ Error actualizando estado de orden {order_id}: {e}")
+            return False
 
 
 @lru_cache()
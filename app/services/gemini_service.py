@@ -3,9 +3,11 @@ Gemini AI Service - AI chat processing with business logic.
 Handles order interpretation, cancellation, and conversation management.
 Implements "Comanda Abierta" (open tab) logic and time-based cancellation rules.
 """
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple, AsyncIterator
 from datetime import datetime, timezone, timedelta
 from functools import lru_cache
+import asyncio
+import time
 import uuid
 import json
 
@@ -15,9 +17,64 @@ from app.core.config import settings
 from app.models.schemas import Order, OrderItem, OrderStatus, ChatResponse
 from app.services.firestore_service import get_firestore_service
 from app.services.menu_service import get_menu_service
+from app.services.response_cache import get_response_cache
+from app.services.token_usage import get_token_usage_tracker
 from app.services.scheduler_service import get_scheduler_service
 
 
+class _BubbleSplitter:
+    """
+    Turns streamed model text into client events.
+
+    The prompt lets the model answer with a JSON list of strings (one per
+    WhatsApp bubble). Raw JSON fragments are useless to a client, so in that
+    case each string is emitted once it is complete; plain text is forwarded
+    as it arrives.
+    """
+
+    _decoder = json.JSONDecoder()
+
+    def __init__(self):
+        self._chunks: List[str] = []
+        self._buffer = ""
+        self._json_mode: Optional[bool] = None
+        self._pos = 0
+
+    @property
+    def text(self) -> str:
+        """Full text received so far."""
+        return "".join(self._chunks)
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        self._chunks.append(chunk)
+        if self._json_mode is None:
+            self._buffer += chunk
+            stripped = self._buffer.lstrip()
+            if not stripped:
+                return []
+            self._json_mode = stripped.startswith("[")
+            if not self._json_mode:
+                return [{"tipo": "texto", "delta": self._buffer}]
+            self._pos = self._buffer.index("[") + 1
+            chunk = ""
+        elif not self._json_mode:
+            return [{"tipo": "texto", "delta": chunk}]
+
+        self._buffer += chunk
+        events = []
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in " \t\r\n,":
+                self._pos += 1
+            if self._pos >= len(self._buffer) or self._buffer[self._pos] != '"':
+                break
+            try:
+                value, self._pos = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                break  # String not complete yet
+            events.append({"tipo": "burbuja", "texto": value})
+        return events
+
+
 class GeminiService:
     """
     Service for Gemini AI interactions.
@@ -27,6 +84,16 @@ class GeminiService:
     _instance: Optional['GeminiService'] = None
     _model: Optional[genai.GenerativeModel] = None
     _configured: bool = False
+
+    # Prompt/model caches: rebuilt only when the menu version changes
+    _tools: Optional[List] = None
+    _static_prompt: Optional[Tuple[int, str]] = None  # (menu version, prompt body)
+    _models: Dict[Tuple[int, str], genai.GenerativeModel] = {}  # (menu version, tier) -> model
+    _instruction_chars: Dict[Tuple[int, str], int] = {}  # (menu version, tier) -> system instruction length
+
+    # Customer tiers (part of the model cache key)
+    TIER_NUEVO = "nuevo"
+    TIER_REGISTRADO = "registrado"
     
     def __new__(cls) -> 'GeminiService':
         if cls._instance is None:
@@ -38,7 +105,7 @@ class GeminiService:
             self._configure()
     
     def _configure(self):
-        """Configure Gemini API (model created per request for personalization)."""
+        """Configure Gemini API (models are cached per menu version and customer tier)."""
         try:
             genai.configure(api_key=settings.GEMINI_API_KEY)
             self._configured = True
@@ -48,7 +115,9 @@ class GeminiService:
             self._configured = False
     
     def _get_tools(self) -> List:
-        """Define AI tools for function calling."""
+        """Define AI tools for function calling (built once and reused)."""
+        if self._tools is not None:
+            return self._tools
 
         def interpretar_orden(items: List[Dict[str, Any]]):
             """
@@ -94,36 +163,95 @@ class GeminiService:
         except Exception as e:
             print(f"Warning: Could not enable code execution: {e}")
 
+        self._tools = tools
         return tools
     
-    def _build_system_instruction(self, customer_profile: Dict[str, Any] = None, favorite_product: str = None) -> str:
-        """Build dynamic system instruction with current menu and customer context."""
-        menu_service = get_menu_service()
-        menu_text = menu_service.get_menu_text_for_prompt()
-
-        # Enhanced customer context
-        customer_context = ""
-        customer_name = None
-        if customer_profile:
-            customer_name = customer_profile.get('nombre')
-            if customer_name:
-                customer_context = f"El usuario se llama {customer_name}."
-            else:
-                customer_context = "Usuario Nuevo/Desconocido - NO SABEMOS SU NOMBRE."
-        else:
-            customer_context = "Usuario Nuevo/Desconocido - NO SABEMOS SU NOMBRE."
+    @classmethod
+    def _customer_tier(cls, customer_profile: Optional[Dict[str, Any]]) -> str:
+        """Classify the customer for prompt selection (known name or not)."""
+        if customer_profile and customer_profile.get('nombre'):
+            return cls.TIER_REGISTRADO
+        return cls.TIER_NUEVO
+
+    @staticmethod
+    def _build_customer_context(customer_profile: Optional[Dict[str, Any]], favorite_product: Optional[str] = None) -> str:
+        """Build the small per-customer segment appended to each message."""
+        lines = []
+        customer_name = customer_profile.get('nombre') if customer_profile else None
+        if customer_name:
+            lines.append(f"El usuario se llama {customer_name}.")
 
         # Favorite product context for "El Habitual" feature
-        favorite_context = ""
         if favorite_product:
-            favorite_context = f"DATO CLAVE: El plato favorito de este usuario es '{favorite_product}'. Si saluda sin pedir nada específico, sugiere: '¿Lo de siempre ({favorite_product})?'."
+            lines.append(f"DATO CLAVE: El plato favorito de este usuario es '{favorite_product}'. Si saluda sin pedir nada específico, sugiere: '¿Lo de siempre ({favorite_product})?'.")
+
+        if not lines:
+            return ""
+        return "### CONTEXTO DEL CLIENTE\n" + "\n".join(lines)
+
+    @staticmethod
+    def _compose_message(mensaje: str, customer_context: str) -> str:
+        """Prepend the per-customer context to the message sent to Gemini."""
+        if not customer_context:
+            return mensaje
+        return f"{customer_context}\n\n### MENSAJE DEL CLIENTE\n{mensaje}"
+
+    def _build_system_instruction(self, tier: str) -> str:
+        """Build the system instruction for a customer tier from the cached prompt body."""
+        if tier == self.TIER_REGISTRADO:
+            tier_context = "Cliente registrado: su nombre y preferencias llegan en el bloque 'CONTEXTO DEL CLIENTE' al inicio de cada mensaje. Llámalo por su nombre."
+        else:
+            tier_context = "Usuario Nuevo/Desconocido - NO SABEMOS SU NOMBRE."
 
         return f"""
 ### CONTEXTO DEL CLIENTE
-{customer_context}
+{tier_context}
+{self._get_static_prompt()}"""
 
-{favorite_context}
+    def _get_static_prompt(self) -> str:
+        """Return the customer-independent prompt body, rendered once per menu version."""
+        menu_service = get_menu_service()
+        version = menu_service.version
+        if self._static_prompt is None or self._static_prompt[0] != version:
+            self._static_prompt = (version, self._render_static_prompt(menu_service.get_menu_text_for_prompt()))
+        return self._static_prompt[1]
+
+    def _get_model(self, tier: str) -> genai.GenerativeModel:
+        """Get the cached GenerativeModel for (menu version, customer tier)."""
+        key = (get_menu_service().version, tier)
+        model = self._models.get(key)
+        if model is None:
+            # Drop models built for an older menu
+            for stale_key in [k for k in self._models if k[0] != key[0]]:
+                del self._models[stale_key]
+                self._instruction_chars.pop(stale_key, None)
+            system_instruction = self._build_system_instruction(tier)
+            self._instruction_chars[key] = len(system_instruction)
+            model = genai.GenerativeModel(
+                model_name=settings.GEMINI_MODEL,
+                tools=self._get_tools(),
+                system_instruction=system_instruction,
+                generation_config=genai.types.GenerationConfig(
+                    temperature=0.1,
+                    top_p=0.8,
+                    top_k=40,
+                    max_output_tokens=2048,
+                )
+            )
+            self._models[key] = model
+        return model
 
+    def _get_instruction_chars(self, tier: str) -> int:
+        """Length of the system instruction for a tier, measured when its model was built."""
+        key = (get_menu_service().version, tier)
+        if key not in self._instruction_chars:
+            self._get_model(tier)
+        return self._instruction_chars[key]
+
+    @staticmethod
+    def _render_static_prompt(menu_text: str) -> str:
+        """Render the prompt body shared by every customer (menu, rules, behavior)."""
+        return f"""
 ### ROL
 Eres 'Pepe', el mesero digital de la cafetería 'Justicia y Café'.
 Tu tono es amable, coloquial (mexicano neutro) y eficiente.
@@ -157,7 +285,7 @@ SI el usuario es NUEVO/DESCONOCIDO (no sabemos su nombre):
 Si usuario pide cancelar:
 1. USA herramienta 'cancelar_orden' SIN EXCEPTUAR
 2. Si devuelve ERROR por tiempo (>5 min) → Responde con empatía usando nombre:
-   "Híjole{customer_name and f' {customer_name}' or ''}, ya están preparando tu orden en cocina y por política no puedo cancelarla para no desperdiciar insumos. ¡Pero te va a encantar!"
+   "Híjole [nombre del cliente], ya están preparando tu orden en cocina y por política no puedo cancelarla para no desperdiciar insumos. ¡Pero te va a encantar!"
 3. NUNCA prometas cancelar sin usar herramienta primero
 
 #### 💰 FASE 3 - PLAN DE AFILIADOS "JUSTICIA PARA TODOS":
@@ -177,7 +305,7 @@ Una vez que te dé su nombre, usa la herramienta 'registrar_nombre' INMEDIATAMEN
 #### ❌ REGLA DE CANCELACIÓN:
 Si el usuario pide cancelar, usa la herramienta 'cancelar_orden' SIN EXCEPTUAR.
 Si la herramienta devuelve error (por tiempo límite), explícaselo con empatía:
-"Híjole{customer_name and f' {customer_name}' or ''}, ya están preparando tu orden en cocina y por política no puedo cancelarla para no desperdiciar insumos. ¡Pero te va a encantar!"
+"Híjole [nombre del cliente], ya están preparando tu orden en cocina y por política no puedo cancelarla para no desperdiciar insumos. ¡Pero te va a encantar!"
 NUNCA prometas cancelar sin usar la herramienta primero.
 
 #### 💰 REGLA DE UPSELLING (VENTA CRUZADA):
@@ -238,74 +366,301 @@ Ejemplo válido: ["¡Claro que sí!", "¿De qué sabor quieres tu dona?"]
             return [GeminiService._recursive_to_native(x) for x in d]
         return d
     
+    @staticmethod
+    async def _timed_fetch(stage: str, coro, fallback: Any, timings: Dict[str, float]) -> Any:
+        """
+        Await a context read with a timeout, recording its duration in ms.
+        Returns the fallback value if the read fails or times out.
+        """
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(coro, timeout=settings.CONTEXT_FETCH_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Timeout en '{stage}' ({settings.CONTEXT_FETCH_TIMEOUT_SECONDS}s), usando valor por defecto")
+            return fallback
+        except Exception as e:
+            print(f"⚠️ Error en '{stage}': {e}, usando valor por defecto")
+            return fallback
+        finally:
+            timings[stage] = round((time.perf_counter() - start) * 1000, 1)
+    
+    async def _prepare_turn(
+        self,
+        telefono: str,
+        mensaje: str,
+        firestore: 'FirestoreService',
+        timings: Dict[str, float],
+        prompt_size: Dict[str, int]
+    ) -> Tuple[Any, str, Optional[Dict[str, Any]]]:
+        """
+        Load the customer context and open the Gemini chat session.
+        The history is trimmed to PROMPT_TOKEN_BUDGET; the resulting prompt
+        size (chars) is recorded in ``prompt_size`` for token accounting.
+        Returns (chat_session, message to send, customer profile).
+        """
+        start = time.perf_counter()
+
+        # 1-3. Fetch profile and history while saving the user message;
+        # the reads are independent so they run concurrently.
+        customer_profile, (historial, summary), _ = await asyncio.gather(
+            self._timed_fetch("perfil", firestore.get_customer_profile(telefono), None, timings),
+            self._timed_fetch("historial", firestore.get_chat_context(telefono), ([], None), timings),
+            self._timed_fetch("guardar_mensaje", firestore.save_message(telefono, "user", mensaje), False, timings),
+        )
+        timings["contexto"] = round((time.perf_counter() - start) * 1000, 1)
+
+        # Favorite product for "El Habitual" comes from the profile counters
+        favorite_product = firestore.favorite_from_profile(customer_profile)
+
+        # The history read may already see the message saved concurrently
+        if historial and historial[-1] == {"role": "user", "parts": [mensaje]}:
+            historial = historial[:-1]
+
+        # 4. Cached model for this menu version and customer tier
+        tier = self._customer_tier(customer_profile)
+        personalized_model = self._get_model(tier)
+        customer_context = self._build_customer_context(customer_profile, favorite_product)
+        prompt = self._compose_message(mensaje, customer_context)
+
+        # Keep the prompt within the token budget (oldest messages go first);
+        # the summary's tokens are reserved so it is never trimmed
+        tracker = get_token_usage_tracker()
+        fixed_chars = self._get_instruction_chars(tier) + len(prompt)
+        summary_chars = tracker.history_chars(firestore.with_summary([], summary))
+        historial, dropped = tracker.fit_history(historial, fixed_chars + summary_chars, settings.PROMPT_TOKEN_BUDGET)
+        historial = firestore.with_summary(historial, summary)
+        prompt_size["historial"] = tracker.history_chars(historial)
+        prompt_size["total"] = fixed_chars + prompt_size["historial"]
+        if dropped:
+            prompt_size["mensajes_recortados"] = dropped
+
+        # 5. Start chat session
+        chat_session = personalized_model.start_chat(
+            history=historial,
+            enable_automatic_function_calling=False
+        )
+        return chat_session, prompt, customer_profile
+
+    @staticmethod
+    def _record_usage(telefono: str, response: Any, prompt_size: Dict[str, int]) -> Optional[Dict[str, Any]]:
+        """Account the tokens Gemini reported for a turn."""
+        tokens = get_token_usage_tracker().record(
+            telefono,
+            getattr(response, "usage_metadata", None),
+            prompt_chars=prompt_size.get("total", 0),
+            history_chars=prompt_size.get("historial", 0)
+        )
+        if tokens is not None and prompt_size.get("mensajes_recortados"):
+            tokens["mensajes_recortados"] = prompt_size["mensajes_recortados"]
+        return tokens
+
+    async def _response_cache_key(
+        self,
+        telefono: str,
+        mensaje: str,
+        customer_profile: Optional[Dict[str, Any]],
+        chat_session: Any,
+        firestore: 'FirestoreService'
+    ):
+        """
+        Response cache key for the turn; None if the message is not a
+        general question, the customer is mid-conversation or has a pending
+        order (the answer may depend on either).
+        """
+        cache = get_response_cache()
+        in_conversation = cache.in_conversation(telefono, bool(chat_session.history))
+        menu = get_menu_service()
+        key = cache.key_for(mensaje, menu.version, self._customer_tier(customer_profile), menu.menu_terms)
+        if key is None or in_conversation:
+            return None
+        if await firestore.get_pending_order(telefono):
+            return None
+        return key
+
+    @staticmethod
+    def _cache_response(key: Any, result: ChatResponse, customer_profile: Optional[Dict[str, Any]]):
+        """Store a plain text answer unless it is personalized for this customer."""
+        if key is None or result.tipo != "texto":
+            return
+        texto = result.mensaje.casefold()
+        personal = [
+            (customer_profile or {}).get('nombre'),
+            get_firestore_service().favorite_from_profile(customer_profile),
+        ]
+        if any(term and term.casefold() in texto for term in personal):
+            return
+        get_response_cache().put(key, result.mensaje, result.mensajes)
+
+    @staticmethod
+    async def _cached_reply(telefono: str, cached: Any, firestore: 'FirestoreService') -> ChatResponse:
+        """Answer from the response cache, saved to the history like a model reply."""
+        await firestore.save_message(telefono, "model", cached.mensaje)
+        return ChatResponse(
+            tipo="texto",
+            mensaje=cached.mensaje,
+            mensajes=cached.mensajes,
+            metadata={"cache": True}
+        )
+
+    async def _dispatch(
+        self,
+        telefono: str,
+        function_call: Any,
+        texto: str,
+        firestore: 'FirestoreService'
+    ) -> ChatResponse:
+        """Run the business action for the model's reply (tool call or text)."""
+
+        # CASE A: Order interpretation
+        if function_call and function_call.name == 'interpretar_orden':
+            return await self._handle_order(telefono, function_call.args, get_menu_service(), firestore)
+
+        # CASE B: Order cancellation
+        if function_call and function_call.name == 'cancelar_orden':
+            return await self._handle_cancellation(telefono, function_call.args, firestore)
+
+        # CASE C: Name registration
+        if function_call and function_call.name == 'registrar_nombre':
+            return await self._handle_name_registration(telefono, function_call.args, firestore)
+
+        if function_call:
+            return ChatResponse(tipo="error", mensaje=f"Acción desconocida: {function_call.name}")
+
+        # CASE D: Text response
+        return await self._handle_text_response(telefono, texto, firestore)
+
     async def process_chat(self, telefono: str, mensaje: str) -> ChatResponse:
         """
         Process a chat message and return appropriate response.
         Handles tool calls, order management, and text responses.
+        Per-stage timings (ms) are returned in ``metadata["tiempos_ms"]``.
         """
         firestore = get_firestore_service()
-        menu_service = get_menu_service()
+        timings: Dict[str, float] = {}
+        prompt_size: Dict[str, int] = {}
+        start = time.perf_counter()
 
         try:
-            # 1. Get customer profile for personalization
-            customer_profile = await firestore.get_customer_profile(telefono)
-
-            # 2. Get customer's favorite product for "El Habitual" feature
-            favorite_product = await firestore.get_favorite_product(telefono) if firestore.is_connected else None
-
-            # 3. Get chat history
-            historial = await firestore.get_chat_history(telefono)
-
-            # 4. Create model with customer context
-            personalized_model = genai.GenerativeModel(
-                model_name=settings.GEMINI_MODEL,
-                tools=self._get_tools(),
-                system_instruction=self._build_system_instruction(customer_profile, favorite_product),
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.1,
-                    top_p=0.8,
-                    top_k=40,
-                    max_output_tokens=2048,
-                )
+            chat_session, prompt, customer_profile = await self._prepare_turn(
+                telefono, mensaje, firestore, timings, prompt_size
             )
 
-            # 4. Start chat session
-            chat_session = personalized_model.start_chat(
-                history=historial,
-                enable_automatic_function_calling=False
-            )
-
-            # 5. Save user message
-            await firestore.save_message(telefono, "user", mensaje)
+            # General questions already answered for this menu skip Gemini
+            cache_key = await self._response_cache_key(telefono, mensaje, customer_profile, chat_session, firestore)
+            cached = get_response_cache().get(cache_key)
+            if cached is not None:
+                result = await self._cached_reply(telefono, cached, firestore)
+                timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+                result.metadata["tiempos_ms"] = timings
+                return result
 
             # 6. Send to Gemini
-            response = await chat_session.send_message_async(mensaje)
+            stage_start = time.perf_counter()
+            response = await chat_session.send_message_async(prompt)
+            timings["gemini"] = round((time.perf_counter() - stage_start) * 1000, 1)
+            tokens = self._record_usage(telefono, response, prompt_size)
 
             if not response.candidates or not response.candidates[0].content.parts:
                 return ChatResponse(tipo="error", mensaje="Sin respuesta válida del AI")
 
             part = response.candidates[0].content.parts[0]
+            stage_start = time.perf_counter()
+            result = await self._dispatch(
+                telefono, part.function_call, "" if part.function_call else response.text, firestore
+            )
+            if not part.function_call:
+                self._cache_response(cache_key, result, customer_profile)
+
+            timings["accion"] = round((time.perf_counter() - stage_start) * 1000, 1)
+            timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+            result.metadata = {**(result.metadata or {}), "tiempos_ms": timings}
+            if tokens is not None:
+                result.metadata["tokens"] = tokens
+            return result
 
-            # CASE A: Order interpretation
-            if part.function_call and part.function_call.name == 'interpretar_orden':
-                return await self._handle_order(telefono, part.function_call.args, menu_service, firestore)
+        except Exception as e:
+            print(f"❌ Error en process_chat: {e}")
+            return ChatResponse(tipo="error", mensaje=str(e))
 
-            # CASE B: Order cancellation
-            elif part.function_call and part.function_call.name == 'cancelar_orden':
-                return await self._handle_cancellation(telefono, part.function_call.args, firestore)
+    async def process_chat_stream(self, telefono: str, mensaje: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of process_chat.
+
+        Yields events as Gemini produces text:
+        - ``{"tipo": "texto", "delta": str}`` for plain text chunks
+        - ``{"tipo": "burbuja", "texto": str}`` for each complete bubble when
+          the model answers with a JSON list of messages
+        - ``{"tipo": "final", "respuesta": ChatResponse}`` once, at the end,
+          with the same structured result process_chat returns (tool calls
+          are only known once the stream completes).
+        """
+        firestore = get_firestore_service()
+        timings: Dict[str, float] = {}
+        prompt_size: Dict[str, int] = {}
+        start = time.perf_counter()
 
-            # CASE C: Name registration
-            elif part.function_call and part.function_call.name == 'registrar_nombre':
-                return await self._handle_name_registration(telefono, part.function_call.args, firestore)
+        try:
+            chat_session, prompt, customer_profile = await self._prepare_turn(
+                telefono, mensaje, firestore, timings, prompt_size
+            )
 
-            # CASE D: Text response
+            cache_key = await self._response_cache_key(telefono, mensaje, customer_profile, chat_session, firestore)
+            cached = get_response_cache().get(cache_key)
+            if cached is not None:
+                result = await self._cached_reply(telefono, cached, firestore)
+                for texto in result.mensajes or [result.mensaje]:
+                    yield {"tipo": "burbuja", "texto": texto}
+                timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+                result.metadata["tiempos_ms"] = timings
+                yield {"tipo": "final", "respuesta": result}
+                return
+
+            stage_start = time.perf_counter()
+            response = await chat_session.send_message_async(prompt, stream=True)
+
+            splitter = _BubbleSplitter()
+            function_call = None
+            async for chunk in response:
+                if not chunk.candidates or not chunk.candidates[0].content.parts:
+                    continue
+                for part in chunk.candidates[0].content.parts:
+                    if part.function_call:
+                        function_call = part.function_call
+                    elif part.text:
+                        timings.setdefault("primer_fragmento", round((time.perf_counter() - start) * 1000, 1))
+                        for event in splitter.feed(part.text):
+                            yield event
+            timings["gemini"] = round((time.perf_counter() - stage_start) * 1000, 1)
+            # Usage metadata arrives with the last chunk
+            tokens = self._record_usage(telefono, response, prompt_size)
+
+            if function_call is None and not splitter.text:
+                result = ChatResponse(tipo="error", mensaje="Sin respuesta válida del AI")
             else:
-                return await self._handle_text_response(telefono, response.text, firestore)
+                stage_start = time.perf_counter()
+                result = await self._dispatch(telefono, function_call, splitter.text, firestore)
+                if function_call is None:
+                    self._cache_response(cache_key, result, customer_profile)
+                timings["accion"] = round((time.perf_counter() - stage_start) * 1000, 1)
+
+            timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+            result.metadata = {**(result.metadata or {}), "tiempos_ms": timings}
+            if tokens is not None:
+                result.metadata["tokens"] = tokens
 
         except Exception as e:
-            print(f"❌ Error en process_chat: {e}")
-            return ChatResponse(tipo="error", mensaje=str(e))
+            print(f"❌ Error en process_chat_stream: {e}")
+            result = ChatResponse(tipo="error", mensaje=str(e))
+
+        yield {"tipo": "final", "respuesta": result}
     
+    async def place_order(self, telefono: str, items: List[Dict[str, Any]]) -> ChatResponse:
+        """
+        Create or extend the customer's open order with these items, exactly
+        as the ``interpretar_orden`` tool does. Saves the reply to the history.
+        """
+        return await self._handle_order(telefono, {"items": items}, get_menu_service(), get_firestore_service())
+
     async def _handle_order(
         self, 
         telefono: str, 
@@ -321,15 +676,31 @@ Ejemplo válido: ["¡Claro que sí!", "¿De qué sabor quieres tu dona?"]
         # Convert to OrderItem objects with real prices
         new_order_items = []
         total_prep_time = 0
+        coincidencias_dudosas = []
+        
+        # Resolve all requested names against the real menu in one pass
+        matches = menu_service.resolve_many(
+            [item_data.get('nombre_producto', 'Item') for item_data in raw_items]
+        )
         
         for item_data in raw_items:
             nombre = item_data.get('nombre_producto', 'Item')
             cantidad = int(item_data.get('cantidad', 1))
             
-            # Search in real menu
-            menu_item = menu_service.buscar_producto(nombre)
+            match = matches[nombre]
+            menu_item = match["item"]
+            
+            if match["confianza"] < menu_service.LOW_CONFIDENCE:
+                coincidencias_dudosas.append({
+                    "solicitado": nombre,
+                    "producto": menu_item.get('nombre') if menu_item else None,
+                    "confianza": match["confianza"],
+                    "metodo": match["metodo"]
+                })
             
             if menu_item:
+                # Store the canonical menu name (KDS, counters and sales use it)
+                nombre = menu_item.get('nombre', nombre)
                 precio = float(menu_item.get('precio', 50.0))
                 tiempo_prep = int(menu_item.get('tiempo_prep', 5))
             else:
@@ -357,14 +728,24 @@ Ejemplo válido: ["¡Claro que sí!", "¿De qué sabor quieres tu dona?"]
         # Check for existing pending order (Comanda Abierta)
         existing = await firestore.get_pending_order(telefono)
         
+        # Tell the customer how uncertain names were interpreted
+        aviso = " ".join(
+            f"Ojo: tomé '{c['solicitado']}' como '{c['producto']}'."
+            for c in coincidencias_dudosas if c["producto"]
+        )
+        
         if existing:
-            return await self._update_existing_order(
-                telefono, existing, new_order_items, total_prep_time, firestore
+            result = await self._update_existing_order(
+                telefono, existing, new_order_items, total_prep_time, firestore, aviso
             )
         else:
-            return await self._create_new_order(
-                telefono, new_order_items, tiempo_total, firestore
+            result = await self._create_new_order(
+                telefono, new_order_items, tiempo_total, firestore, aviso
             )
+        
+        if coincidencias_dudosas:
+            result.metadata = {**(result.metadata or {}), "coincidencias_dudosas": coincidencias_dudosas}
+        return result
     
     async def _update_existing_order(
         self,
@@ -372,36 +753,32 @@ Ejemplo válido: ["¡Claro que sí!", "¿De qué sabor quieres tu dona?"]
         existing: tuple,
         new_items: List[OrderItem],
         new_prep_time: int,
-        firestore: 'FirestoreService'
+        firestore: 'FirestoreService',
+        aviso: str = ""
     ) -> ChatResponse:
-        """Update an existing pending order with new items."""
-        
-        doc, data = existing
-        current_items = data.get('items', [])
+        """
+        Append new items to an existing pending order.
+        The append is atomic (see FirestoreService.append_order_items); if the
+        order left the pending state meanwhile, a new order is created instead.
+        """
         
-        # Add new items
+        doc, _ = existing
         new_items_dicts = [item.to_firestore() for item in new_items]
-        all_items = current_items + new_items_dicts
         
-        # Recalculate totals
-        nuevo_total = sum(i['cantidad'] * i['precio_unitario'] for i in all_items)
+        updated = await firestore.append_order_items(doc.id, new_items_dicts, new_prep_time)
+        if updated is None:
+            tiempo_total = new_prep_time + settings.DEFAULT_PREP_BUFFER_MINUTES
+            return await self._create_new_order(telefono, new_items, tiempo_total, firestore, aviso)
         
-        # Update prep time
-        tiempo_anterior = data.get('tiempo_preparacion_total', 0)
-        nuevo_tiempo = tiempo_anterior + new_prep_time
-        
-        hora_entrega = datetime.now(timezone.utc) + timedelta(minutes=nuevo_tiempo)
-        
-        # Update in Firestore
-        await firestore.update_order(doc.id, {
-            "items": all_items,
-            "total": nuevo_total,
-            "tiempo_preparacion_total": nuevo_tiempo,
-            "hora_entrega_estimada": hora_entrega
-        })
+        all_items = updated["items"]
+        nuevo_total = updated["total"]
+        nuevo_tiempo = updated["tiempo_preparacion_total"]
+        hora_entrega = updated["hora_entrega_estimada"]
         
         hora_str = hora_entrega.strftime("%H:%M")
         mensaje = f"¡Listo! Agregado a tu orden. Total: ${nuevo_total:.2f}. Tiempo estimado: {nuevo_tiempo} min (aprox {hora_str})."
+        if aviso:
+            mensaje = f"{mensaje} {aviso}"
         
         await firestore.save_message(telefono, "model", mensaje)
         
@@ -416,7 +793,8 @@ Ejemplo válido: ["¡Claro que sí!", "¿De qué sabor quieres tu dona?"]
         telefono: str,
         items: List[OrderItem],
         tiempo_total: int,
-        firestore: 'FirestoreService'
+        firestore: 'FirestoreService',
+        aviso: str = ""
     ) -> ChatResponse:
         """Create a new order."""
         
@@ -445,6 +823,8 @@ Ejemplo válido: ["¡Claro que sí!", "¿De qué sabor quieres tu dona?"]
 
         hora_str = hora_entrega.strftime("%H:%M")
         mensaje = f"¡Órale! Confirmado. Son ${total:.2f}. Queda listo en ~{tiempo_total} min (a las {hora_str})."
+        if aviso:
+            mensaje = f"{mensaje} {aviso}"
 
         await firestore.save_message(telefono, "model", mensaje)
 
@@ -579,8 +959,12 @@ Ejemplo válido: ["¡Claro que sí!", "¿De qué sabor quieres tu dona?"]
         return ChatResponse(tipo="texto", mensaje=texto)
     
     def refresh_model(self):
-        """Refresh the API configuration."""
+        """Refresh the API configuration and drop cached prompts/models."""
         self._configured = False
+        self._static_prompt = None
+        self._models.clear()
+        self._instruction_chars.clear()
+        get_response_cache().clear()
         self._configure()
 
 
@@ -0,0 +1,236 @@
+"""
+Intent Router - Deterministic fast path in front of Gemini.
+Recognizes trivial turns (the quick-action chips and their usual phrasings)
+and answers them from the menu cache, the order lookups and the customer
+profile, so only open-ended messages pay a Gemini round trip.
+"""
+from typing import Optional, Dict, Any, List, Callable, Awaitable
+from collections import Counter
+from functools import lru_cache
+import re
+import time
+
+from app.core.config import settings
+from app.models.schemas import ChatResponse
+from app.services.firestore_service import get_firestore_service
+from app.services.menu_service import get_menu_service, normalize_text
+
+
+# Emoji and punctuation are dropped before matching ("📜 Ver Menú!" -> "ver menu")
+_NON_WORD = re.compile(r"[^\w\s]")
+
+# Courtesy words that do not change the intent of a short message
+_FILLER = {"hola", "porfa", "porfavor", "por", "favor", "please", "gracias", "oye", "quiero", "ver"}
+
+# Whole-message phrasings per intent, after normalization and filler removal
+_PHRASES: Dict[str, set] = {
+    "ver_menu": {
+        "menu", "el menu", "muestrame el menu", "mostrar menu", "la carta", "carta",
+        "que tienen", "que venden", "que hay",
+    },
+    "estado_pedido": {
+        "estado de pedido", "estado de mi pedido", "estado del pedido", "mi pedido",
+        "como va mi pedido", "ya esta mi pedido", "donde esta mi pedido", "mi orden",
+        "estado de mi orden", "como va mi orden",
+    },
+    "mis_puntos": {
+        "mis puntos", "cuantos puntos tengo", "puntos", "mi nivel", "mis puntos de justicia",
+    },
+    "lo_de_siempre": {
+        "lo de siempre", "lo mismo de siempre", "lo mismo", "lo habitual", "el habitual",
+    },
+}
+
+_STATUS_LABELS = {
+    "pendiente": "recibido, en espera de la barra",
+    "en_preparacion": "en preparación",
+    "listo": "listo para recoger",
+    "entregado": "entregado",
+}
+
+
+class IntentRouter:
+    """
+    Singleton rule-based router.
+
+    ``route`` returns a ChatResponse for recognized intents, or None when
+    the turn must go to Gemini. Recognized turns are saved to the chat
+    history like any other turn so Gemini keeps the full context.
+    """
+
+    _instance: Optional['IntentRouter'] = None
+    _handlers: Optional[Dict[str, Callable[[str], Awaitable[Optional[ChatResponse]]]]] = None
+
+    def __new__(cls) -> 'IntentRouter':
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if self._handlers is None:
+            self._handlers = {
+                "ver_menu": self._menu,
+                "estado_pedido": self._order_status,
+                "mis_puntos": self._points,
+                "lo_de_siempre": self._usual,
+            }
+            self._phrase_index = {
+                phrase: intent for intent, phrases in _PHRASES.items() for phrase in phrases
+            }
+            self.hits: Counter = Counter()
+            self.misses = 0
+
+    @staticmethod
+    def _normalize(mensaje: str) -> str:
+        tokens = _NON_WORD.sub(" ", normalize_text(mensaje)).split()
+        return " ".join(t for t in tokens if t not in _FILLER)
+
+    def detect(self, mensaje: str) -> Optional[str]:
+        """Intent for a whole message, or None if it is not a trivial turn."""
+        key = self._normalize(mensaje)
+        if not key:
+            return None
+        # Filler removal may eat the verb ("ver menu" -> "menu"); both forms are listed
+        return self._phrase_index.get(key)
+
+    async def route(self, telefono: str, mensaje: str) -> Optional[ChatResponse]:
+        """
+        Answer the message deterministically if possible.
+        Returns None (a miss) when Gemini has to handle it.
+        """
+        intent = self.detect(mensaje) if settings.INTENT_ROUTER_ENABLED else None
+        if intent is None:
+            self.misses += 1
+            return None
+
+        start = time.perf_counter()
+        try:
+            response = await self._handlers[intent](telefono, mensaje)
+        except Exception as e:
+            print(f"⚠️ Error en ruta rápida '{intent}': {e}, usando Gemini")
+            response = None
+
+        if response is None:
+            self.misses += 1
+            return None
+
+        self.hits[intent] += 1
+        response.metadata = {
+            **(response.metadata or {}),
+            "intencion": intent,
+            "tiempos_ms": {"total": round((time.perf_counter() - start) * 1000, 1)},
+        }
+        return response
+
+    @staticmethod
+    async def _reply(telefono: str, mensaje: str, texto: str) -> ChatResponse:
+        """Persist both sides of a deterministic turn and build the response."""
+        firestore = get_firestore_service()
+        await firestore.save_message(telefono, "user", mensaje)
+        await firestore.save_message(telefono, "model", texto)
+        return ChatResponse(tipo="texto", mensaje=texto)
+
+    # --- Intents ---
+
+    async def _menu(self, telefono: str, mensaje: str) -> Optional[ChatResponse]:
+        menu_service = get_menu_service()
+        items = menu_service.get_all_items()
+        if not items:
+            return None
+
+        by_category: Dict[str, Dict[str, Any]] = {}
+        for item in items:
+            nombre = item.get('nombre', 'Item')
+            categoria = str(item.get('categoria') or 'otro').capitalize()
+            by_category.setdefault(categoria, {}).setdefault(normalize_text(nombre), item)
+
+        lines: List[str] = ["¡Claro! Esto es lo que tenemos hoy:"]
+        for categoria in sorted(by_category):
+            lines.append(f"\n*{categoria}*")
+            for item in sorted(by_category[categoria].values(), key=lambda i: i.get('nombre', '')):
+                lines.append(f"- {item.get('nombre', 'Item')}: ${item.get('precio', 0)}")
+        lines.append("\n¿Qué se te antoja?")
+        return await self._reply(telefono, mensaje, "\n".join(lines))
+
+    async def _order_status(self, telefono: str, mensaje: str) -> Optional[ChatResponse]:
+        firestore = get_firestore_service()
+        if not firestore.is_connected:
+            return None
+
+        # The order in progress first; the last delivered one only if there is none
+        order = await firestore.get_latest_active_order(telefono)
+        if order is None:
+            order = await firestore.get_last_completed_order(telefono)
+
+        if order is None:
+            texto = "No tienes pedidos activos. ¿Qué te gustaría ordenar?"
+            return await self._reply(telefono, mensaje, texto)
+
+        estado = order.get('estado', 'desconocido')
+        productos = ", ".join(
+            f"{i.get('cantidad', 1)}x {i.get('nombre_producto', 'Item')}" for i in order.get('items', [])
+        )
+        texto = f"Tu pedido ({productos}) está {_STATUS_LABELS.get(estado, estado)}. Total: ${order.get('total', 0):.2f}."
+        hora = order.get('hora_entrega_estimada')
+        if estado == "pendiente" and hasattr(hora, 'strftime'):
+            texto = f"{texto} Estará listo aprox. a las {hora.strftime('%H:%M')}."
+        elif estado == "entregado":
+            texto = f"{texto} ¿Quieres ordenar algo más?"
+
+        response = await self._reply(telefono, mensaje, texto)
+        response.orden = {
+            "id": order.get('id'),
+            "estado": estado,
+            "total": order.get('total', 0),
+            "items": order.get('items', []),
+        }
+        return response
+
+    async def _points(self, telefono: str, mensaje: str) -> Optional[ChatResponse]:
+        profile = await get_firestore_service().get_customer_profile(telefono)
+        total_gastado = float((profile or {}).get('total_gastado') or 0.0)
+        if total_gastado <= 0:
+            texto = (
+                "Aún no tienes puntos. Con el plan 'Justicia para Todos' acumulas "
+                f"{settings.LOYALTY_POINTS_RATE:.0%} en puntos por cada compra. ¡Empieza hoy!"
+            )
+            return await self._reply(telefono, mensaje, texto)
+
+        puntos = int(total_gastado * settings.LOYALTY_POINTS_RATE)
+        nivel = profile.get('nivel') or "Pasante"
+        nombre = profile.get('nombre')
+        saludo = f"{nombre}, tienes" if nombre else "Tienes"
+        texto = (
+            f"{saludo} {puntos} puntos acumulados (nivel {nivel}). "
+            "Puedes canjearlos por descuentos en tus próximas compras."
+        )
+        return await self._reply(telefono, mensaje, texto)
+
+    async def _usual(self, telefono: str, mensaje: str) -> Optional[ChatResponse]:
+        firestore = get_firestore_service()
+        favorite = await firestore.get_favorite_product(telefono)
+        if not favorite:
+            # Gemini asks what they usually have
+            return None
+
+        from app.services.gemini_service import get_gemini_service
+
+        # Ordering handlers save the model's reply themselves
+        await firestore.save_message(telefono, "user", mensaje)
+        return await get_gemini_service().place_order(telefono, [{"nombre_producto": favorite, "cantidad": 1}])
+
+    def stats(self) -> Dict[str, Any]:
+        hits = sum(self.hits.values())
+        total = hits + self.misses
+        return {
+            "hits": hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / total, 3) if total else 0.0,
+            "por_intencion": dict(self.hits)
+        }
+
+
+@lru_cache()
+def get_intent_router() -> IntentRouter:
+    """Get singleton instance of IntentRouter."""
+    return IntentRouter()
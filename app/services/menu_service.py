@@ -2,23 +2,129 @@
 Menu Service - Menu caching and product search with fuzzy matching.
 Loads menu from Firestore at startup and provides fast lookups.
 """
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Set, Tuple
 from functools import lru_cache
 from difflib import SequenceMatcher
+from collections import Counter
+from itertools import chain
+import re
+import unicodedata
 
 from app.services.firestore_service import get_firestore_service
 
 
+_NON_WORD = re.compile(r"[^\w\s]")
+
+# Combining diacritical mark blocks; removing them after NFKD strips accents
+_COMBINING_MARKS = {
+    cp: None
+    for start, end in ((0x0300, 0x0370), (0x1AB0, 0x1B00), (0x1DC0, 0x1E00), (0x20D0, 0x2100), (0xFE20, 0xFE30))
+    for cp in range(start, end)
+    if unicodedata.combining(chr(cp))
+}
+
+
+@lru_cache(maxsize=4096)
+def normalize_text(text: str) -> str:
+    """
+    Normalize text for menu lookups: casefold, strip accents and
+    collapse whitespace ("  CAFÉ  Americano" -> "cafe americano").
+    Handles precomposed and combining-mark accents alike.
+    """
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return " ".join(decomposed.translate(_COMBINING_MARKS).split())
+
+
+class TrigramIndex:
+    """
+    Character trigram inverted index over product name keys.
+    Narrows containment and fuzzy matching to a small candidate set
+    instead of scanning every name in the menu.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Set[str]] = {}  # trigram -> name keys
+        self._gram_count: Dict[str, int] = {}  # name key -> number of padded trigrams
+        self._order: Dict[str, int] = {}  # name key -> insertion order
+        self._max_len: int = 0
+
+    @staticmethod
+    def trigrams(text: str, padded: bool = True) -> Set[str]:
+        """Split text into character trigrams (padded marks word boundaries)."""
+        if padded:
+            text = f"  {text} "
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def clear(self):
+        self._postings.clear()
+        self._gram_count.clear()
+        self._order.clear()
+        self._max_len = 0
+
+    def add(self, key: str):
+        if key in self._order:
+            return
+        self._order[key] = len(self._order)
+        self._max_len = max(self._max_len, len(key))
+        grams = self.trigrams(key)
+        self._gram_count[key] = len(grams)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(key)
+
+    def first_containing(self, queries: List[str]) -> Optional[str]:
+        """
+        Earliest-inserted key that contains any query or is contained in one.
+        Equivalent to a linear substring scan over all keys.
+        """
+        matches: Set[str] = set()
+        for query in queries:
+            # Query inside key: the key must hold every inner trigram of the query
+            inner = self.trigrams(query, padded=False)
+            if inner:
+                postings = sorted((self._postings.get(g, set()) for g in inner), key=len)
+                candidates = postings[0].intersection(*postings[1:])
+            else:
+                candidates = self._order.keys()
+            matches.update(key for key in candidates if query in key)
+
+            # Key inside query: look up every substring no longer than the longest key
+            for i in range(len(query)):
+                for j in range(i + 1, min(len(query), i + self._max_len) + 1):
+                    if query[i:j] in self._order:
+                        matches.add(query[i:j])
+
+        if not matches:
+            return None
+        return min(matches, key=self._order.__getitem__)
+
+    def candidates(self, query: str, limit: int) -> List[str]:
+        """Top keys by trigram Dice similarity to the query."""
+        grams = self.trigrams(query)
+        overlap = Counter(chain.from_iterable(self._postings.get(g, ()) for g in grams))
+        # Shortlist by raw overlap (C-level heap), then order by Dice coefficient
+        shortlist = overlap.most_common(limit * 2)
+        shortlist.sort(key=lambda kv: -2 * kv[1] / (len(grams) + self._gram_count[kv[0]]))
+        return [key for key, _ in shortlist[:limit]]
+
+
 class MenuService:
     """
     Service for menu management with in-memory caching.
     Provides fuzzy search capabilities for product lookup.
     """
     
+    # Fuzzy matching re-ranks at most this many trigram candidates
+    SEARCH_CANDIDATES = 20
+    # Matches below this confidence are flagged to the customer
+    LOW_CONFIDENCE = 0.75
+
     _instance: Optional['MenuService'] = None
     _cache: Dict[str, Dict[str, Any]] = {}
     _name_index: Dict[str, str] = {}  # lowercase name -> cache key
+    _search_index: TrigramIndex = TrigramIndex()
+    _terms: Set[str] = set()  # Normalized product-name words and categories
     _loaded: bool = False
+    _version: int = 0  # Bumped on every (re)load; keys prompt/model caches
     
     def __new__(cls) -> 'MenuService':
         if cls._instance is None:
@@ -41,6 +147,8 @@ class MenuService:
         
         self._cache.clear()
         self._name_index.clear()
+        self._search_index.clear()
+        self._terms.clear()
         
         for item in items:
             item_id = item.get('id', item.get('nombre', '').lower())
@@ -54,11 +162,20 @@ class MenuService:
             self._name_index[nombre_lower] = item_id
             
             # Also index without accents for better matching
-            nombre_normalized = self._normalize_text(nombre_lower)
+            nombre_normalized = normalize_text(nombre)
             if nombre_normalized != nombre_lower:
                 self._name_index[nombre_normalized] = item_id
+
+            self._terms.update(w for w in _NON_WORD.sub(" ", nombre_normalized).split() if len(w) > 3)
+            categoria = normalize_text(str(item.get('categoria') or ''))
+            if categoria:
+                self._terms.update((categoria, f"{categoria}s"))
+        
+        for name_key in self._name_index:
+            self._search_index.add(name_key)
         
         self._loaded = True
+        self._version += 1
         print(f"🍽️ Menú cargado: {len(self._cache)} items en cache")
         return len(self._cache)
     
@@ -69,15 +186,8 @@ class MenuService:
     
     @staticmethod
     def _normalize_text(text: str) -> str:
-        """Remove accents and normalize text for search."""
-        replacements = {
-            'á': 'a', 'é': 'e', 'í': 'i', 'ó': 'o', 'ú': 'u',
-            'ñ': 'n', 'ü': 'u'
-        }
-        result = text.lower()
-        for accented, plain in replacements.items():
-            result = result.replace(accented, plain)
-        return result
+        """Remove accents and normalize text for search (memoized)."""
+        return normalize_text(text)
     
     @staticmethod
     def _similarity_score(a: str, b: str) -> float:
@@ -95,49 +205,91 @@ class MenuService:
         Returns:
             Menu item dict if found, None otherwise
         """
+        return self.resolve_many([nombre_buscado], threshold)[nombre_buscado]["item"]
+    
+    def resolve_many(self, nombres: List[str], threshold: float = 0.6) -> Dict[str, Dict[str, Any]]:
+        """
+        Resolve several product names against the menu in one pass.
+        
+        Names are deduplicated by their normalized form; exact hits are
+        resolved in bulk and the fuzzy tier runs once over all misses.
+        
+        Args:
+            nombres: Product names as written by the customer
+            threshold: Minimum similarity score (0-1) for fuzzy match
+            
+        Returns:
+            Dict keyed by each input name with:
+            item (menu item dict or None), confianza (0-1) and
+            metodo ("exacto", "parcial", "difuso" or "sin_coincidencia")
+        """
         if not self._loaded:
             self.load_menu()
         
-        nombre_lower = nombre_buscado.lower().strip()
-        nombre_normalized = self._normalize_text(nombre_lower)
-        
-        # 1. Exact match by name
-        if nombre_lower in self._name_index:
-            return self._cache[self._name_index[nombre_lower]]
-        
-        # 2. Exact match by normalized name
-        if nombre_normalized in self._name_index:
-            return self._cache[self._name_index[nombre_normalized]]
-        
-        # 3. Exact match by ID
-        if nombre_lower in self._cache:
-            return self._cache[nombre_lower]
-        
-        # 4. Partial match (contains)
-        for name_key, item_id in self._name_index.items():
-            if nombre_lower in name_key or nombre_normalized in name_key:
-                return self._cache[item_id]
-            if name_key in nombre_lower or name_key in nombre_normalized:
-                return self._cache[item_id]
-        
-        # 5. Fuzzy match with similarity score
-        best_match = None
-        best_score = 0.0
-        
-        for name_key, item_id in self._name_index.items():
-            # Check similarity with both original and normalized
-            score1 = self._similarity_score(nombre_lower, name_key)
-            score2 = self._similarity_score(nombre_normalized, name_key)
-            score = max(score1, score2)
+        # Deduplicate by normalized form: normalized -> (lowercase, normalized)
+        queries: Dict[str, Tuple[str, str]] = {}
+        for nombre in nombres:
+            nombre_normalized = normalize_text(nombre)
+            queries.setdefault(nombre_normalized, (nombre.lower().strip(), nombre_normalized))
+        
+        resolved: Dict[str, Tuple[Optional[str], float, str]] = {}  # normalized -> (item_id, score, method)
+        misses: List[Tuple[str, str]] = []
+        
+        for nombre_normalized, (nombre_lower, _) in queries.items():
+            # 1-2. Exact match by name / normalized name
+            item_id = self._name_index.get(nombre_lower) or self._name_index.get(nombre_normalized)
+            # 3. Exact match by ID
+            if item_id is None and nombre_lower in self._cache:
+                item_id = nombre_lower
+            if item_id is not None:
+                resolved[nombre_normalized] = (item_id, 1.0, "exacto")
+                continue
+            
+            # 4. Partial match (contains), resolved through the trigram index
+            name_key = self._search_index.first_containing(list({nombre_lower, nombre_normalized}))
+            if name_key:
+                score = self._similarity_score(nombre_normalized, name_key)
+                resolved[nombre_normalized] = (self._name_index[name_key], score, "parcial")
+                continue
             
-            if score > best_score and score >= threshold:
-                best_score = score
-                best_match = item_id
+            misses.append((nombre_lower, nombre_normalized))
         
-        if best_match:
-            return self._cache[best_match]
+        # 5. Fuzzy match over the union of misses
+        resolved.update(self._fuzzy_match_many(misses, threshold))
         
-        return None
+        result = {}
+        for nombre in nombres:
+            item_id, score, method = resolved.get(normalize_text(nombre), (None, 0.0, "sin_coincidencia"))
+            result[nombre] = {
+                "item": self._cache[item_id] if item_id else None,
+                "confianza": round(score, 3),
+                "metodo": method
+            }
+        return result
+    
+    def _fuzzy_match_many(self, misses: List[Tuple[str, str]], threshold: float) -> Dict[str, Tuple[str, float, str]]:
+        """Re-rank the closest trigram candidates of each miss with SequenceMatcher."""
+        matches = {}
+        for nombre_lower, nombre_normalized in misses:
+            best_match = None
+            best_score = 0.0
+            
+            for name_key in self._search_index.candidates(nombre_normalized, self.SEARCH_CANDIDATES):
+                # Check similarity with both original and normalized
+                score = 0.0
+                for query in {nombre_lower, nombre_normalized}:
+                    matcher = SequenceMatcher(None, query, name_key)
+                    # quick_ratio() is a cheap upper bound of ratio()
+                    if matcher.quick_ratio() > max(score, best_score, threshold - 1e-9):
+                        score = max(score, matcher.ratio())
+                
+                if score > best_score and score >= threshold:
+                    best_score = score
+                    best_match = self._name_index[name_key]
+            
+            if best_match:
+                matches[nombre_normalized] = (best_match, best_score, "difuso")
+        return matches
     
     def get_all_items(self) -> List[Dict[str, Any]]:
         """Get all menu items from cache."""
@@ -158,9 +310,10 @@ class MenuService:
         
         for item in self._cache.values():
             nombre = item.get('nombre', 'Item')
-            if nombre in seen:
+            nombre_key = normalize_text(nombre)
+            if nombre_key in seen:
                 continue
-            seen.add(nombre)
+            seen.add(nombre_key)
             
             precio = item.get('precio', 0)
             tiempo = item.get('tiempo_prep', 5)
@@ -181,6 +334,20 @@ class MenuService:
     def is_loaded(self) -> bool:
         return self._loaded
     
+    @property
+    def version(self) -> int:
+        """Menu version, incremented each time the cache is (re)loaded."""
+        if not self._loaded:
+            self.load_menu()
+        return self._version
+
+    @property
+    def menu_terms(self) -> Set[str]:
+        """Words that name a product or a category (normalized, plurals for categories)."""
+        if not self._loaded:
+            self.load_menu()
+        return self._terms
+
     @property
     def item_count(self) -> int:
         return len(self._cache)
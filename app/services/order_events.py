@@ -0,0 +1,114 @@
+"""
+Order Events Service - Push feed of kitchen order changes.
+The shared Firestore listener behind FirestoreService's active orders view
+feeds an in-process event bus; every connected kitchen display subscribes
+to the bus instead of polling.
+"""
+from typing import Optional, Dict, Any, List, Set, Tuple
+from functools import lru_cache
+import asyncio
+
+from fastapi.encoders import jsonable_encoder
+
+from app.services.firestore_service import get_firestore_service
+
+
+class OrderEventBus:
+    """
+    Singleton event bus for the kitchen board.
+
+    Keeps the current set of board orders (pending, in preparation, ready)
+    and fans out deltas to subscribers. Changes arrive on the Firestore
+    listener thread, so events are handed to the loop with
+    ``call_soon_threadsafe``.
+    """
+
+    _instance: Optional['OrderEventBus'] = None
+    _orders: Optional[Dict[str, Dict[str, Any]]] = None
+
+    # Slow subscribers beyond this backlog are dropped (the client reconnects)
+    SUBSCRIBER_QUEUE_SIZE = 256
+
+    def __new__(cls) -> 'OrderEventBus':
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if self._orders is None:
+            self._orders = {}
+            self._subscribers: Set[asyncio.Queue] = set()
+            self._loop: Optional[asyncio.AbstractEventLoop] = None
+            self._unsubscribe = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._unsubscribe is not None
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """Subscribe to the shared orders listener (called on application startup)."""
+        if self._unsubscribe is not None:
+            return
+        self._loop = loop or asyncio.get_running_loop()
+        self._unsubscribe = get_firestore_service().subscribe_orders(self._on_changes)
+        if self._unsubscribe is not None:
+            print("📡 Feed de órdenes activo")
+
+    def stop(self):
+        """Detach from the listener and release subscribers."""
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+            self._unsubscribe = None
+        for queue in list(self._subscribers):
+            self._offer(queue, None)
+        self._subscribers.clear()
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Current board orders, oldest first."""
+        return sorted(self._orders.values(), key=lambda o: str(o.get('fecha_creacion') or ''))
+
+    def subscribe(self) -> asyncio.Queue:
+        """Register a subscriber; it receives event dicts (None means closed)."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def _offer(self, queue: asyncio.Queue, event: Optional[Dict[str, Any]]):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Subscriber fell behind: close it so the client resyncs on reconnect
+            self._subscribers.discard(queue)
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+    def _on_changes(self, changes: List[Tuple[str, Dict[str, Any]]]):
+        """Order changes from the shared listener (runs on the listener thread)."""
+        events = [{"tipo": tipo, "orden": jsonable_encoder(order)} for tipo, order in changes]
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._publish, events)
+
+    def _publish(self, events: List[Dict[str, Any]]):
+        """Apply deltas to the board and fan them out (runs on the event loop)."""
+        for event in events:
+            order = event["orden"]
+            if event["tipo"] == "removed":
+                self._orders.pop(order['id'], None)
+            else:
+                self._orders[order['id']] = order
+        for event in events:
+            for queue in list(self._subscribers):
+                self._offer(queue, event)
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+
+@lru_cache()
+def get_order_event_bus() -> OrderEventBus:
+    """Get singleton instance of OrderEventBus."""
+    return OrderEventBus()
@@ -0,0 +1,186 @@
+"""
+Response Cache Service - Reuse Gemini answers to repeated general questions.
+Questions about the menu, prices or the cafeteria ("¿qué tienen de postre?")
+get the same answer for every customer of a tier while the menu does not
+change. Keys are the normalized token set of the question, so word order,
+accents, punctuation and filler words do not matter. Only questions that
+name a product or category, or a general topic (hours, payment, the menu
+itself), are eligible, and only outside an ongoing conversation.
+"""
+from typing import Optional, Dict, Any, List, Set, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+import re
+import threading
+import time
+
+from app.core.config import settings
+from app.services.menu_service import normalize_text
+
+
+_NON_WORD = re.compile(r"[^\w\s]")
+
+# Words that carry no meaning for the answer
+_STOPWORDS = {
+    "el", "la", "los", "las", "un", "una", "unos", "unas", "de", "del", "al", "a", "en",
+    "y", "o", "que", "por", "favor", "porfa", "hola", "oye", "buenas", "buenos", "dias",
+    "tardes", "noches", "gracias", "es", "son", "se", "lo", "le", "les", "su", "sus",
+}
+
+# Questions usually start like this when they lack a question mark
+_INTERROGATIVES = {
+    "que", "cuanto", "cuanta", "cuantos", "cuantas", "cual", "cuales", "tienen", "tienes",
+    "hay", "venden", "donde", "como", "cuando", "a",
+}
+
+# General questions about the cafeteria that do not name a product
+_GENERAL_TOPICS = {
+    "menu", "carta", "horario", "horarios", "abren", "cierran", "abierto", "abiertos",
+    "direccion", "ubicacion", "ubicados", "wifi", "tarjeta", "efectivo", "pago", "pagos",
+    "estacionamiento", "promocion", "promociones",
+}
+
+# References to the customer or to earlier turns: the answer is personal
+_CONTEXTUAL = {
+    "mi", "mis", "me", "yo", "conmigo", "ese", "esa", "eso", "este", "esta", "esto",
+    "otro", "otra", "tambien", "entonces", "mismo", "misma", "pedido", "orden", "cancela",
+    "cancelar", "llamo", "nombre", "siempre",
+}
+
+
+@dataclass
+class _CachedResponse:
+    expires_at: float
+    mensaje: str
+    mensajes: Optional[List[str]]
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache of text answers keyed by (menu version, customer tier,
+    question token set).
+
+    Only short, self-contained questions about the menu or the cafeteria
+    are eligible (see ``key_for``), and only when the customer is not in
+    the middle of a conversation (see ``in_conversation``); callers also
+    skip turns with a pending order, and store answers that came without a
+    tool call and do not mention the customer.
+
+    Args:
+        max_entries: Maximum number of cached answers
+        ttl_seconds: Lifetime of an answer since it was stored
+        max_tokens: Longer questions are not cached
+        quiet_seconds: A customer whose last turn is more recent is in a conversation
+    """
+
+    # Phones whose last turn time is remembered (LRU)
+    MAX_TRACKED_PHONES = 20000
+
+    def __init__(self, max_entries: int, ttl_seconds: float, max_tokens: int, quiet_seconds: float):
+        self._max_entries = max_entries
+        self._ttl = ttl_seconds
+        self._max_tokens = max_tokens
+        self._quiet = quiet_seconds
+        self._entries: "OrderedDict[Tuple[int, str, str], _CachedResponse]" = OrderedDict()
+        self._last_turn: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    def key_for(
+        self,
+        mensaje: str,
+        menu_version: int,
+        tier: str,
+        menu_terms: Set[str]
+    ) -> Optional[Tuple[int, str, str]]:
+        """
+        Cache key for a message, or None if the message is not a general
+        question (too long, not a question, a follow-up, refers to the
+        customer, or names neither a menu term nor a general topic).
+        """
+        words = _NON_WORD.sub(" ", normalize_text(mensaje)).split()
+        if not words or words[0] == "y" or set(words) & _CONTEXTUAL:
+            return None
+        if "?" not in mensaje and words[0] not in _INTERROGATIVES:
+            return None
+        if not any(w in menu_terms or w in _GENERAL_TOPICS for w in words):
+            return None
+        tokens = sorted({w for w in words if w not in _STOPWORDS})
+        if not tokens or len(tokens) > self._max_tokens:
+            return None
+        return (menu_version, tier, " ".join(tokens))
+
+    def in_conversation(self, telefono: str, has_history: bool) -> bool:
+        """
+        True if the customer's previous turn was less than ``quiet_seconds``
+        ago, or (unknown to this process) they have chat history. Records
+        the current turn.
+        """
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_turn.pop(telefono, None)
+            self._last_turn[telefono] = now
+            while len(self._last_turn) > self.MAX_TRACKED_PHONES:
+                self._last_turn.popitem(last=False)
+        if last is None:
+            return has_history
+        return now - last < self._quiet
+
+    def get(self, key: Optional[Tuple[int, str, str]]) -> Optional[_CachedResponse]:
+        if key is None:
+            self.skipped += 1
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Optional[Tuple[int, str, str]], mensaje: str, mensajes: Optional[List[str]] = None):
+        if key is None or not mensaje:
+            return
+        with self._lock:
+            self._entries[key] = _CachedResponse(
+                expires_at=time.monotonic() + self._ttl,
+                mensaje=mensaje,
+                mensajes=list(mensajes) if mensajes else None
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "no_cacheables": self.skipped,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+@lru_cache()
+def get_response_cache() -> ResponseCache:
+    """Get singleton instance of ResponseCache."""
+    return ResponseCache(
+        max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+        ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+        max_tokens=settings.RESPONSE_CACHE_MAX_TOKENS,
+        quiet_seconds=settings.RESPONSE_CACHE_QUIET_SECONDS
+    )
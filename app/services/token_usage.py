@@ -0,0 +1,179 @@
+"""
+Token Usage Service - Token and cost accounting for Gemini turns.
+Records the usage metadata Gemini returns for every turn, aggregated per
+customer and per hour, and keeps the prompt of each turn within a token
+budget by trimming the oldest history.
+"""
+from typing import Optional, Dict, Any, List, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from functools import lru_cache
+import math
+import threading
+
+from app.core.config import settings
+
+
+@dataclass
+class _UsageTotals:
+    turnos: int = 0
+    prompt: int = 0
+    historial: int = 0
+    salida: int = 0
+    costo_usd: float = 0.0
+
+    def add(self, tokens: Dict[str, Any]):
+        self.turnos += 1
+        self.prompt += tokens["prompt"]
+        self.historial += tokens["historial"]
+        self.salida += tokens["salida"]
+        self.costo_usd += tokens["costo_usd"]
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["costo_usd"] = round(self.costo_usd, 6)
+        return data
+
+
+class TokenUsageTracker:
+    """
+    Per-turn token accounting.
+
+    Gemini reports prompt and output tokens per call but not how many of the
+    prompt tokens came from the history, so history tokens are estimated
+    from characters with a chars-per-token ratio calibrated against the
+    reported prompt sizes. The same estimate enforces the prompt budget
+    before the call.
+
+    Args:
+        max_customers: Customers kept in the per-customer aggregate (LRU)
+        hours_kept: Hourly buckets kept
+        input_cost_per_mtok: USD per million prompt tokens
+        output_cost_per_mtok: USD per million output tokens
+    """
+
+    # Starting ratio for Spanish text until real turns calibrate it
+    DEFAULT_CHARS_PER_TOKEN = 4.0
+    # Weight of each new turn in the calibrated ratio
+    CALIBRATION_WEIGHT = 0.1
+
+    def __init__(self, max_customers: int, hours_kept: int, input_cost_per_mtok: float, output_cost_per_mtok: float):
+        self._max_customers = max_customers
+        self._hours_kept = hours_kept
+        self._input_cost = input_cost_per_mtok / 1_000_000
+        self._output_cost = output_cost_per_mtok / 1_000_000
+        self._chars_per_token = self.DEFAULT_CHARS_PER_TOKEN
+        self._totals = _UsageTotals()
+        self._by_customer: "OrderedDict[str, _UsageTotals]" = OrderedDict()
+        self._by_hour: "OrderedDict[str, _UsageTotals]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.trimmed_turns = 0
+
+    @property
+    def chars_per_token(self) -> float:
+        return self._chars_per_token
+
+    def estimate_tokens(self, chars: int) -> int:
+        return math.ceil(chars / self._chars_per_token)
+
+    @staticmethod
+    def history_chars(historial: List[Dict[str, Any]]) -> int:
+        return sum(len(str(p)) for message in historial for p in message.get("parts", []))
+
+    def fit_history(
+        self,
+        historial: List[Dict[str, Any]],
+        fixed_chars: int,
+        budget: int
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Drop the oldest messages until the estimated prompt (system
+        instruction, message and history) fits in ``budget`` tokens.
+        The kept history always starts with a user message.
+
+        Returns:
+            (history to send, number of messages dropped)
+        """
+        if budget <= 0 or not historial:
+            return historial, 0
+
+        sizes = [sum(len(str(p)) for p in m.get("parts", [])) for m in historial]
+        total_chars = fixed_chars + sum(sizes)
+        start = 0
+        while start < len(historial) and self.estimate_tokens(total_chars) > budget:
+            total_chars -= sizes[start]
+            start += 1
+        while start < len(historial) and historial[start].get("role") != "user":
+            start += 1
+
+        if start:
+            with self._lock:
+                self.trimmed_turns += 1
+        return historial[start:], start
+
+    def record(self, telefono: str, usage_metadata: Any, prompt_chars: int, history_chars: int) -> Optional[Dict[str, Any]]:
+        """
+        Account a Gemini call from its ``usage_metadata``.
+        Returns the turn's token breakdown, or None if Gemini sent no usage.
+        """
+        prompt_tokens = int(getattr(usage_metadata, "prompt_token_count", 0) or 0)
+        output_tokens = int(getattr(usage_metadata, "candidates_token_count", 0) or 0)
+        if not prompt_tokens and not output_tokens:
+            return None
+
+        with self._lock:
+            if prompt_tokens and prompt_chars:
+                observed = prompt_chars / prompt_tokens
+                self._chars_per_token += self.CALIBRATION_WEIGHT * (observed - self._chars_per_token)
+
+            tokens = {
+                "prompt": prompt_tokens,
+                "historial": min(prompt_tokens, self.estimate_tokens(history_chars)) if history_chars else 0,
+                "salida": output_tokens,
+                "costo_usd": prompt_tokens * self._input_cost + output_tokens * self._output_cost,
+            }
+
+            self._totals.add(tokens)
+
+            customer = self._by_customer.pop(telefono, None) or _UsageTotals()
+            customer.add(tokens)
+            self._by_customer[telefono] = customer
+            while len(self._by_customer) > self._max_customers:
+                self._by_customer.popitem(last=False)
+
+            hour = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:00Z")
+            self._by_hour.setdefault(hour, _UsageTotals()).add(tokens)
+            while len(self._by_hour) > self._hours_kept:
+                self._by_hour.popitem(last=False)
+
+        tokens["costo_usd"] = round(tokens["costo_usd"], 6)
+        return tokens
+
+    def customer(self, telefono: str) -> Optional[Dict[str, Any]]:
+        """Aggregated usage of a customer (None if no turn was recorded)."""
+        with self._lock:
+            totals = self._by_customer.get(telefono)
+            return totals.as_dict() if totals else None
+
+    def stats(self, top: int = 10) -> Dict[str, Any]:
+        with self._lock:
+            heaviest = sorted(self._by_customer.items(), key=lambda kv: kv[1].prompt + kv[1].salida, reverse=True)
+            return {
+                **self._totals.as_dict(),
+                "chars_por_token": round(self._chars_per_token, 2),
+                "turnos_recortados": self.trimmed_turns,
+                "por_hora": {hour: totals.as_dict() for hour, totals in self._by_hour.items()},
+                "clientes_top": {tel: totals.as_dict() for tel, totals in heaviest[:top]},
+            }
+
+
+@lru_cache()
+def get_token_usage_tracker() -> TokenUsageTracker:
+    """Get singleton instance of TokenUsageTracker."""
+    return TokenUsageTracker(
+        max_customers=settings.TOKEN_USAGE_MAX_CUSTOMERS,
+        hours_kept=settings.TOKEN_USAGE_HOURS_KEPT,
+        input_cost_per_mtok=settings.GEMINI_INPUT_COST_PER_MTOK,
+        output_cost_per_mtok=settings.GEMINI_OUTPUT_COST_PER_MTOK
+    )
@@ -0,0 +1,110 @@
+"""
+Benchmark: Firestore reads of a dashboard refresh, full reload vs delta.
+
+Seeds a week of orders in the in-memory Firestore stand-in, loads the
+week-range dataset once, then changes a few orders (status updates, items
+added, a new order) and refreshes with the cursor. The refresh must read
+exactly the changed documents; exits with status 1 otherwise.
+
+Usage:
+    python benchmarks/bench_dashboard_delta.py [--orders-per-day 500] [--changes 12]
+"""
+from datetime import datetime, timedelta, timezone
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+from fake_firestore import make_firestore_service
+
+import app.services.analytics_service as analytics_module
+from app.models.schemas import Order, OrderItem, OrderStatus
+from app.services.analytics_service import AnalyticsService
+
+
+def make_order(i: int, created: datetime) -> Order:
+    return Order(
+        id=f"ORD-{i:06d}",
+        id_cliente=f"55{i % 300:08d}",
+        items=[OrderItem(nombre_producto="Latte", cantidad=1 + i % 3, precio_unitario=55.0)],
+        total=55.0 * (1 + i % 3),
+        estado=OrderStatus.ENTREGADO if i % 4 else OrderStatus.PENDIENTE,
+        fecha_creacion=created
+    )
+
+
+async def run(orders_per_day: int, changes: int) -> bool:
+    service = make_firestore_service()
+    analytics_module.get_firestore_service = lambda: service
+    analytics = AnalyticsService()
+
+    today = datetime.now(timezone.utc).date()
+    desde = today - timedelta(days=6)
+    i = 0
+    for day in range(7):
+        start = datetime.combine(desde + timedelta(days=day), datetime.min.time(), tzinfo=timezone.utc)
+        for n in range(orders_per_day):
+            await service.create_order(make_order(i, start + timedelta(seconds=n * 60)))
+            i += 1
+
+    service._db.reset_counters()
+    started = time.perf_counter()
+    full, cursor = await analytics.orders_dataset(desde, today)
+    full_ms = (time.perf_counter() - started) * 1000
+    full_reads = service._db.reads
+
+    # Changes made after the load: status updates, appended items, new orders
+    time.sleep(0.001)
+    pending = [f"ORD-{j:06d}" for j in random.Random(7).sample(range(0, i, 4), changes)]
+    changed = set()
+    for n, order_id in enumerate(pending[:changes - 2]):
+        if n % 2:
+            await service.update_order_status(order_id, OrderStatus.EN_PREPARACION)
+        else:
+            item = OrderItem(nombre_producto="Muffin", cantidad=1, precio_unitario=35.0)
+            await service.append_order_items(order_id, [item.to_firestore()], 5)
+        changed.add(order_id)
+    for _ in range(2):
+        await service.create_order(make_order(i, datetime.now(timezone.utc)))
+        changed.add(f"ORD-{i:06d}")
+        i += 1
+
+    service._db.reset_counters()
+    started = time.perf_counter()
+    delta, cursor = await analytics.orders_dataset(desde, today, cambios_desde=cursor)
+    delta_ms = (time.perf_counter() - started) * 1000
+    delta_reads = service._db.reads
+
+    # Nothing changed since: an empty delta
+    service._db.reset_counters()
+    empty, _ = await analytics.orders_dataset(desde, today, cambios_desde=cursor)
+
+    print(f"Week range: {full.num_rows} orders, {changes} changed")
+    print(f"Full load:     {full_reads:6d} reads  {full_ms:8.1f} ms")
+    print(f"Delta refresh: {delta_reads:6d} reads  {delta_ms:8.1f} ms  ({delta.num_rows} rows)")
+    print(f"Idle refresh:  {service._db.reads:6d} reads  ({empty.num_rows} rows)")
+
+    ok = (
+        delta_reads == len(changed)
+        and set(delta.column("id").to_pylist()) == changed
+        and empty.num_rows == 0
+    )
+    service.shutdown()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders-per-day", type=int, default=500)
+    parser.add_argument("--changes", type=int, default=12)
+    args = parser.parse_args()
+
+    if not asyncio.run(run(args.orders_per_day, max(3, args.changes))):
+        print("❌ The delta refresh did not read exactly the changed orders")
+        sys.exit(1)
+    print("✅ Delta refresh reads only the changed orders")
+
+
+if __name__ == "__main__":
+    main()
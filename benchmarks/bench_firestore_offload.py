@@ -0,0 +1,77 @@
+"""
+Benchmark: event-loop throughput of FirestoreService with blocking calls
+run inline (previous behaviour) vs offloaded to the bounded executor.
+
+Each simulated request mirrors a chat turn (profile, favorite product,
+history, save message) or a KDS poll (orders by status) against the
+in-memory Firestore stand-in with a fixed per-RPC latency.
+
+Usage:
+    python benchmarks/bench_firestore_offload.py [--requests 200] [--latency 0.01]
+"""
+from concurrent.futures import Executor, Future
+import argparse
+import asyncio
+import time
+
+from fake_firestore import make_firestore_service
+
+from app.models.schemas import OrderStatus
+
+
+class InlineExecutor(Executor):
+    """Runs submitted calls on the caller thread, i.e. blocking the event loop."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as exc:
+            future.set_exception(exc)
+        return future
+
+
+async def chat_turn(service, telefono: str):
+    await service.get_customer_profile(telefono)
+    await service.get_favorite_product(telefono)
+    await service.get_chat_history(telefono)
+    await service.save_message(telefono, "user", "un latte por favor")
+
+
+async def kds_poll(service):
+    await service.get_orders_by_status(OrderStatus.PENDIENTE)
+
+
+async def run(service, total: int) -> float:
+    start = time.perf_counter()
+    tasks = []
+    for i in range(total):
+        if i % 2:
+            tasks.append(chat_turn(service, f"55{i % 50:08d}"))
+        else:
+            tasks.append(kds_poll(service))
+    await asyncio.gather(*tasks)
+    return total / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.01, help="Seconds per simulated RPC")
+    args = parser.parse_args()
+
+    blocking = make_firestore_service(latency=args.latency)
+    blocking._executor = InlineExecutor()
+    offloaded = make_firestore_service(latency=args.latency)
+
+    before = asyncio.run(run(blocking, args.requests))
+    after = asyncio.run(run(offloaded, args.requests))
+
+    print(f"Requests: {args.requests}  RPC latency: {args.latency * 1000:.0f} ms")
+    print(f"Inline (blocking loop):   {before:8.1f} req/s")
+    print(f"Executor offload:         {after:8.1f} req/s  ({after / before:.1f}x)")
+    offloaded.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark: KPI engine latency on a year of multi-branch orders.
+
+Builds a synthetic order table (ORDER_SCHEMA) with NumPy, checks the
+vectorized engine against a straightforward pandas implementation on a
+sample, then times ``AnalyticsService.kpis_from_table`` on the full table.
+
+Usage:
+    python benchmarks/bench_kpis.py [--orders 1000000] [--customers 60000] [--repeat 5]
+"""
+from datetime import datetime, timedelta, timezone
+import argparse
+import sys
+import time
+
+import fake_firestore  # noqa: F401  (settings environment)
+
+import numpy as np
+import pyarrow as pa
+
+from app.services.analytics_service import ORDER_SCHEMA, AnalyticsService
+
+PRODUCTS = [
+    "Latte", "Americano", "Capuchino", "Moka", "Té Chai", "Frappé", "Muffin",
+    "Croissant", "Bagel", "Panini", "Brownie", "Cheesecake", "Jugo Verde", "Espresso",
+]
+STATES = ["entregado", "listo", "pendiente", "en_preparacion", "cancelado"]
+
+
+def synthetic_orders(n: int, customers: int, now: datetime, seed: int = 42) -> pa.Table:
+    """n orders over the last 365 days, 1-4 lines each, skewed products and customers."""
+    rng = np.random.default_rng(seed)
+    start_ms = int((now - timedelta(days=365)).timestamp() * 1000)
+    fecha = np.sort(rng.integers(start_ms, int(now.timestamp() * 1000), n))
+
+    lines = rng.integers(1, 5, n)
+    offsets = np.concatenate([[0], np.cumsum(lines)]).astype(np.int32)
+    popularity = rng.dirichlet(np.ones(len(PRODUCTS)) * 0.7)
+    product = rng.choice(len(PRODUCTS), size=int(offsets[-1]), p=popularity)
+    qty = rng.integers(1, 4, int(offsets[-1])).astype(np.int32)
+    prices = rng.integers(35, 120, len(PRODUCTS)).astype(np.float64)
+    total = np.add.reduceat(prices[product] * qty, offsets[:-1])
+
+    customer = (rng.zipf(1.3, n) - 1) % customers
+    estado = rng.choice(len(STATES), size=n, p=[0.7, 0.1, 0.05, 0.05, 0.1])
+
+    arrays = [
+        pa.array([f"ORD-{i:07d}" for i in range(n)]),
+        pa.array(fecha, type=pa.timestamp("ms", tz="UTC")),
+        pa.array(fecha, type=pa.timestamp("ms", tz="UTC")),
+        pa.DictionaryArray.from_arrays(pa.array(estado.astype(np.int8)), pa.array(STATES)),
+        pa.array(total),
+        pa.array(np.char.add("55", np.char.zfill(customer.astype(str), 8)).astype(object)),
+        pa.array(np.add.reduceat(qty, offsets[:-1]).astype(np.int32)),
+        pa.ListArray.from_arrays(pa.array(offsets), pa.array(np.array(PRODUCTS, dtype=object)[product])),
+        pa.ListArray.from_arrays(pa.array(offsets), pa.array(qty)),
+    ]
+    return pa.Table.from_arrays(arrays, schema=ORDER_SCHEMA)
+
+
+def reference_kpis(table: pa.Table, now: datetime) -> dict:
+    """The same definitions written row-wise with pandas, to check the engine."""
+    periods = AnalyticsService.kpi_periods(now)
+    df = table.to_pandas()
+    df["estado"] = df["estado"].astype(str)
+    sold = df[df["estado"].isin(["listo", "entregado"])]
+    valid = df[df["estado"] != "cancelado"]
+    mes = sold[sold["fecha_creacion"] >= periods["mes"]]
+
+    lines = mes[["productos", "cantidades"]].explode(["productos", "cantidades"])
+    estrella = lines.groupby("productos")["cantidades"].sum().idxmax() if len(lines) else "N/A"
+
+    primera = valid.groupby("telefono")["fecha_creacion"].min()
+    actual = set(valid[valid["fecha_creacion"] >= periods["mes"]]["telefono"])
+    anterior = set(valid[(valid["fecha_creacion"] >= periods["mes_anterior"])
+                         & (valid["fecha_creacion"] < periods["mes"])]["telefono"])
+    return {
+        "ventas_hoy": round(sold[sold["fecha_creacion"] >= periods["hoy"]]["total"].sum(), 2),
+        "ventas_semana": round(sold[sold["fecha_creacion"] >= periods["semana"]]["total"].sum(), 2),
+        "ventas_mes": round(mes["total"].sum(), 2),
+        "ordenes_hoy": int((valid["fecha_creacion"] >= periods["hoy"]).sum()),
+        "ticket_promedio": round(mes["total"].sum() / len(mes), 2) if len(mes) else 0.0,
+        "producto_estrella": estrella,
+        "clientes_nuevos": int((primera >= periods["mes"]).sum()),
+        "tasa_retencion": round(len(actual & anterior) / len(anterior), 4) if anterior else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--customers", type=int, default=60_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    now = datetime.now(timezone.utc)
+
+    sample = synthetic_orders(50_000, 5_000, now, seed=7)
+    engine = AnalyticsService.kpis_from_table(sample, now).model_dump()
+    reference = reference_kpis(sample, now)
+    mismatches = {k: (engine[k], v) for k, v in reference.items() if engine[k] != v}
+    if mismatches:
+        print(f"❌ Engine and reference differ: {mismatches}")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    table = synthetic_orders(args.orders, args.customers, now)
+    build_s = time.perf_counter() - started
+
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        metrics = AnalyticsService.kpis_from_table(table, now)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    print(f"Orders: {table.num_rows:,}  lines: {len(table.column('productos').combine_chunks().flatten()):,}"
+          f"  (built in {build_s:.1f} s)")
+    print(f"kpis_from_table: best {min(timings):7.1f} ms  median {sorted(timings)[len(timings) // 2]:7.1f} ms")
+    for name, value in metrics.model_dump().items():
+        print(f"  {name:18s} {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark: MenuService.buscar_producto with the trigram index vs the
+previous linear scan (substring pass + SequenceMatcher over every key),
+on a synthetic multi-branch menu.
+
+Usage:
+    python benchmarks/bench_menu_search.py [--items 1000] [--queries 2000]
+"""
+from difflib import SequenceMatcher
+import argparse
+import random
+import time
+
+import fake_firestore  # noqa: F401  (sets up sys.path and settings env)
+
+from app.services.menu_service import MenuService
+
+BASES = [
+    "Latte", "Café Americano", "Cappuccino", "Flat White", "Cold Brew", "Espresso Doble",
+    "Té Chai", "Chocolate Caliente", "Croissant", "Bagel Salmón", "Panini", "Muffin Arándanos",
+    "Tostada Aguacate", "Cheesecake", "Brownie", "Tiramisú", "Macaron Mix", "Smoothie Fresa",
+]
+VARIANTS = [
+    "Vainilla", "Caramelo", "Avellana", "Deslactosado", "Almendra", "Grande", "Mediano",
+    "Orgánico", "Especial", "de la Casa", "Helado", "Doble Shot", "Sin Azúcar", "Integral",
+]
+BRANCHES = ["Centro", "Juzgados", "Reforma", "Polanco", "Coyoacán", "Roma", "Condesa", "Norte"]
+
+
+def synthetic_menu(size: int):
+    rng = random.Random(7)
+    names = set()
+    while len(names) < size:
+        names.add(f"{rng.choice(BASES)} {rng.choice(VARIANTS)} {rng.choice(BRANCHES)}")
+    return [
+        {"id": f"item_{i}", "nombre": name, "precio": rng.randint(30, 150), "tiempo_prep": 5, "categoria": "bebida"}
+        for i, name in enumerate(sorted(names))
+    ]
+
+
+def typo(text: str, rng: random.Random) -> str:
+    pos = rng.randrange(len(text))
+    return text[:pos] + text[pos + 1:]
+
+
+def queries_for(items, count: int):
+    rng = random.Random(11)
+    queries = []
+    for _ in range(count):
+        nombre = rng.choice(items)["nombre"]
+        kind = rng.randrange(4)
+        if kind == 0:
+            queries.append(nombre.upper())  # exact tier
+        elif kind == 1:
+            queries.append(" ".join(nombre.split()[:2]))  # partial
+        elif kind == 2:
+            queries.append(typo(typo(nombre, rng), rng))  # fuzzy
+        else:
+            queries.append(rng.choice(["pizza hawaiana", "sushi roll", "hamburguesa doble"]))  # miss
+    return queries
+
+
+def legacy_buscar(service: MenuService, nombre_buscado: str, threshold: float = 0.6):
+    """Previous implementation: linear substring pass, then SequenceMatcher on every key."""
+    nombre_lower = nombre_buscado.lower().strip()
+    nombre_normalized = service._normalize_text(nombre_lower)
+    if nombre_lower in service._name_index:
+        return service._cache[service._name_index[nombre_lower]]
+    if nombre_normalized in service._name_index:
+        return service._cache[service._name_index[nombre_normalized]]
+    if nombre_lower in service._cache:
+        return service._cache[nombre_lower]
+    for name_key, item_id in service._name_index.items():
+        if nombre_lower in name_key or nombre_normalized in name_key:
+            return service._cache[item_id]
+        if name_key in nombre_lower or name_key in nombre_normalized:
+            return service._cache[item_id]
+    best_match, best_score = None, 0.0
+    for name_key, item_id in service._name_index.items():
+        score = max(
+            SequenceMatcher(None, nombre_lower, name_key).ratio(),
+            SequenceMatcher(None, nombre_normalized, name_key).ratio()
+        )
+        if score > best_score and score >= threshold:
+            best_score, best_match = score, item_id
+    return service._cache[best_match] if best_match else None
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    results = [fn(q) for q in queries]
+    return (time.perf_counter() - start) / len(queries) * 1e6, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    items = synthetic_menu(args.items)
+    service = object.__new__(MenuService)
+    service._cache, service._name_index = {}, {}
+    service._search_index = type(MenuService._search_index)()
+    service._loaded = False
+    service._version = 0
+
+    class _Source:
+        @staticmethod
+        def get_menu_items():
+            return items
+
+    import app.services.menu_service as menu_module
+    menu_module.get_firestore_service = lambda: _Source
+    start = time.perf_counter()
+    service.load_menu()
+    build_ms = (time.perf_counter() - start) * 1000
+
+    queries = queries_for(items, args.queries)
+    legacy_us, legacy_results = timed(lambda q: legacy_buscar(service, q), queries)
+    index_us, index_results = timed(service.buscar_producto, queries)
+
+    agree = sum(
+        (a or {}).get("id") == (b or {}).get("id") for a, b in zip(legacy_results, index_results)
+    ) / len(queries)
+
+    print(f"Menu items: {len(items)}  index keys: {len(service._name_index)}  build: {build_ms:.1f} ms")
+    print(f"Linear scan:    {legacy_us:9.1f} µs/lookup")
+    print(f"Trigram index:  {index_us:9.1f} µs/lookup  ({legacy_us / index_us:.0f}x)")
+    print(f"Same result as linear scan: {agree:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,480 @@
+"""
+In-memory Firestore stand-in for benchmarks and stress runs.
+Implements the subset of the google-cloud-firestore client used by
+FirestoreService, with an optional per-RPC latency to simulate the network.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timezone
+import copy
+import itertools
+import os
+import sys
+import threading
+import time
+import uuid
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Settings require these variables; benchmarks never talk to the real APIs.
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "benchmark")
+
+from google.api_core import exceptions
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+
+def _get_path(data: Dict[str, Any], field_path: str) -> Any:
+    value: Any = data
+    for part in field_path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def _apply_value(current: Any, value: Any) -> Any:
+    """Resolve a sentinel/transform against the current field value."""
+    if value is transforms.SERVER_TIMESTAMP:
+        return datetime.now(timezone.utc)
+    if isinstance(value, transforms.Increment):
+        return (current or 0) + value.value
+    if isinstance(value, transforms.ArrayUnion):
+        result = list(current or [])
+        for element in value.values:
+            if element not in result:
+                result.append(copy.deepcopy(element))
+        return result
+    if isinstance(value, transforms.ArrayRemove):
+        return [e for e in (current or []) if e not in value.values]
+    if isinstance(value, dict):
+        base = current if isinstance(current, dict) else {}
+        return _merge(dict(base), value)
+    return copy.deepcopy(value)
+
+
+def _merge(target: Dict[str, Any], data: Dict[str, Any]) -> Dict[str, Any]:
+    for key, value in data.items():
+        if value is transforms.DELETE_FIELD:
+            target.pop(key, None)
+        else:
+            target[key] = _apply_value(target.get(key), value)
+    return target
+
+
+def _replace(data: Dict[str, Any]) -> Dict[str, Any]:
+    return _merge({}, data)
+
+
+def _update(target: Dict[str, Any], data: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply an update() payload whose keys may be dotted field paths."""
+    for field_path, value in data.items():
+        parts = field_path.split('.')
+        node = target
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        if value is transforms.DELETE_FIELD:
+            node.pop(parts[-1], None)
+        else:
+            node[parts[-1]] = _apply_value(node.get(parts[-1]), value)
+    return target
+
+
+class FakeSnapshot:
+    def __init__(self, reference: 'FakeDocumentReference', data: Optional[Dict[str, Any]], version: int):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.version = version
+        self.update_time = version
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str) -> Any:
+        return copy.deepcopy(_get_path(self._data or {}, field_path))
+
+
+class FakeDocumentReference:
+    def __init__(self, client: 'FakeClient', path: str):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    def collection(self, name: str) -> 'FakeCollection':
+        return FakeCollection(self._client, f"{self.path}/{name}")
+
+    def get(self, transaction: Optional['FakeTransaction'] = None, **kwargs) -> FakeSnapshot:
+        if transaction is not None:
+            transaction._lock(self.path)
+        self._client._rpc()
+        snapshot = self._client._snapshot(self.path)
+        if transaction is not None:
+            transaction._reads[self.path] = snapshot.version
+        return snapshot
+
+    def set(self, data: Dict[str, Any], merge: bool = False):
+        self._client._rpc()
+        self._client._commit([('set', self.path, data, merge)])
+
+    def update(self, data: Dict[str, Any], **kwargs):
+        self._client._rpc()
+        self._client._commit([('update', self.path, data, False)])
+
+    def delete(self, **kwargs):
+        self._client._rpc()
+        self._client._commit([('delete', self.path, None, False)])
+
+
+class FakeQuery:
+    def __init__(self, client: 'FakeClient', path: str):
+        self._client = client
+        self._path = path
+        self._filters: List[FieldFilter] = []
+        self._orders: List[Tuple[str, str]] = []
+        self._limit: Optional[int] = None
+        self._start_after: Optional[Tuple[Any, ...]] = None
+
+    def _copy(self) -> 'FakeQuery':
+        query = FakeQuery(self._client, self._path)
+        query._filters = list(self._filters)
+        query._orders = list(self._orders)
+        query._limit = self._limit
+        query._start_after = self._start_after
+        return query
+
+    def where(self, filter: FieldFilter = None, **kwargs) -> 'FakeQuery':
+        query = self._copy()
+        query._filters.append(filter)
+        return query
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> 'FakeQuery':
+        query = self._copy()
+        query._orders.append((field_path, direction))
+        return query
+
+    def limit(self, count: int) -> 'FakeQuery':
+        query = self._copy()
+        query._limit = count
+        return query
+
+    def select(self, field_paths: List[str]) -> 'FakeQuery':
+        return self._copy()
+
+    def start_after(self, snapshot: FakeSnapshot) -> 'FakeQuery':
+        query = self._copy()
+        query._start_after = self._sort_key(snapshot.id, snapshot.to_dict() or {})
+        return query
+
+    def _matches(self, data: Dict[str, Any]) -> bool:
+        for f in self._filters:
+            value = _get_path(data, f.field_path)
+            op, expected = f.op_string, f.value
+            if op == "==" and value != expected:
+                return False
+            if op == "in" and value not in expected:
+                return False
+            if op == "not-in" and value in expected:
+                return False
+            if op in ("<", "<=", ">", ">=") and value is None:
+                return False
+            if op == "<" and not value < expected:
+                return False
+            if op == "<=" and not value <= expected:
+                return False
+            if op == ">" and not value > expected:
+                return False
+            if op == ">=" and not value >= expected:
+                return False
+        return True
+
+    def _sort_key(self, doc_id: str, data: Dict[str, Any]) -> Tuple[Any, ...]:
+        key = []
+        for field_path, _ in self._orders:
+            key.append(doc_id if field_path == '__name__' else _get_path(data, field_path))
+        key.append(doc_id)
+        return tuple(key)
+
+    def _results(self) -> List[FakeSnapshot]:
+        snapshots = [s for s in self._client._children(self._path) if self._matches(s._data)]
+        for field_path, direction in reversed(self._orders):
+            snapshots.sort(
+                key=lambda s: (s.id if field_path == '__name__' else _get_path(s._data, field_path)) or 0,
+                reverse=(direction == "DESCENDING")
+            )
+        if self._start_after is not None:
+            snapshots = [s for s in snapshots if self._sort_key(s.id, s._data) > self._start_after]
+        if self._limit is not None:
+            snapshots = snapshots[:self._limit]
+        return snapshots
+
+    def stream(self, transaction: Optional['FakeTransaction'] = None, **kwargs):
+        self._client._rpc()
+        results = self._results()
+        self._client.reads += len(results)
+        return iter(results)
+
+    def get(self, **kwargs) -> List[FakeSnapshot]:
+        return list(self.stream(**kwargs))
+
+    def on_snapshot(self, callback) -> 'FakeWatch':
+        return self._client._watch(self, callback)
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, client: 'FakeClient', path: str):
+        super().__init__(client, path)
+        self.id = path.rsplit('/', 1)[-1]
+
+    def document(self, document_id: Optional[str] = None) -> FakeDocumentReference:
+        return FakeDocumentReference(self._client, f"{self._path}/{document_id or uuid.uuid4().hex[:20]}")
+
+    def add(self, data: Dict[str, Any]):
+        ref = self.document()
+        ref.set(data)
+        return (datetime.now(timezone.utc), ref)
+
+
+class FakeWriteBatch:
+    def __init__(self, client: 'FakeClient'):
+        self._client = client
+        self._writes: List[Tuple[str, str, Any, bool]] = []
+
+    def set(self, reference: FakeDocumentReference, data: Dict[str, Any], merge: bool = False):
+        self._writes.append(('set', reference.path, data, merge))
+
+    def update(self, reference: FakeDocumentReference, data: Dict[str, Any], **kwargs):
+        self._writes.append(('update', reference.path, data, False))
+
+    def delete(self, reference: FakeDocumentReference, **kwargs):
+        self._writes.append(('delete', reference.path, None, False))
+
+    def commit(self):
+        self._client._rpc()
+        writes, self._writes = self._writes, []
+        self._client._commit(writes)
+        return writes
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+
+class FakeBulkWriter(FakeWriteBatch):
+    """BulkWriter stand-in: buffers writes and commits them on flush/close."""
+
+    def flush(self):
+        if self._writes:
+            self.commit()
+
+    def close(self):
+        self.flush()
+
+
+class FakeTransaction(FakeWriteBatch):
+    """
+    Transaction compatible with ``firestore.transactional``.
+
+    Like the server client libraries, documents read in a transaction are
+    locked until commit or rollback, so concurrent transactions on the same
+    document queue up. Commit still aborts when a non-transactional write
+    changed a document read in the attempt.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, client: 'FakeClient', max_attempts: int = 5):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = False
+        self._id: Optional[bytes] = None
+        self._reads: Dict[str, int] = {}
+        self._held: List[threading.Lock] = []
+
+    @property
+    def in_progress(self) -> bool:
+        return self._id is not None
+
+    def _lock(self, path: str):
+        lock = self._client._document_lock(path)
+        if lock not in self._held:
+            lock.acquire()
+            self._held.append(lock)
+
+    def _release(self):
+        while self._held:
+            self._held.pop().release()
+
+    def _begin(self, retry_id: Optional[bytes] = None):
+        self._id = str(next(self._ids)).encode()
+        self._reads = {}
+        self._writes = []
+
+    def _clean_up(self):
+        self._release()
+        self._id = None
+        self._writes = []
+
+    def _rollback(self):
+        self._clean_up()
+
+    def _commit(self):
+        try:
+            self._client._rpc()
+            writes, self._writes = self._writes, []
+            self._client._commit(writes, expected_versions=self._reads)
+        finally:
+            self._release()
+        self._id = None
+        return writes
+
+
+class FakeWatch:
+    def __init__(self, client: 'FakeClient', query: FakeQuery, callback):
+        self._client = client
+        self._query = query
+        self._callback = callback
+        self._known: Dict[str, FakeSnapshot] = {}
+
+    def _notify(self):
+        current = {s.id: s for s in self._query._results()}
+        changes = []
+        for doc_id, snapshot in current.items():
+            previous = self._known.get(doc_id)
+            if previous is None:
+                changes.append(FakeChange("ADDED", snapshot))
+            elif previous.version != snapshot.version:
+                changes.append(FakeChange("MODIFIED", snapshot))
+        for doc_id, snapshot in self._known.items():
+            if doc_id not in current:
+                changes.append(FakeChange("REMOVED", snapshot))
+        self._known = current
+        if changes or not hasattr(self, '_initialized'):
+            self._initialized = True
+            self._callback(list(current.values()), changes, datetime.now(timezone.utc))
+
+    def unsubscribe(self):
+        self._client._watches.discard(self)
+
+
+class FakeChange:
+    class _Type:
+        def __init__(self, name: str):
+            self.name = name
+
+    def __init__(self, type_name: str, document: FakeSnapshot):
+        self.type = self._Type(type_name)
+        self.document = document
+
+
+class FakeClient:
+    """
+    In-memory replacement for ``firestore.Client``.
+
+    Args:
+        latency: Seconds slept (blocking) on every RPC to mimic a network round trip.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.project = "fake-project"
+        self.latency = latency
+        self.reads = 0
+        self.writes = 0
+        self.rpcs = 0
+        self._docs: Dict[str, Tuple[Dict[str, Any], int]] = {}
+        self._versions = itertools.count(1)
+        self._lock = threading.RLock()
+        self._watches = set()
+        self._document_locks: Dict[str, threading.Lock] = {}
+
+    # --- client API ---
+
+    def collection(self, name: str) -> FakeCollection:
+        return FakeCollection(self, name)
+
+    def document(self, path: str) -> FakeDocumentReference:
+        return FakeDocumentReference(self, path)
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    def bulk_writer(self, **kwargs) -> FakeBulkWriter:
+        return FakeBulkWriter(self)
+
+    def transaction(self, max_attempts: int = 5, **kwargs) -> FakeTransaction:
+        return FakeTransaction(self, max_attempts=max_attempts)
+
+    def reset_counters(self):
+        self.reads = self.writes = self.rpcs = 0
+
+    # --- internals ---
+
+    def _rpc(self):
+        self.rpcs += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _document_lock(self, path: str) -> threading.Lock:
+        with self._lock:
+            return self._document_locks.setdefault(path, threading.Lock())
+
+    def _snapshot(self, path: str) -> FakeSnapshot:
+        with self._lock:
+            data, version = self._docs.get(path, (None, 0))
+            self.reads += 1
+            return FakeSnapshot(FakeDocumentReference(self, path), data, version)
+
+    def _children(self, collection_path: str) -> List[FakeSnapshot]:
+        depth = collection_path.count('/') + 1
+        prefix = collection_path + '/'
+        with self._lock:
+            return [
+                FakeSnapshot(FakeDocumentReference(self, path), data, version)
+                for path, (data, version) in self._docs.items()
+                if path.startswith(prefix) and path.count('/') == depth
+            ]
+
+    def _commit(self, writes, expected_versions: Optional[Dict[str, int]] = None):
+        with self._lock:
+            for path, version in (expected_versions or {}).items():
+                if self._docs.get(path, (None, 0))[1] != version:
+                    raise exceptions.Aborted("Transaction contention on %s" % path)
+            for op, path, data, merge in writes:
+                current = self._docs.get(path, (None, 0))[0]
+                if op == 'delete':
+                    self._docs.pop(path, None)
+                    continue
+                if op == 'update':
+                    if current is None:
+                        raise exceptions.NotFound("No document to update: %s" % path)
+                    new_data = _update(copy.deepcopy(current), data)
+                elif merge and current is not None:
+                    new_data = _merge(copy.deepcopy(current), data)
+                else:
+                    new_data = _replace(data)
+                self._docs[path] = (new_data, next(self._versions))
+                self.writes += 1
+            watches = list(self._watches)
+        for watch in watches:
+            watch._notify()
+
+    def _watch(self, query: FakeQuery, callback) -> FakeWatch:
+        watch = FakeWatch(self, query, callback)
+        with self._lock:
+            self._watches.add(watch)
+        watch._notify()
+        return watch
+
+
+def make_firestore_service(latency: float = 0.0):
+    """Build a FirestoreService wired to a fresh FakeClient (bypasses the singleton)."""
+    from app.services.firestore_service import FirestoreService
+
+    service = object.__new__(FirestoreService)
+    service._db = FakeClient(latency=latency)
+    service._executor = None
+    service.__init__()
+    return service
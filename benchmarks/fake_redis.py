@@ -0,0 +1,192 @@
+"""
+In-memory Redis stand-in for benchmarks and stress runs.
+Implements the subset of the ``redis.asyncio`` client used by
+RedisMessageBuffer: strings and lists with TTLs, MULTI pipelines and
+registered Lua scripts. Scripts run for real through ``lupa`` (embedded
+Lua), with ``redis.call`` bound to this fake, so the production script is
+what gets exercised.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Settings require these variables; benchmarks never talk to the real APIs.
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "benchmark")
+
+try:
+    import lupa
+except ImportError as e:
+    raise SystemExit("fake_redis requiere 'lupa' para ejecutar los scripts Lua (pip install lupa)") from e
+
+
+class FakeScript:
+    """Registered script; ``await script(keys=[...], args=[...])`` runs it atomically."""
+
+    def __init__(self, client: 'FakeRedis', source: str):
+        self._client = client
+        self._source = source
+
+    async def __call__(self, keys: List[str] = (), args: List[Any] = ()) -> Any:
+        self._client.commands += 1
+        result = self._client._eval(self._source, list(keys), [str(a) for a in args])
+        await self._client._reply_delay()
+        return result
+
+
+class FakePipeline:
+    """MULTI/EXEC pipeline: commands are queued and applied together on ``execute``."""
+
+    def __init__(self, client: 'FakeRedis'):
+        self._client = client
+        self._queued: List[Tuple[str, tuple]] = []
+
+    async def __aenter__(self) -> 'FakePipeline':
+        return self
+
+    async def __aexit__(self, *exc):
+        self._queued.clear()
+
+    def __getattr__(self, name: str):
+        if name not in FakeRedis.COMMANDS:
+            raise AttributeError(name)
+
+        def queue(*args):
+            self._queued.append((name, args))
+            return self
+        return queue
+
+    async def execute(self) -> List[Any]:
+        self._client.commands += 1
+        results = [self._client._call(name, *args) for name, args in self._queued]
+        self._queued.clear()
+        await self._client._reply_delay()
+        return results
+
+
+class FakeRedis:
+    """
+    In-memory replacement for a ``redis.asyncio`` client created with
+    ``decode_responses=True``, for a single event loop: no command awaits
+    while it runs, so each command, pipeline and script is atomic.
+
+    ``jitter`` delays each reply by a random 0..jitter seconds after the
+    command ran, so callers can resume in a different order than their
+    commands were applied (as with network latency).
+    """
+
+    COMMANDS = {"get", "set", "rpush", "lrange", "delete", "expire", "exists"}
+
+    def __init__(self, jitter: float = 0.0, seed: int = 0):
+        self._jitter = jitter
+        self._rng = random.Random(seed)
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+        self._lua = lupa.LuaRuntime(unpack_returned_tuples=True)
+        self._lua.globals()["fake_call"] = self._lua_call
+        self._lua.execute("redis = {call = function(...) return fake_call(...) end}")
+        self.commands = 0
+
+    # --- client API ---
+
+    def register_script(self, source: str) -> FakeScript:
+        return FakeScript(self, source)
+
+    def pipeline(self, transaction: bool = True) -> FakePipeline:
+        return FakePipeline(self)
+
+    def __getattr__(self, name: str):
+        if name not in self.COMMANDS:
+            raise AttributeError(name)
+
+        async def command(*args):
+            await asyncio.sleep(0)
+            self.commands += 1
+            result = self._call(name, *args)
+            await self._reply_delay()
+            return result
+        return command
+
+    async def _reply_delay(self):
+        if self._jitter:
+            await asyncio.sleep(self._rng.uniform(0, self._jitter))
+
+    # --- commands ---
+
+    def _call(self, name: str, *args) -> Any:
+        return getattr(self, f"_cmd_{name}")(*args)
+
+    def _alive(self, key: str) -> bool:
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    def _cmd_get(self, key: str) -> Optional[str]:
+        return self._data[key] if self._alive(key) else None
+
+    def _cmd_set(self, key: str, value: Any, *options: Any) -> bool:
+        self._data[key] = str(value)
+        self._expires.pop(key, None)
+        # SET key value EX seconds
+        if len(options) == 2 and str(options[0]).upper() == "EX":
+            self._expires[key] = time.monotonic() + int(options[1])
+        return True
+
+    def _cmd_rpush(self, key: str, *values: Any) -> int:
+        items = self._data[key] if self._alive(key) else []
+        items.extend(str(v) for v in values)
+        self._data[key] = items
+        return len(items)
+
+    def _cmd_lrange(self, key: str, start: int, stop: int) -> List[str]:
+        items = self._data[key] if self._alive(key) else []
+        start, stop = int(start), int(stop)
+        return items[start:] if stop == -1 else items[start:stop + 1]
+
+    def _cmd_delete(self, *keys: str) -> int:
+        removed = 0
+        for key in keys:
+            if self._alive(key):
+                del self._data[key]
+                self._expires.pop(key, None)
+                removed += 1
+        return removed
+
+    def _cmd_expire(self, key: str, seconds: int) -> bool:
+        if not self._alive(key):
+            return False
+        self._expires[key] = time.monotonic() + int(seconds)
+        return True
+
+    def _cmd_exists(self, *keys: str) -> int:
+        return sum(1 for key in keys if self._alive(key))
+
+    # --- Lua ---
+
+    def _lua_call(self, name: str, *args) -> Any:
+        """``redis.call`` from a script: nil becomes false and lists become tables, as in Redis."""
+        name = name.lower()
+        result = self._call("delete" if name == "del" else name, *args)
+        if result is None:
+            return False
+        if isinstance(result, list):
+            return self._lua.table_from(result)
+        return result
+
+    def _eval(self, source: str, keys: List[str], args: List[str]) -> Any:
+        lua_globals = self._lua.globals()
+        lua_globals.KEYS = self._lua.table_from(keys)
+        lua_globals.ARGV = self._lua.table_from(args)
+        result = self._lua.execute(source)
+        if result is None or result is False:
+            return None
+        if lupa.lua_type(result) == "table":
+            return [result[i] for i in range(1, len(result) + 1)]
+        return result
@@ -0,0 +1,152 @@
+"""
+Stress: the Redis chat buffer shared by two workers.
+
+Two ChatDebouncer instances (two uvicorn workers / Cloud Run instances)
+share one RedisMessageBuffer backend on the in-memory Redis stand-in, which
+runs the real Lua drain script. Checks:
+
+- append/drain: messages of a burst merge, in order, into one turn
+- latest token: a burst split across both workers is processed once, by
+  the worker holding the latest message; the other caller gets None
+- disconnect: a cancelled caller's messages carry over to the next turn
+- concurrent pushes: simultaneous messages for one phone on one worker,
+  with Redis replies arriving out of order, merge into a single turn
+- handover: a worker is told (to drop its cached context) exactly when the
+  phone's previous turn was handled by the other worker
+- load: random bursts from many phones over both workers deliver every
+  message exactly once
+
+Exits non-zero on the first failed check.
+
+Usage:
+    python benchmarks/stress_chat_buffer.py [--phones 200] [--burst 4] [--window 0.05]
+"""
+from typing import List, Optional
+import argparse
+import asyncio
+import random
+import sys
+
+from fake_redis import FakeRedis
+
+from app.services.chat_buffer import ChatDebouncer, RedisMessageBuffer
+
+
+def make_workers(window: float, handovers: Optional[List[List[str]]] = None, jitter: float = 0.0):
+    redis = FakeRedis(jitter=jitter)
+    handovers = handovers if handovers is not None else [[], []]
+    return redis, [
+        ChatDebouncer(
+            RedisMessageBuffer(None, idle_seconds=60, client=redis), window, window / 5,
+            on_handover=handovers[n].append
+        )
+        for n in range(2)
+    ]
+
+
+async def check_merge(window: float) -> bool:
+    _, (worker, _) = make_workers(window)
+    results = await asyncio.gather(
+        worker.submit("5500000001", "quiero"),
+        worker.submit("5500000001", "un latte"),
+        worker.submit("5500000001", "grande"),
+    )
+    return results == [None, None, "quiero un latte grande"]
+
+
+async def check_latest(window: float) -> bool:
+    redis, (a, b) = make_workers(window)
+    first = asyncio.create_task(a.submit("5500000002", "hola"))
+    await asyncio.sleep(window / 4)
+    second = asyncio.create_task(b.submit("5500000002", "un capuchino"))
+    results = [await first, await second]
+    buffered = await redis.exists(*RedisMessageBuffer._keys("5500000002"))
+    return results == [None, "hola un capuchino"] and buffered == 0
+
+
+async def check_disconnect(window: float) -> bool:
+    _, (a, b) = make_workers(window)
+    lost = asyncio.create_task(a.submit("5500000003", "uno"))
+    await asyncio.sleep(window / 4)
+    lost.cancel()
+    await asyncio.sleep(window * 2)
+    return await b.submit("5500000003", "dos") == "uno dos"
+
+
+async def check_concurrent_pushes(window: float) -> bool:
+    redis, (worker, _) = make_workers(window, jitter=window / 4)
+    ok = True
+    for n in range(20):
+        telefono = f"56{n:08d}"
+        sent = [f"{telefono}-{i}" for i in range(5)]
+        results = await asyncio.gather(*[worker.submit(telefono, mensaje) for mensaje in sent])
+        turns = [r for r in results if r is not None]
+        buffered = await redis.exists(*RedisMessageBuffer._keys(telefono))
+        ok = ok and turns == [" ".join(sent)] and buffered == 0
+    return ok
+
+
+async def check_handover(window: float) -> bool:
+    handovers: List[List[str]] = [[], []]
+    _, (a, b) = make_workers(window, handovers)
+    seen = []
+    for worker, mensaje in ((a, "hola"), (a, "un latte"), (b, "grande"), (a, "gracias")):
+        await worker.submit("5500000004", mensaje)
+        seen.append((len(handovers[0]), len(handovers[1])))
+    # First turn ever counts as a handover; then only the switches between workers
+    return seen == [(1, 0), (1, 0), (1, 1), (2, 1)]
+
+
+async def phone_session(workers, telefono: str, burst: int, window: float, rng: random.Random):
+    sent = [f"{telefono}-{i}" for i in range(burst)]
+    tasks = []
+    for mensaje in sent:
+        tasks.append(asyncio.create_task(rng.choice(workers).submit(telefono, mensaje)))
+        await asyncio.sleep(rng.uniform(0, window / 3))
+    results = await asyncio.gather(*tasks)
+    return sent, [r for r in results if r is not None]
+
+
+async def check_load(phones: int, burst: int, window: float) -> bool:
+    redis, workers = make_workers(window)
+    rng = random.Random(3)
+    sessions = await asyncio.gather(*[
+        phone_session(workers, f"55{n:08d}", burst, window, rng) for n in range(phones)
+    ])
+    ok = all(turns == [" ".join(sent)] for sent, turns in sessions)
+    leftover = sum([await redis.exists(*RedisMessageBuffer._keys(f"55{n:08d}")) for n in range(phones)])
+    print(f"Load: {phones} phones x {burst} messages over 2 workers, {redis.commands} Redis commands, "
+          f"{leftover} keys left")
+    return ok and leftover == 0
+
+
+async def run(phones: int, burst: int, window: float) -> bool:
+    checks = [
+        ("append/drain", lambda: check_merge(window)),
+        ("latest token across workers", lambda: check_latest(window)),
+        ("disconnected caller", lambda: check_disconnect(window)),
+        ("concurrent pushes on one worker", lambda: check_concurrent_pushes(window)),
+        ("handover between workers", lambda: check_handover(window)),
+        ("load", lambda: check_load(phones, burst, window)),
+    ]
+    for name, check in checks:
+        passed = await check()
+        print(f"{'✅' if passed else '❌'} {name}")
+        if not passed:
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--phones", type=int, default=200)
+    parser.add_argument("--burst", type=int, default=4)
+    parser.add_argument("--window", type=float, default=0.05, help="Debounce window (seconds)")
+    args = parser.parse_args()
+
+    if not asyncio.run(run(args.phones, args.burst, args.window)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
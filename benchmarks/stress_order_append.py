@@ -0,0 +1,80 @@
+"""
+Stress: concurrent "Comanda Abierta" appends to the same pending order.
+
+Compares the previous read / concatenate / rewrite update (lost updates
+under concurrency) with the transactional ArrayUnion + Increment append,
+against the in-memory Firestore stand-in with per-RPC latency so calls
+interleave. Exits non-zero if the transactional append loses anything.
+
+Usage:
+    python benchmarks/stress_order_append.py [--writers 8] [--rounds 20] [--latency 0.002]
+"""
+import argparse
+import asyncio
+import sys
+
+from fake_firestore import make_firestore_service
+
+from app.models.schemas import Order, OrderItem
+
+PRICE = 45.0
+PREP = 5
+
+
+def new_item() -> dict:
+    return OrderItem(
+        nombre_producto="Latte", cantidad=1, precio_unitario=PRICE, tiempo_prep_unitario=PREP
+    ).to_firestore()
+
+
+async def legacy_append(service, order_id: str):
+    """Previous implementation: read the order, concatenate items, rewrite the array."""
+    snapshot = await service._run(service._db.collection('pedidos').document(order_id).get)
+    data = snapshot.to_dict()
+    all_items = data.get('items', []) + [new_item()]
+    await service.update_order(order_id, {
+        "items": all_items,
+        "total": sum(i['cantidad'] * i['precio_unitario'] for i in all_items),
+        "tiempo_preparacion_total": data.get('tiempo_preparacion_total', 0) + PREP
+    })
+
+
+async def atomic_append(service, order_id: str):
+    await service.append_order_items(order_id, [new_item()], PREP)
+
+
+async def run(service, append, writers: int, rounds: int) -> dict:
+    lost, wrong_totals = 0, 0
+    service._db.reset_counters()
+    for r in range(rounds):
+        order_id = f"ord_{r:04d}"
+        await service.create_order(Order(id=order_id, id_cliente="5500000000"))
+        await asyncio.gather(*(append(service, order_id) for _ in range(writers)))
+        data = service._db.collection('pedidos').document(order_id).get().to_dict()
+        lost += writers - len(data['items'])
+        wrong_totals += (data['total'], data['tiempo_preparacion_total']) != (writers * PRICE, writers * PREP)
+    return {"lost": lost, "wrong_totals": wrong_totals, "rpcs": service._db.rpcs}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--writers", type=int, default=8, help="Concurrent appends per order")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.002, help="Seconds per simulated RPC")
+    args = parser.parse_args()
+
+    total = args.writers * args.rounds
+    for name, append in (("Read/concat/rewrite", legacy_append), ("Transaction + transforms", atomic_append)):
+        service = make_firestore_service(latency=args.latency)
+        stats = asyncio.run(run(service, append, args.writers, args.rounds))
+        service.shutdown()
+        print(
+            f"{name:26s} lost {stats['lost']:4d}/{total} items  "
+            f"wrong totals: {stats['wrong_totals']:3d}/{args.rounds}  rpcs: {stats['rpcs']}"
+        )
+        if append is atomic_append and (stats["lost"] or stats["wrong_totals"]):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
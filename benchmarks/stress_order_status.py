@@ -0,0 +1,88 @@
+"""
+Stress: "estado de mi pedido" answered by the intent router.
+
+Seeds a customer with an older delivered order and a newer order in each
+non-terminal state, then asks the router for the order status twice: with
+the active orders view off (direct Firestore query) and with it synced
+(served from memory). The answer must describe the order in progress, and
+fall back to the delivered one only once nothing is in progress.
+
+Exits non-zero on the first failed check.
+
+Usage:
+    python benchmarks/stress_order_status.py
+"""
+from datetime import datetime, timedelta, timezone
+import asyncio
+import sys
+
+from fake_firestore import make_firestore_service
+
+import app.services.intent_router as intent_module
+from app.models.schemas import Order, OrderItem, OrderStatus
+from app.services.intent_router import IntentRouter
+
+TELEFONO = "5500000001"
+
+
+def make_order(order_id: str, producto: str, cantidad: int, estado: OrderStatus, created: datetime) -> Order:
+    return Order(
+        id=order_id,
+        id_cliente=TELEFONO,
+        items=[OrderItem(nombre_producto=producto, cantidad=cantidad, precio_unitario=50.0)],
+        total=50.0 * cantidad,
+        estado=estado,
+        fecha_creacion=created
+    )
+
+
+async def ask(router: IntentRouter) -> dict:
+    response = await router.route(TELEFONO, "¿Cómo va mi pedido?")
+    return response.orden or {}
+
+
+async def check(use_view: bool) -> bool:
+    service = make_firestore_service()
+    intent_module.get_firestore_service = lambda: service
+    router = IntentRouter()
+    if use_view:
+        service.start_orders_view()
+
+    now = datetime.now(timezone.utc)
+    await service.create_order(make_order("ORD-OLD", "Latte", 3, OrderStatus.ENTREGADO, now - timedelta(days=2)))
+    await service.create_order(make_order("ORD-NEW", "Moka", 1, OrderStatus.PENDIENTE, now))
+
+    ok = True
+    for estado in (OrderStatus.PENDIENTE, OrderStatus.EN_PREPARACION, OrderStatus.LISTO):
+        if estado != OrderStatus.PENDIENTE:
+            await service.update_order_status("ORD-NEW", estado)
+        orden = await ask(router)
+        passed = orden.get("id") == "ORD-NEW" and orden.get("estado") == estado.value
+        print(f"  {'✅' if passed else '❌'} {estado.value}: {orden.get('id')} ({orden.get('estado')})")
+        ok = ok and passed
+
+    await service.update_order_status("ORD-NEW", OrderStatus.CANCELADO)
+    orden = await ask(router)
+    passed = orden.get("id") == "ORD-OLD"
+    print(f"  {'✅' if passed else '❌'} nothing in progress: {orden.get('id')} ({orden.get('estado')})")
+
+    await service.flush_pending_writes()
+    service.shutdown()
+    return ok and passed
+
+
+async def run() -> bool:
+    for use_view in (False, True):
+        print(f"Active orders view {'synced' if use_view else 'off'}:")
+        if not await check(use_view):
+            return False
+    return True
+
+
+def main():
+    if not asyncio.run(run()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import sys
 import os
 import streamlit as st
 import requests
+import json
 import time
 import uuid
 from datetime import datetime
@@ -968,40 +969,79 @@ st.markdown('</div>', unsafe_allow_html=True)
 # Fixed bottom input area - WHATSAPP STYLE
 st.markdown('<div class="input-area">', unsafe_allow_html=True)
 
-# Quick Action Chips
+# Quick Action Chips (sent like typed messages, on the next run)
 st.markdown('<span id="chips-start"></span>', unsafe_allow_html=True)
 c1, c2, c3, c4, c5 = st.columns(5)
 with c1:
     if st.button("📜 Ver Menú", key="btn_menu", use_container_width=True):
-        st.session_state.messages.append({'role': 'user', 'content': '📜 Ver Menú'})
+        st.session_state.chip_prompt = '📜 Ver Menú'
         st.rerun()
 with c2:
     if st.button("☕ Lo de siempre", key="btn_habitual", use_container_width=True):
-        st.session_state.messages.append({'role': 'user', 'content': '☕ Lo de siempre'})
+        st.session_state.chip_prompt = '☕ Lo de siempre'
         st.rerun()
 with c3:
     if st.button("⚖️ Mis Puntos", key="btn_puntos", use_container_width=True):
-        st.session_state.messages.append({'role': 'user', 'content': '⚖️ Mis Puntos'})
+        st.session_state.chip_prompt = '⚖️ Mis Puntos'
         st.rerun()
 with c4:
     if st.button("📋 Estado de Pedido", key="btn_estado", use_container_width=True):
-        st.session_state.messages.append({'role': 'user', 'content': '📋 Estado de Pedido'})
+        st.session_state.chip_prompt = '📋 Estado de Pedido'
         st.rerun()
 with c5:
     if st.button("🎲 Sorpréndeme", key="btn_sorpresa", use_container_width=True):
-        st.session_state.messages.append({'role': 'user', 'content': '🎲 Sorpréndeme'})
+        st.session_state.chip_prompt = '🎲 Sorpréndeme'
         st.rerun()
 
 st.markdown('<div class="input-wrapper">', unsafe_allow_html=True)
 
+def render_stream_bubbles(placeholder, bubbles: list):
+    """Render the bot bubbles received so far into a placeholder."""
+    html = "".join(
+        f'<div class="message-bubble bot-message">{texto}</div><div style="clear: both;"></div>'
+        for texto in bubbles if texto
+    )
+    placeholder.markdown(html, unsafe_allow_html=True)
+
+def stream_chat(prompt: str, placeholder, fin: bool = False) -> dict:
+    """
+    Send a message through /chat/stream and render the reply as it arrives.
+    ``fin`` marks a complete message (skips the server's debounce window).
+    Returns the final ChatResponse dict (None if the stream ended without one).
+    """
+    payload = {"mensaje": prompt, "telefono": telefono, "fin": fin}
+    bubbles = []
+    with requests.post(f"{API_BASE_URL}/chat/stream", json=payload, stream=True, timeout=(5, 60)) as response:
+        if response.status_code != 200:
+            return None
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            event = json.loads(line)
+            if event["tipo"] == "texto":
+                # Plain text grows inside a single bubble
+                if not bubbles:
+                    bubbles.append("")
+                bubbles[-1] += event["delta"]
+                render_stream_bubbles(placeholder, bubbles)
+            elif event["tipo"] == "burbuja":
+                bubbles.append(event["texto"])
+                render_stream_bubbles(placeholder, bubbles)
+            elif event["tipo"] == "final":
+                return event["respuesta"]
+    return None
+
 # Chat input - VISIBLE SEND BUTTON
-if prompt := st.chat_input("Escribe tu pedido...", key="chat_input"):
+chip_prompt = st.session_state.pop("chip_prompt", None)
+if prompt := (st.chat_input("Escribe tu pedido...", key="chat_input") or chip_prompt):
     # Add user message
     st.session_state.messages.append({"role": "user", "content": prompt})
+    st.markdown(f'<div class="message-bubble user-message">{prompt}</div>', unsafe_allow_html=True)
+    st.markdown('<div style="clear: both;"></div>', unsafe_allow_html=True)
 
-    # Show typing indicator
-    typing_placeholder = st.empty()
-    st.markdown("""
+    # Typing indicator, replaced by the reply as it streams in
+    stream_placeholder = st.empty()
+    stream_placeholder.markdown("""
     <div class="typing-indicator">
         <div class="typing-dot"></div>
         <div class="typing-dot"></div>
@@ -1011,42 +1051,30 @@ if prompt := st.chat_input("Escribe tu pedido...", key="chat_input"):
 
     # Process request with FIXED API HANDLING
     try:
-        payload = {"mensaje": prompt, "telefono": telefono}
-        response = requests.post(f"{API_BASE_URL}/chat", json=payload, timeout=30)
-        typing_placeholder.empty()
+        data = stream_chat(prompt, stream_placeholder, fin=prompt == chip_prompt)
 
-        if response.status_code == 200:
-            data = response.json()
-            
-            # CRITICAL FIX: Validar que data no sea None
-            if data:
-                tipo = data.get("tipo", "texto")
-                mensajes = data.get("mensajes", [data.get("mensaje", "...")])
-                orden = data.get("orden")
-
-                # Store message
-                msg_data = {
-                    "role": "assistant",
-                    "content": " ".join(mensajes) if mensajes else "...",
-                    "orden": orden,
-                    "tipo": tipo,
-                    "mensajes": mensajes if len(mensajes) > 1 else None
-                }
-
-                # Handle order responses
-                if tipo in ["orden_creada", "orden_actualizada"] and orden:
-                    st.balloons()
-
-                st.session_state.messages.append(msg_data)
-            else:
-                # Handle empty response
-                st.error("Error de comunicación con el cerebro")
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": "Error de comunicación con el cerebro",
-                    "tipo": "error"
-                })
+        # CRITICAL FIX: Validar que data no sea None
+        if data:
+            tipo = data.get("tipo", "texto")
+            mensajes = data.get("mensajes") or [data.get("mensaje", "...")]
+            orden = data.get("orden")
+
+            # Store message
+            msg_data = {
+                "role": "assistant",
+                "content": " ".join(mensajes) if mensajes else "...",
+                "orden": orden,
+                "tipo": tipo,
+                "mensajes": mensajes if len(mensajes) > 1 else None
+            }
+
+            # Handle order responses
+            if tipo in ["orden_creada", "orden_actualizada"] and orden:
+                st.balloons()
+
+            st.session_state.messages.append(msg_data)
         else:
+            stream_placeholder.empty()
             st.error("Error de comunicación con el cerebro")
             st.session_state.messages.append({
                 "role": "assistant",
@@ -1055,7 +1083,7 @@ if prompt := st.chat_input("Escribe tu pedido...", key="chat_input"):
             })
 
     except requests.exceptions.ConnectionError:
-        typing_placeholder.empty()
+        stream_placeholder.empty()
         error_msg = "🔌 No se pudo conectar con el servidor. ¿Está corriendo el backend?"
         st.session_state.messages.append({
             "role": "assistant",
@@ -1064,7 +1092,7 @@ if prompt := st.chat_input("Escribe tu pedido...", key="chat_input"):
         })
 
     except Exception as e:
-        typing_placeholder.empty()
+        stream_placeholder.empty()
         error_msg = f"❌ Error: {str(e)}"
         st.session_state.messages.append({
             "role": "assistant",
@@ -1073,7 +1101,6 @@ if prompt := st.chat_input("Escribe tu pedido...", key="chat_input"):
         })
 
     # Rerun to update UI without losing chat
-    time.sleep(0.5)
     st.rerun()
 
 st.markdown('</div></div>', unsafe_allow_html=True)
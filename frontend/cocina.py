@@ -3,7 +3,7 @@ Kitchen Display System (KDS) - Professional Kitchen Interface.
 Features:
 - Kanban-style order layout
 - Traffic light time indicators (green/yellow/red)
-- Auto-refresh without aggressive flickering
+- Live updates pushed by the backend (/orders/stream), polling /orders/board only as fallback
 - Clear item display with modifiers
 """
 import sys
@@ -14,6 +14,8 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import streamlit as st
 import requests
 from datetime import datetime, timezone
+import json
+import threading
 import time
 
 # Page configuration
@@ -448,23 +450,102 @@ def render_order_ticket(order: dict, show_action: str = None):
     
     return order_id
 
-def fetch_orders(api_base: str, endpoint: str) -> list:
-    """Fetch orders from API with error handling."""
+def fetch_board(api_base: str) -> tuple:
+    """
+    Fetch the whole board with one request. Sends the last ETag so an
+    unchanged board costs a 304 and is served from session state.
+    """
+    cached = st.session_state.get('board_cache')
+    headers = {"If-None-Match": cached['etag']} if cached and cached.get('etag') else {}
     try:
-        url = f"{api_base}{endpoint}"
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            return data if isinstance(data, list) else []
+        response = requests.get(f"{api_base}/orders/board", headers=headers, timeout=5)
+        if response.status_code == 304 and cached:
+            board = cached['board']
+        elif response.status_code == 200:
+            board = response.json()
+            st.session_state.board_cache = {"etag": response.headers.get("ETag"), "board": board}
         else:
-            st.error(f"API Error {response.status_code}: {url}")
-            return []
+            st.error(f"API Error {response.status_code}: {api_base}/orders/board")
+            return ([], [], [])
     except requests.exceptions.ConnectionError:
         st.error(f"❌ No se puede conectar a {api_base}. ¿Está corriendo el backend?")
-        return []
+        return ([], [], [])
     except Exception as e:
         st.error(f"Error fetching orders: {str(e)}")
-        return []
+        return ([], [], [])
+    return (board.get('pendiente', []), board.get('en_preparacion', []), board.get('listo', []))
+
+class OrderFeed:
+    """
+    Background consumer of the /orders/stream push feed.
+    Keeps the kitchen board in memory and bumps ``version`` on every change,
+    so the page only reruns when something actually happened.
+    """
+
+    RECONNECT_SECONDS = 2
+
+    def __init__(self, api_base: str):
+        self.api_base = api_base
+        self.connected = False
+        self.version = 0
+        self._orders = {}
+        self._changed = threading.Condition()
+        threading.Thread(target=self._run, daemon=True, name="kds-feed").start()
+
+    def _run(self):
+        while True:
+            try:
+                # Read timeout above the server keepalive ping
+                with requests.get(f"{self.api_base}/orders/stream", stream=True, timeout=(5, 60)) as response:
+                    if response.status_code == 200:
+                        event = None
+                        for line in response.iter_lines(decode_unicode=True):
+                            if line.startswith("event:"):
+                                event = line[6:].strip()
+                            elif line.startswith("data:"):
+                                self._apply(event, json.loads(line[5:]))
+            except Exception:
+                pass
+            with self._changed:
+                if self.connected:
+                    self.connected = False
+                    self.version += 1
+                    self._changed.notify_all()
+            time.sleep(self.RECONNECT_SECONDS)
+
+    def _apply(self, event: str, data: dict):
+        with self._changed:
+            if event == "snapshot":
+                self._orders = {o['id']: o for o in data.get('ordenes', [])}
+                self.connected = True
+            elif event == "orden":
+                orden = data['orden']
+                if data['tipo'] == "removed":
+                    self._orders.pop(orden['id'], None)
+                else:
+                    self._orders[orden['id']] = orden
+            self.version += 1
+            self._changed.notify_all()
+
+    def board(self) -> tuple:
+        """Return (pending, preparing, ready) orders, oldest first."""
+        with self._changed:
+            orders = sorted(self._orders.values(), key=lambda o: str(o.get('fecha_creacion') or ''))
+        return (
+            [o for o in orders if o.get('estado') == "pendiente"],
+            [o for o in orders if o.get('estado') == "en_preparacion"],
+            [o for o in orders if o.get('estado') == "listo"],
+        )
+
+    def wait_for_change(self, version: int, timeout: float):
+        """Block until the board changes past ``version`` or the timeout expires."""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout=timeout)
+
+@st.cache_resource
+def get_order_feed(api_base: str) -> OrderFeed:
+    """One push-feed connection per backend URL, shared by every KDS session."""
+    return OrderFeed(api_base)
 
 def update_order_status(api_base: str, order_id: str, endpoint: str, params: dict = None) -> bool:
     """Update order status via API with error handling."""
@@ -524,9 +605,6 @@ with st.sidebar:
         # Test API endpoints
         st.markdown("**Test de endpoints:**")
         test_endpoints = [
-            "/orders/pending",
-            "/orders/in-preparation",
-            "/orders/ready",
             "/health"
         ]
 
@@ -553,10 +631,13 @@ with col_refresh:
     if st.button("🔄 REFRESCAR", use_container_width=True, type="primary"):
         st.rerun()
 
-# Fetch all orders with connection status
-pending_orders = fetch_orders(api_base, "/orders/pending")
-preparing_orders = fetch_orders(api_base, "/orders/in-preparation")
-ready_orders = fetch_orders(api_base, "/orders/ready")
+# Orders come from the push feed; poll the endpoints only while it is down
+feed = get_order_feed(api_base)
+feed_version = feed.version
+if feed.connected:
+    pending_orders, preparing_orders, ready_orders = feed.board()
+else:
+    pending_orders, preparing_orders, ready_orders = fetch_board(api_base)
 
 # Connection status indicator
 connection_ok = len(pending_orders) >= 0  # If we got here without errors, connection is OK
@@ -695,26 +776,24 @@ with col3:
                         st.error(f"❌ Error al entregar orden {order_id[-4:]}")
 
 # Auto-refresh indicator and mechanism
-st.markdown(f"""
-    <div class="refresh-indicator">
-        🔄 Auto-refresh: {refresh_interval}s
-    </div>
-""", unsafe_allow_html=True)
+refresh_indicator = st.empty()
 
-# Auto-refresh mechanism with better error handling
 if 'last_refresh' not in st.session_state:
     st.session_state.last_refresh = time.time()
 
-current_time = time.time()
-time_since_refresh = current_time - st.session_state.last_refresh
+# Rerun as soon as the feed reports a change (or reconnects); otherwise every
+# refresh_interval, which keeps the elapsed-time badges current and polls the
+# board while the feed is down. Updating the indicator each second lets
+# button clicks interrupt the wait.
+indicator_label = "📡 En vivo" if feed.connected else "🔄 Auto-refresh"
+deadline = st.session_state.last_refresh + refresh_interval
+while feed.version == feed_version and time.time() < deadline:
+    refresh_indicator.markdown(f"""
+        <div class="refresh-indicator">
+            {indicator_label}: {max(0, int(deadline - time.time()))}s
+        </div>
+    """, unsafe_allow_html=True)
+    feed.wait_for_change(feed_version, timeout=1.0)
 
-if time_since_refresh >= refresh_interval:
-    st.session_state.last_refresh = current_time
-    time.sleep(0.1)  # Small delay to prevent rapid refreshes
-    st.rerun()
-else:
-    # Show countdown to next refresh
-    remaining = int(refresh_interval - time_since_refresh)
-    if remaining > 0:
-        time.sleep(1)  # Update every second
-        st.rerun()
\ No newline at end of file
+st.session_state.last_refresh = time.time()
+st.rerun()
\ No newline at end of file
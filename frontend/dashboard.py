@@ -1,9 +1,12 @@
 import asyncio
 import sys
 import os
+from datetime import datetime, timedelta
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+import pyarrow as pa
+import requests
 
 # Agrega el directorio raíz del proyecto al path de Python
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -25,6 +28,102 @@ def run_async(coro):
         asyncio.set_event_loop(loop)
         return loop.run_until_complete(coro)
 
+# --- DATA ---
+API_BASE_URL = "http://localhost:8000"
+REFRESH_SECONDS = 30
+LOCAL_TZ = datetime.now().astimezone().tzinfo
+
+# Backend order states -> dashboard labels
+STATUS_LABELS = {
+    "pendiente": "Pendiente",
+    "en_preparacion": "Preparando",
+    "listo": "Listo",
+    "entregado": "Entregado",
+    "cancelado": "Cancelado",
+}
+
+
+def fetch_orders(api_base: str, desde, hasta, cambios_desde=None) -> tuple:
+    """
+    Orders for a date range from /analytics/orders (Arrow IPC), parsed once
+    into a typed DataFrame. With ``cambios_desde`` only the orders changed
+    after that cursor come back. Returns (df, cursor for the next refresh).
+    """
+    params = {"desde": desde.isoformat(), "hasta": hasta.isoformat()}
+    if cambios_desde:
+        params["cambios_desde"] = cambios_desde
+    response = requests.get(f"{api_base}/analytics/orders", params=params, timeout=30)
+    response.raise_for_status()
+    df = pa.ipc.open_stream(response.content).read_all().to_pandas()
+
+    # Derived columns, computed once per fetched row (local time for display/grouping)
+    df["fecha"] = df["fecha_creacion"].dt.tz_convert(LOCAL_TZ).dt.tz_localize(None)
+    df["fecha_dia"] = df["fecha"].dt.date
+    df["estado"] = df["estado"].cat.rename_categories(lambda s: STATUS_LABELS.get(s, s.capitalize()))
+    return df, response.headers.get("X-Cursor")
+
+
+def load_orders(desde, hasta) -> pd.DataFrame:
+    """
+    Orders for a date range, kept in the session: the first load fetches
+    the whole range, later reruns fetch only the orders changed since the
+    last cursor and merge them by id.
+    """
+    key = (API_BASE_URL, desde, hasta)
+    dataset = st.session_state.get("orders_dataset")
+
+    if dataset is None or dataset["key"] != key or not dataset["cursor"]:
+        with st.spinner("Cargando pedidos..."):
+            df, cursor = fetch_orders(API_BASE_URL, desde, hasta)
+        dataset = {"key": key, "df": df, "cursor": cursor, "version": 0}
+    else:
+        delta, cursor = fetch_orders(API_BASE_URL, desde, hasta, cambios_desde=dataset["cursor"])
+        dataset = dict(dataset, cursor=cursor or dataset["cursor"])
+        if not delta.empty:
+            df = dataset["df"]
+            df = pd.concat([df[~df["id"].isin(delta["id"])], delta], ignore_index=True)
+            df["estado"] = df["estado"].astype("category")
+            dataset.update(df=df, version=dataset["version"] + 1)
+
+    st.session_state.orders_dataset = dataset
+    return dataset["df"]
+
+
+def filtered_orders(desde, hasta, estados) -> pd.DataFrame:
+    """Session orders narrowed to the selected local days and states."""
+    # The backend groups by UTC day; fetch one extra day per side for local time
+    df = load_orders(desde - timedelta(days=1), hasta + timedelta(days=1))
+    df = df[(df["fecha_dia"] >= desde) & (df["fecha_dia"] <= hasta)]
+    if estados:
+        df = df[df["estado"].isin(estados)]
+    return df
+
+
+def kpi_deltas(kpis: dict, filtros: tuple) -> dict:
+    """
+    Change of each KPI since the dataset last changed (same filters), for
+    the ``delta`` of the metric tiles. Empty when there is nothing to compare.
+    """
+    dataset = st.session_state.get("orders_dataset") or {}
+    version = dataset.get("version")
+    state = st.session_state.get("kpi_state")
+
+    previous = None
+    if state and state["filtros"] == filtros and state["dataset"] == dataset.get("key"):
+        previous = state["values"] if state["version"] != version else state["previous"]
+
+    st.session_state.kpi_state = {
+        "filtros": filtros,
+        "dataset": dataset.get("key"),
+        "version": version,
+        "values": kpis,
+        "previous": previous,
+    }
+    if not previous:
+        return {}
+    return {name: value - previous[name] for name, value in kpis.items() if value != previous[name]}
+
+
 # --- CSS STYLING ---
 st.markdown("""
 <style>
@@ -68,140 +167,131 @@ with st.sidebar:
     # Status filter
     status_filter = st.multiselect(
         "Estado del pedido",
-        ["Pendiente", "Preparando", "Listo", "Entregado"],
+        ["Pendiente", "Preparando", "Listo", "Entregado", "Cancelado"],
         default=["Pendiente", "Preparando", "Listo", "Entregado"]
     )
     
     st.markdown("---")
     
-    # Refresh button
+    # Refresh controls
+    auto_refresh = st.toggle(f"🔄 Auto-actualizar ({REFRESH_SECONDS}s)", value=False)
     if st.button("🔄 Actualizar Datos", use_container_width=True):
+        st.session_state.pop("orders_dataset", None)
         st.rerun()
 
 # --- MAIN DASHBOARD ---
 st.title("📊 Panel de Control - Justicia y Café")
 
-# Mock data for demo - Replace with real Firestore data
-def get_mock_orders():
-    """Mock data for demonstration - Replace with Firestore calls"""
-    import random
-    from datetime import datetime, timedelta
-    
-    mock_orders = []
-    statuses = ["Pendiente", "Preparando", "Listo", "Entregado"]
-    
-    for i in range(50):
-        order = {
-            "id": f"ORD-{1000 + i}",
-            "fecha": (datetime.now() - timedelta(days=random.randint(0, 7))).strftime("%Y-%m-%d %H:%M"),
-            "estado": random.choice(statuses),
-            "total": random.randint(50, 300),
-            "items_count": random.randint(1, 5),
-            "telefono": f"+52{random.randint(550000000, 559999999)}"
+def load_filtered_orders(quiet: bool = False) -> pd.DataFrame:
+    """Orders for the sidebar filters; an empty frame (and an error) on failure."""
+    try:
+        return filtered_orders(fecha_inicio, fecha_fin, status_filter)
+    except requests.exceptions.ConnectionError:
+        if not quiet:
+            st.error(f"❌ No se puede conectar a {API_BASE_URL}. ¿Está corriendo el backend?")
+    except Exception as e:
+        if not quiet:
+            st.error(f"Error al cargar datos: {str(e)}")
+    return pd.DataFrame()
+
+
+@st.fragment(run_every=REFRESH_SECONDS if auto_refresh else None)
+def render_panel():
+    """
+    Metrics, charts and table; reruns on its own when auto-refresh is on.
+    Load errors are shown on full script runs and stay quiet on the timed
+    fragment reruns, so a backend outage doesn't stack an error every cycle.
+    """
+    df = load_filtered_orders(quiet=not st.session_state.pop("panel_full_run", False))
+
+    # --- METRICS ROW ---
+    if not df.empty:
+        kpis = {
+            "total_pedidos": len(df),
+            "ingresos_totales": float(df["total"].sum()),
+            "promedio_pedido": float(df["total"].mean()),
+            "pedidos_hoy": int((df["fecha_dia"] == pd.Timestamp.now().date()).sum()),
         }
-        mock_orders.append(order)
-    
-    return pd.DataFrame(mock_orders)
+        deltas = kpi_deltas(kpis, (fecha_inicio, fecha_fin, tuple(status_filter)))
+        col1, col2, col3, col4 = st.columns(4)
 
-# Try to get real data, fallback to mock
-try:
-    df = get_mock_orders()
-    
-    # Apply filters
-    df["fecha_date"] = pd.to_datetime(df["fecha"]).dt.date
-    
-    if fecha_inicio and fecha_fin:
-        df = df[(df["fecha_date"] >= fecha_inicio) & (df["fecha_date"] <= fecha_fin)]
-    
-    if status_filter:
-        df = df[df["estado"].isin(status_filter)]
-    
-except Exception as e:
-    st.error(f"Error al cargar datos: {str(e)}")
-    df = pd.DataFrame()
+        with col1:
+            st.metric("Total Pedidos", kpis["total_pedidos"], delta=deltas.get("total_pedidos"))
 
-# --- METRICS ROW ---
-if not df.empty:
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        total_pedidos = len(df)
-        st.metric("Total Pedidos", total_pedidos)
-    
-    with col2:
-        ingresos_totales = df["total"].sum()
-        st.metric("Ingresos Totales", f"${ingresos_totales:,.0f}")
-    
-    with col3:
-        promedio_pedido = df["total"].mean()
-        st.metric("Promedio por Pedido", f"${promedio_pedido:.0f}")
-    
-    with col4:
-        pedidos_hoy = len(df[pd.to_datetime(df["fecha"]).dt.date == pd.Timestamp.now().date()])
-        st.metric("Pedidos Hoy", pedidos_hoy)
+        with col2:
+            delta = deltas.get("ingresos_totales")
+            st.metric(
+                "Ingresos Totales", f"${kpis['ingresos_totales']:,.0f}",
+                delta=f"{delta:,.0f}" if delta else None
+            )
 
-# --- CHARTS ROW ---
-if not df.empty:
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        # Orders by status
-        status_counts = df["estado"].value_counts()
-        fig_status = px.pie(
-            values=status_counts.values,
-            names=status_counts.index,
-            title="Distribución por Estado",
-            color_discrete_sequence=px.colors.qualitative.Set3
-        )
-        st.plotly_chart(fig_status, use_container_width=True)
-    
-    with col2:
-        # Daily orders
-        df["fecha_dia"] = pd.to_datetime(df["fecha"]).dt.date
-        daily_orders = df.groupby("fecha_dia").size().reset_index(name="pedidos")
-        daily_orders.columns = ["fecha", "pedidos"]
-        
-        fig_daily = px.bar(
-            daily_orders,
-            x="fecha",
-            y="pedidos",
-            title="Pedidos por Día",
-            labels={"fecha": "Fecha", "pedidos": "Número de Pedidos"}
+        with col3:
+            delta = deltas.get("promedio_pedido")
+            st.metric(
+                "Promedio por Pedido", f"${kpis['promedio_pedido']:.0f}",
+                delta=f"{delta:.0f}" if delta else None
+            )
+
+        with col4:
+            st.metric("Pedidos Hoy", kpis["pedidos_hoy"], delta=deltas.get("pedidos_hoy"))
+
+    # --- CHARTS ROW ---
+    if not df.empty:
+        col1, col2 = st.columns(2)
+
+        with col1:
+            # Orders by status
+            status_counts = df["estado"].value_counts()
+            status_counts = status_counts[status_counts > 0]
+            fig_status = px.pie(
+                values=status_counts.values,
+                names=status_counts.index,
+                title="Distribución por Estado",
+                color_discrete_sequence=px.colors.qualitative.Set3
+            )
+            st.plotly_chart(fig_status, use_container_width=True)
+
+        with col2:
+            # Daily orders
+            daily_orders = df.groupby("fecha_dia").size().reset_index(name="pedidos")
+            daily_orders.columns = ["fecha", "pedidos"]
+
+            fig_daily = px.bar(
+                daily_orders,
+                x="fecha",
+                y="pedidos",
+                title="Pedidos por Día",
+                labels={"fecha": "Fecha", "pedidos": "Número de Pedidos"}
+            )
+            st.plotly_chart(fig_daily, use_container_width=True)
+
+    # --- ORDERS TABLE ---
+    st.markdown("---")
+    st.subheader("📋 Pedidos Recientes")
+
+    if not df.empty:
+        # Sort by fecha
+        df_display = df.sort_values("fecha", ascending=False)
+
+        # Show table
+        st.dataframe(
+            df_display[["id", "fecha", "estado", "total", "items_count", "telefono"]],
+            use_container_width=True,
+            hide_index=True
         )
-        st.plotly_chart(fig_daily, use_container_width=True)
+    else:
+        st.info("No hay datos para mostrar con los filtros seleccionados")
 
-# --- ORDERS TABLE ---
-st.markdown("---")
-st.subheader("📋 Pedidos Recientes")
+    if auto_refresh:
+        st.caption(f"🔄 Actualizado a las {datetime.now().strftime('%H:%M:%S')} · cada {REFRESH_SECONDS}s")
 
-if not df.empty:
-    # Sort by fecha
-    df_display = df.sort_values("fecha", ascending=False)
-    
-    # Format dataframe for display
-    df_display["estado"] = df_display["estado"].apply(
-        lambda x: f'<span class="status-{x.lower()}">{x}</span>'
-    )
-    
-    # Show table
-    st.dataframe(
-        df_display[["id", "fecha", "estado", "total", "items_count", "telefono"]],
-        use_container_width=True,
-        hide_index=True
-    )
-else:
-    st.info("No hay datos para mostrar con los filtros seleccionados")
 
-# --- REAL-TIME UPDATES ---
-st.markdown("---")
-st.subheader("🔄 Actualizaciones en Tiempo Real")
+st.session_state["panel_full_run"] = True
+render_panel()
 
-# Auto-refresh every 30 seconds
-st.empty()
-if st.button("🔄 Auto-actualizar (30s)"):
-    import time
-    time.sleep(30)
-    st.rerun()
+# --- ACTIONS ---
+st.markdown("---")
+st.subheader("🛠️ Acciones")
 
 # Add some demo functionality
 col1, col2, col3 = st.columns(3)
@@ -212,6 +302,7 @@ with col1:
 
 with col2:
     if st.button("📊 Exportar Datos"):
+        df = load_filtered_orders()
         if not df.empty:
             csv = df.to_csv(index=False)
             st.download_button(